@@ -1,13 +1,17 @@
 from Agent.agent import *
-from fastapi import APIRouter, Depends, Request, Response, status
+from Agent.summary import fold_summary
+from Database.history import load_recent_messages, get_chat_start
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response, status
 from Auth import get_current_user
 import datetime as dt
-from pymongo import ASCENDING
 from Agent.models import ChatMessage
 from datetime import datetime, timezone
 import logging
 from bson import ObjectId
 from starlette.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
+from metrics import span
+import json
 
 agent_router = APIRouter()
 
@@ -15,12 +19,129 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def assistance_level(minutes: float | None) -> int:
+    """
+    Map the minutes elapsed since the chat started to an assistance level.
+
+    Args:
+        minutes (float | None): Minutes since the first message of the chat.
+
+    Returns:
+        int: 0 for the first 20 minutes, 1 up to 30 minutes and 2 afterwards.
+    """
+    if minutes is None or minutes <= 20:
+        return 0
+    if minutes <= 30:
+        return 1
+    return 2
+
+
+async def load_chatbot(request: Request, chat_id: str, user) -> ChatBot:
+    """
+    Load a chat with its history and build the level-based chatbot for it.
+
+    Args:
+        request (Request): The HTTP request object.
+        chat_id (str): The ID of the chat.
+        user: The current user obtained from the access token.
+
+    Returns:
+        ChatBot: The chatbot for the chat.
+
+    Raises:
+        HTTPException: 404 if the chat or its history could not be found, 409 if the chat is
+            still being prepared or its preparation failed.
+    """
+    # Fetch chat metadata
+    chat = await request.app.database["Chat List"].find_one(
+        {
+            "_id": ObjectId(chat_id),
+            "user_id": ObjectId(user["_id"]),
+        },
+        {
+            "user_id": 1,
+            "problem_statement": 1,
+            "problem_compact": 1,
+            "summary": 1,
+            "summary_watermark": 1,
+            "created_at": 1,
+            "status": 1,
+            "error": 1,
+        },
+    )
+    if not chat:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+    # Chats created before background preparation have no status and are ready
+    if chat.get("status", "ready") == "pending":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Chat is not ready yet")
+    if chat.get("status") == "failed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=chat.get("error"))
+
+    # Fetch the tail of the chat history that is not yet part of the summary
+    with span("history_load"):
+        await request.app.turn_writer.sync(chat["_id"])
+        chat_history = await load_recent_messages(
+            request.app.database,
+            chat["_id"],
+            ObjectId(user["_id"]),
+            after=chat.get("summary_watermark"),
+        )
+
+    if not chat_history:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat History not found"
+        )
+
+    # Getting the time difference between the start of the chat and current time
+    time_difference_minutes = None
+    started_at = await get_chat_start(request.app.database, chat)
+    if started_at is not None:
+        diff = datetime.now(timezone.utc) - started_at
+        time_difference_minutes = diff.total_seconds() / 60
+
+    # Formatting chat history
+    formatted_history = [
+        {"role": m["role"], "content": m["message"]}
+        for m in chat_history
+        if m["role"] != "system"
+    ]
+
+    summary = chat.get("summary", "")
+    # Chats prepared before problems were compacted only have the statement
+    problem = chat.get("problem_compact") or chat.get("problem_statement", "")
+
+    # Calling Level Based Chabot
+    return ChatBot(
+        messages=formatted_history,
+        summary=summary,
+        problem=problem,
+        level=assistance_level(time_difference_minutes),
+        code_runner=request.app.code_runner,
+        response_cache=request.app.response_cache,
+    )
+
+
+async def save_turn(request: Request, chat_id: str, user, message: str, result: dict) -> None:
+    """
+    Persist a completed turn: the user's message, the bot response and the chat's last activity.
+
+    Args:
+        request (Request): The HTTP request object.
+        chat_id (str): The ID of the chat.
+        user: The current user obtained from the access token.
+        message (str): The user's message.
+        result (dict): The chatbot result with the 'response'.
+    """
+    await request.app.turn_writer.save(ObjectId(chat_id), ObjectId(user["_id"]), message, result)
+
+
 @agent_router.post("/chat_message", summary="Send a message in a chat room")
 async def chat_message(
     chat_message: ChatMessage,
     chat_id: str,
     request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     user=Depends(get_current_user),
 ):
     """
@@ -30,118 +151,89 @@ async def chat_message(
         chat_message (ChatMessage): The chat message data.
         request (Request): The HTTP request object.
         response (Response): The HTTP response object.
+        background_tasks (BackgroundTasks): Used to update the chat summary after responding.
         user: The current user obtained from the access token.
 
     Returns:
-        dict: The chatbot's response
+        dict: The chatbot's response and the number of attempts the level-2 reflection loop tested
     """
     try:
+        try:
+            chatbot = await load_chatbot(request, chat_id, user)
+        except HTTPException as e:
+            response.status_code = e.status_code
+            return {"error": e.detail}
 
-        # Fetch chat metadata
-        chat = await request.app.database["Chat List"].find_one(
-            {
-                "_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-            }
-        )
-        if not chat:
-            response.status_code = status.HTTP_404_NOT_FOUND
-            return {"error": "Chat not found"}
-
-        # Fetch all chat history sorted by timestamp DESCENDING
-        chat_history = (
-            await request.app.database["Messages"]
-            .find(
-                {
-                    "chat_id": ObjectId(chat_id),
-                    "user_id": ObjectId(user["_id"]),
-                }
-            )
-            .sort("timestamp", ASCENDING)
-            .to_list(length=None)
-        )
-
-        if not chat_history:
-            response.status_code = status.HTTP_404_NOT_FOUND
-            return {"error": "Chat History not found"}
-
-        # 🕒 Get time difference in minutes from earliest message
-        earliest_message = await request.app.database["Messages"].find_one(
-            {
-                "chat_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-            },
-            sort=[("timestamp", ASCENDING)],
-        )
-
-        # Getting the time difference between the timestamp of the first message in chat and current time
-        time_difference_minutes = None
-        if earliest_message and "timestamp" in earliest_message:
-            earliest_time = earliest_message["timestamp"]
-            if earliest_time.tzinfo is None:
-                earliest_time = earliest_time.replace(tzinfo=timezone.utc)
-            now = datetime.now(timezone.utc)
-            diff = now - earliest_time
-            time_difference_minutes = diff.total_seconds() / 60
-
-        # Formatting chat history
-        formatted_history = [
-            {"role": m["role"], "content": m["message"]}
-            for m in chat_history
-            if m["role"] != "system"
-        ]
-
-        summary = chat.get("summary", "")
-        problem = chat.get("problem_statement", "")
-
-        # Calling Level Based Chabot
-        if time_difference_minutes <= 20:
-            chatbot = ChatBot(
-                messages=formatted_history, summary=summary, problem=problem
-            )
-        elif time_difference_minutes > 20 and time_difference_minutes <= 30:
-            chatbot = ChatBot(
-                messages=formatted_history, summary=summary, problem=problem, level=1
-            )
-        elif time_difference_minutes > 30:
-            chatbot = ChatBot(
-                messages=formatted_history, summary=summary, problem=problem, level=2
-            )
         result = await chatbot.chat(message=chat_message.message)
-
-        # Inserting user request after successfull bot response
-        await request.app.database["Messages"].insert_one(
-            {
-                "chat_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-                "role": "user",
-                "message": chat_message.message,
-                "timestamp": dt.datetime.now(timezone.utc),
-            }
-        )
-
-        # Update summary
-        await request.app.database["Chat List"].update_one(
-            {"_id": chat_id, "email": user["email"]},
-            {"$set": {"summary": result["summary"]}},
-        )
-
-        # Insert bot response
-        response = await request.app.database["Messages"].insert_one(
-            {
-                "chat_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-                "role": "assistant",
-                "message": result["response"],
-                "timestamp": dt.datetime.now(timezone.utc),
-            }
+        await save_turn(request, chat_id, user, chat_message.message, result)
+        background_tasks.add_task(
+            fold_summary, request.app.database, ObjectId(chat_id), ObjectId(user["_id"])
         )
 
         return {
             "message": result["response"],
+            "iterations": result.get("iterations", 0),
         }
 
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@agent_router.post(
+    "/chat_message/stream", summary="Send a message in a chat room and stream the response"
+)
+async def chat_message_stream(
+    chat_message: ChatMessage,
+    chat_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    user=Depends(get_current_user),
+):
+    """
+    Send a message in a chat room and stream the chatbot's response as Server-Sent Events.
+
+    Emits 'token' events with model output as it is generated, 'stage' events for the
+    extract/run/judge/replace stages, and a final 'done' event with the complete
+    message and the number of reflection attempts once it has been saved. Failures are reported as an 'error' event.
+
+    Args:
+        chat_message (ChatMessage): The chat message data.
+        chat_id (str): The ID of the chat.
+        request (Request): The HTTP request object.
+        background_tasks (BackgroundTasks): Used to update the chat summary after streaming.
+        user: The current user obtained from the access token.
+
+    Returns:
+        StreamingResponse: A text/event-stream response.
+    """
+    chatbot = await load_chatbot(request, chat_id, user)
+
+    async def event_stream():
+        async for item in chatbot.stream(message=chat_message.message):
+            event, data = item["event"], item["data"]
+            if event == "done":
+                try:
+                    await save_turn(request, chat_id, user, chat_message.message, data)
+                except Exception as e:
+                    logger.error(f"Error saving streamed message: {e}")
+                    event, data = "error", {"detail": str(e)}
+                else:
+                    data = {"message": data["response"], "iterations": data.get("iterations", 0)}
+                    background_tasks.add_task(
+                        fold_summary,
+                        request.app.database,
+                        ObjectId(chat_id),
+                        ObjectId(user["_id"]),
+                    )
+            elif event == "error":
+                logger.error(f"Error streaming message: {data['detail']}")
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
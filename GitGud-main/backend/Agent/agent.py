@@ -1,21 +1,93 @@
 """
 This module defines the ChatBot class, which handles the logic for the competitive programming assistant.
 
-It includes methods for summarizing conversations, interacting with models, and executing code.
+It includes methods for interacting with models and executing code; conversation summaries are
+maintained off the request path by Agent.summary.
+The graph nodes are stateless and the compiled graphs and agents are shared process-wide through
+Agent.registry, so a ChatBot only carries the data of a single conversation.
 """
 
 import os
 import re
-import requests
+import asyncio
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
 from Agent.reflection_agent import create_reflection_graph
+from Agent.registry import get_agent, get_graph
+from Agent.code_runner import CodeRunnerClient, CodeRunnerError, describe_batch
+from Agent.verdict import local_verdict, verdict_stats
+from Agent.extraction import LANGUAGE_TAGS, code_hash, extract_solution, needs_extraction
+from Agent.response_cache import ResponseCache
+from Agent.prompt_builder import build_system_prompt, compact_problem, render_problem
 from Agent.models import *
 from langchain_core.messages import AIMessage, HumanMessage
-from httpx import AsyncClient
 from pydantic_ai import Agent
 from Agent.prompts import *
+from metrics import (
+    PROMPT_TOKENS_SAVED,
+    REFLECTION_ITERATIONS,
+    current_level,
+    record_model_call,
+    run_agent,
+    span,
+)
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+API_KEY = os.getenv("GROQ_API_KEY")
+
+CHAT_MODEL = "groq:meta-llama/llama-4-scout-17b-16e-instruct"
+SUMMARIZER_MODEL = "groq:qwen-qwq-32b"
+CHAT_SETTINGS = {"temperature": 0.3}
+JUDGE_SETTINGS = {"temperature": 0.3}
+REPLACEMENT_SETTINGS = {"temperature": 0.8}
+SUMMARIZER_SETTINGS = {"temperature": 0.4, "seed": 432}
+REFLECTION_MAX_ITERATIONS = int(os.getenv("REFLECTION_MAX_ITERATIONS", "3"))
+REFLECTION_TIMEOUT = float(os.getenv("REFLECTION_TIMEOUT", "60"))
+FENCE_TAGS = {"c++": "cpp"}
+# Level-2 responses are only reused when the reflection loop tested them or found no code; a draft
+# left by a loop that ran out of budget must not be served to later users
+CACHEABLE_STOP_REASONS = ("passed", "no_code")
+
+Emitter = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+async def emit_event(config: RunnableConfig | None, event: str, data: Dict[str, Any]) -> None:
+    """
+    Forward a streaming event to the emitter passed in the graph config, if any.
+
+    Args:
+        config (RunnableConfig | None): The config the graph was invoked with.
+        event (str): The event name, e.g. 'token' or 'stage'.
+        data (Dict[str, Any]): The event payload.
+    """
+    emit = get_emitter(config)
+    if emit is not None:
+        await emit(event, data)
+
+
+def get_emitter(config: RunnableConfig | None) -> Emitter | None:
+    """Return the streaming emitter passed in the graph config, if any."""
+    return ((config or {}).get("configurable") or {}).get("emit")
+
+
+def agent_deps(system_prompt: str = "") -> AgentDeps:
+    """
+    Build the run-time dependencies passed to the shared agents.
+
+    Args:
+        system_prompt (str): The per-conversation system prompt, for agents without a static one.
+
+    Returns:
+        AgentDeps: The dependencies for a single agent run.
+    """
+    return AgentDeps(api_key=API_KEY, system_prompt=system_prompt)
 
 
 class ChatBot:
@@ -24,245 +96,483 @@ class ChatBot:
 
     Attributes:
         messages (List[Dict[str, str]]): The conversation history.
-        problem (str): The problem description.
+        problem (CompactProblem): The problem description, split into its parts.
         summary (str): A summary of the conversation.
         level (int): The assistance level (0, 1, or 2).
+        code_runner (CodeRunnerClient | None): The client used to run extracted code at level 2.
+        response_cache (ResponseCache | None): Serves responses to questions answered before.
+        max_iterations (int): Attempts the level-2 reflection loop may test per turn.
+        reflection_timeout (float): Seconds after which the level-2 reflection loop starts no
+            further attempts.
     """
 
     def __init__(
         self,
         messages: List[Dict[str, str]],
-        problem: str,
+        problem: str | CompactProblem,
         summary: str | None = None,
         level: int = 0,
+        code_runner: CodeRunnerClient | None = None,
+        response_cache: ResponseCache | None = None,
+        max_iterations: int = REFLECTION_MAX_ITERATIONS,
+        reflection_timeout: float = REFLECTION_TIMEOUT,
     ):
-        load_dotenv()
+        assert API_KEY, "Missing GROQ_API_KEY in .env"
         self._messages = messages
-        self._problem = problem.strip()
+        self._problem = compact_problem(problem) if isinstance(problem, str) else problem
         self._summary = summary
         self._level = level
-        self._API_KEY = os.getenv("GROQ_API_KEY")
-        self._EXECUTE_URL = os.getenv("CODE_RUNNER_API_URL")
-        assert self._API_KEY, "Missing GROQ_API_KEY in .env"
-        assert self._EXECUTE_URL, "Missing CODE_RUNNER_API_URL in .env"
-
-        self._extractor_model: Agent[None, ChatbotCodeOutput]
-        self._chat_model: Agent[None, str]
-        self._code_replacement_model: Agent[None, ReplacementOutput]
-        self._judge_model: Agent[None, JudgeOutput]
-        self._deps = AgentDeps(api_key=self._API_KEY, http_client=AsyncClient)
-        self._chat_settings = {"temperature": 0.3}
-        self._judge_settings = {"temperature": 0.3}
-        self._replacement_settings = {"temperature": 0.8}
-        self._summarizer_settings = {"temperature": 0.4,"seed":432}
-        self._original_response = [False, ""]
-
-    async def should_run(
-        self, state: Dict[str, Any]
-    ) -> Literal["summarize", "call_model"]:
-        print("DEBUG: Entering should_run")
-        decision = "summarize" if len(state["messages"]) > 10 else "call_model"
-        print("DEBUG: Exiting should_run")
-        return decision
-
-    async def summarize(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        print("DEBUG: Entering summarize")
-        print("Entering summarize")
-        self._chat_model = Agent(
-            model="groq:qwen-qwq-32b",
-            system_prompt=SUMMARIZER_PROMPT,
-            model_settings=self._summarizer_settings,
-            deps_type=AgentDeps,
-        )
-        # Making chat history into strings
-        chat_history = ""
-        for m in state["messages"]:
+        self._code_runner = code_runner
+        self._response_cache = response_cache
+        self._max_iterations = max_iterations
+        self._reflection_timeout = reflection_timeout
+
+    @staticmethod
+    async def call_model(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        with span("call_model"):
+            return await ChatBot._call_model(state, config)
+
+    @staticmethod
+    async def _call_model(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        # Older messages are folded into the summary in the background, so the
+        # history here only holds the messages after the summary watermark
+        chat_history = []
+        for m in state["messages"][:-1]:
             if type(m) == HumanMessage:
-                chat_history += "User: " + m.text() + "\n"
+                chat_history.append("User: " + m.text())
             elif type(m) == AIMessage:
-                chat_history += "Assistant: " + m.text() + "\n"
-        result = await self._chat_model.run(
-            "Summarize the following:\n" + chat_history, deps=self._deps
-        )
-        self._summary = "Summary of chat history" + result.output
-        print("Exiting summary")
-        print("DEBUG: Exiting summarize")
-        return state
-
-    async def call_model(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        print("DEBUG: Entering call_model")
-        chat_history = ""
-        if self._summary:
-            chat_history += "The below is the chat history:\n"
-            for m in state["messages"]:
-                if type(m) == HumanMessage:
-                    chat_history += "User: " + m.text() + "\n"
-                elif type(m) == AIMessage:
-                    chat_history += "Assistant: " + m.text() + "\n"
-
-        FINAL_SYSTEM_PROMPT = (
-            SYSTEM_PROMPT[self._level]
-            + "\n\nProblem:\n"
-            + self._problem
-            + self._summary
-            if self._summary == ""
-            else chat_history
-        )
-        self._chat_model = Agent(
-            model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
-            system_prompt=FINAL_SYSTEM_PROMPT,
-            model_settings=self._chat_settings,
-            deps_type=AgentDeps,
+                chat_history.append("Assistant: " + m.text())
+
+        FINAL_SYSTEM_PROMPT, prompt_tokens = build_system_prompt(
+            SYSTEM_PROMPT[state["level"]], state["problem"], state.get("summary") or "", chat_history
         )
-        chat_result = await self._chat_model.run(
-            state["messages"][-1].content, deps=self._deps
+        saved = prompt_tokens["untrimmed"] - prompt_tokens["tokens"]
+        PROMPT_TOKENS_SAVED.inc(saved, level=state["level"])
+        logger.info(
+            f"System prompt: {prompt_tokens['tokens']} tokens, {saved} saved by dropping "
+            f"{prompt_tokens['dropped_messages']} messages and {prompt_tokens['dropped_examples']} examples"
         )
+        chat_model = get_agent(CHAT_MODEL, model_settings=CHAT_SETTINGS)
+        deps = agent_deps(FINAL_SYSTEM_PROMPT)
+        if get_emitter(config) is None:
+            chat_result = await run_agent("chat", chat_model, state["messages"][-1].content, deps=deps)
+            output = chat_result.output
+        else:
+            # Forward tokens to the client as they arrive
+            output = ""
+            start = time.perf_counter()
+            with span("chat"):
+                async with chat_model.run_stream(
+                    state["messages"][-1].content, deps=deps
+                ) as stream_result:
+                    async for delta in stream_result.stream_text(delta=True):
+                        output += delta
+                        await emit_event(config, "token", {"content": delta})
+            record_model_call("chat", chat_model.model, time.perf_counter() - start, stream_result.usage())
+
+        # Nodes return only what they change; the messages reducer appends the new message
+        update = {
+            "messages": [{"role": "assistant", "content": output}],
+            "original_response": (state.get("original_response") or "") + output,
+            "extract_code": None,
+        }
+
+        # Only level 2 replies contain code that is tested, and only replies with code blocks
+        # need extracting; the solution itself is usually read from the reply without a model
+        if needs_extraction(state["level"], output):
+            solution = extract_solution(output)
+            if solution is not None and code_hash(solution["code"], solution["language"]) in (
+                state.get("attempts") or {}
+            ):
+                # Code tested earlier this turn keeps its verdict and needs no validation code
+                update["extract_code"] = ExtractCode(
+                    extracted_code=solution["code"],
+                    validation_code="",
+                    language=solution["language"],
+                    test_cases=[],
+                )
+            else:
+                await emit_event(config, "stage", {"stage": "extract"})
+                update["extract_code"] = await ChatBot.extract_code(output)
 
-        state["messages"].append({"role": "assistant", "content": chat_result.output})
-        self._original_response[0] = True
-        self._original_response[1] += chat_result.output
+        return update
+
+    @staticmethod
+    async def extract_code(reply: str) -> ExtractCode | None:
+        """
+        Extract the solution code from a reply and write validation code for it.
+
+        Args:
+            reply (str): The assistant's reply.
+
+        Returns:
+            ExtractCode | None: The solution with its validation code, or None if the reply holds
+                no code the code runner can run.
+        """
+        solution = extract_solution(reply)
+        if solution is not None:
+            validation_model = get_agent(
+                CHAT_MODEL,
+                system_prompt=VALIDATION_SYSTEM_PROMPT,
+                output_type=ValidationCodeOutput,
+                model_settings=CHAT_SETTINGS,
+            )
+            validation_result = await run_agent(
+                "extraction",
+                validation_model,
+                f"Language: {solution['language']}\n\nSolution code:\n{solution['code']}",
+                deps=agent_deps(),
+            )
+            return ExtractCode(
+                extracted_code=solution["code"],
+                validation_code=validation_result.output["validation_code"],
+                language=solution["language"],
+                test_cases=validation_result.output.get("test_cases") or [],
+            )
 
-        self._extractor_model = Agent(
-            model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
+        # Code blocks whose language could not be told locally are left to the extractor model
+        extractor_model = get_agent(
+            CHAT_MODEL,
             system_prompt=EXTRACTION_SYSTEM_PROMPT,
-            model_settings=self._chat_settings,
-            deps_type=AgentDeps,
             output_type=ChatbotCodeOutput,
+            model_settings=CHAT_SETTINGS,
         )
-
-        extractor_result = await self._extractor_model.run(
-            state["messages"][-1]["content"], deps=self._deps
+        extractor_result = await run_agent("extraction", extractor_model, reply, deps=agent_deps())
+        language = LANGUAGE_TAGS.get((extractor_result.output["extracted_code_language"] or "").lower())
+        if language is None or not extractor_result.output["extracted_code"].strip():
+            return None
+        return ExtractCode(
+            extracted_code=extractor_result.output["extracted_code"],
+            validation_code=extractor_result.output["validation_code"],
+            language=language,
+            test_cases=extractor_result.output.get("test_cases") or [],
         )
-        if (
-            type(extractor_result.output) == ChatbotCodeOutput
-            and extractor_result.output["extracted_code"].lower() == "python"
-        ):
-            state["extract_code"] = ExtractCode(
-                extracted_code=extractor_result.output["extracted_code"],
-                validation_code=extractor_result.output["validation_code"],
-                language=extractor_result.output["extracted_code_language"],
-            )
 
-        print("DEBUG: Exiting call_model")
-        return state
-
-    async def try_running(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        print("DEBUG: Entering try_running")
-        if state["extract_code"]:
-            resp = requests.post(
-                self._EXECUTE_URL,
-                json={
-                    "code": state["extract_code"]["extracted_code"]+"\n\n\n"+state["extract_code"]["validation_code"],
-                    "language": state["extract_code"]["language"],
-                },
+    @staticmethod
+    async def try_running(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        with span("try_running"):
+            return await ChatBot._try_running(state, config)
+
+    @staticmethod
+    async def _try_running(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        if not state["extract_code"]:
+            return {"stop_reason": "no_code"}
+
+        extract = state["extract_code"]
+        iterations = state.get("iterations", 0) + 1
+        attempts = dict(state.get("attempts") or {})
+        key = code_hash(extract["extracted_code"], extract["language"])
+        update = {"extract_code": None, "iterations": iterations, "attempts": attempts}
+        if key in attempts:
+            # Code that failed once fails again; feeding back the same verdict would only repeat it
+            logger.info("The reflection loop resubmitted code it already tested, stopping")
+            return {**update, "stop_reason": "repeated_code"}
+
+        try:
+            passed, output, advice = await ChatBot.verdict(extract, config)
+        except CodeRunnerError as e:
+            # The runner being down says nothing about the code; another attempt would only fail
+            # the same way
+            logger.error(f"Stopping the reflection loop, the code could not be run: {e}")
+            return {"extract_code": None, "stop_reason": "runner_unavailable"}
+        attempts[key] = passed
+        if passed:
+            code_replacement_model = get_agent(
+                CHAT_MODEL,
+                system_prompt=CODE_REPLACEMENT_PROMPT,
+                output_type=ReplacementOutput,
+                model_settings=REPLACEMENT_SETTINGS,
             )
-            result = resp.json()
-            print(result)
-            if resp.status_code == 200:
-                output = result.get("output")
-            else:
-                output = result
-
-            self._judge_model = Agent(
-                model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
-                system_prompt=JUDGE_SYSTEM_PROMPT,
-                output_type=JudgeOutput,
-                model_settings=self._judge_settings,
-                deps_type=AgentDeps,
+            await emit_event(config, "stage", {"stage": "replace"})
+            prompt = "Original:\n"+state["original_response"]+"\n\nUser-Provided Code:\n\n"+extract["extracted_code"]
+            replacement_result = await run_agent(
+                "replacement", code_replacement_model, prompt, deps=agent_deps()
             )
+            return {
+                **update,
+                "messages": [{
+                    "role":"assistant",
+                    "content":f"```{FENCE_TAGS.get(extract['language'], extract['language'])}\n"+replacement_result.output.extracted_code+"```\n\n\n"+replacement_result.output.extracted_code_explanation
+                }],
+                "original_response": "",
+                "stop_reason": "passed",
+            }
 
-            judge_result = await self._judge_model.run(
-                user_prompt="Code:\n"
-                + state["extract_code"]["extracted_code"]+"\n\n\n"+state["extract_code"]["validation_code"]
-                + "\nOutput"
-                + (output or "Error"),
-                deps=self._deps,
+        stop_reason = ChatBot.budget_exhausted(state, iterations)
+        if stop_reason is not None:
+            logger.info(f"Stopping the reflection loop after {iterations} iterations: {stop_reason}")
+            return {**update, "stop_reason": stop_reason}
+        return {
+            **update,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"This solution code is incorrect, as i get the incorrect output: "
+                    + output
+                    + "\nHere's my advice on correcting it: \n"
+                    + advice,
+                }
+            ],
+        }
+
+    @staticmethod
+    def budget_exhausted(state: Dict[str, Any], iterations: int) -> str | None:
+        """
+        Decide whether the reflection loop must stop after a failed attempt.
+
+        Args:
+            state (Dict[str, Any]): The graph state with the loop's budget.
+            iterations (int): The iterations run so far this turn.
+
+        Returns:
+            str | None: 'max_iterations' or 'deadline' if another iteration is not allowed,
+                None otherwise.
+        """
+        if iterations >= state.get("max_iterations", REFLECTION_MAX_ITERATIONS):
+            return "max_iterations"
+        # Stop early when another iteration, taking as long as the average one so far, would
+        # end past the deadline
+        now = time.monotonic()
+        if state.get("deadline") and now + (now - state["started_at"]) / iterations > state["deadline"]:
+            return "deadline"
+        return None
+
+    @staticmethod
+    async def verdict(extract: ExtractCode, config: RunnableConfig) -> tuple[bool, str, str]:
+        """
+        Run extracted code against its tests and judge the result.
+
+        Args:
+            extract (ExtractCode): The solution code with its test cases and validation code.
+            config (RunnableConfig): The graph config holding the code runner.
+
+        Returns:
+            tuple[bool, str, str]: Whether the code passed, the output it was judged on and the
+                advice for correcting it.
+
+        Raises:
+            CodeRunnerError: If no code runner is configured or it could not run the code.
+        """
+        await emit_event(config, "stage", {"stage": "run"})
+        code_runner = ((config or {}).get("configurable") or {}).get("code_runner")
+        if code_runner is None:
+            raise CodeRunnerError("No code runner configured")
+        batch = None
+        if extract.get("test_cases"):
+            # Structured test cases give a verdict without asking the judge model
+            batch = await code_runner.execute_batch(
+                extract["extracted_code"],
+                extract["test_cases"],
+                extract["language"],
             )
-            print(judge_result.output)
-            if not judge_result.output["passed"]:
-                state["messages"].append(
-                    {
-                        "role": "user",
-                        "content": f"This solution code is incorrect, as i get the incorrect output: "
-                        + output
-                        + "\nHere's my advice on correcting it: \n"
-                        + judge_result.output["advice"],
-                    }
-                )
-            else:
-                self._code_replacement_model = Agent(
-                    model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
-                    system_prompt=CODE_REPLACEMENT_PROMPT,
-                    model_settings=self._replacement_settings,
-                    output_type = ReplacementOutput,
-                    deps_type=AgentDeps
-                )
-                prompt = "Original:\n"+self._original_response[1]+"\n\nUser-Provided Code:\n\n"+state["extract_code"]["extracted_code"]
-                replacement_result = await self._code_replacement_model.run(prompt)
-                state["messages"].append({
-                    "role":"assistant",
-                    "content":'```python\n'+replacement_result.output.extracted_code+"```\n\n\n"+replacement_result.output.extracted_code_explanation
-                })
-                self._original_response[0] = False
-            state["extract_code"] = None
-        print("DEBUG: Exiting try_running")
-        return state
-
-    async def create_reflection(self):
-        print("DEBUG: Entering create_reflection")
-        agent_graph = (
+            if not batch["ok"]:
+                # Broken test cases say nothing about the solution; fall back to the
+                # validation code
+                logger.warning(f"Code runner rejected the test cases: {batch['error']}")
+                batch = None
+        if batch is None:
+            result = await code_runner.execute(
+                extract["extracted_code"]+"\n\n\n"+extract["validation_code"],
+                extract["language"],
+                solution=extract["extracted_code"],
+                harness=extract["validation_code"],
+            )
+            output = result["output"]
+            ok = result["ok"]
+
+        verdict = None if batch is not None else local_verdict(
+            output, ok, extract["validation_code"]
+        )
+        if batch is not None:
+            verdict_stats.record("batch")
+            return batch["passed"], describe_batch(batch), "Make the solution pass the failing test cases above."
+        if verdict is not None:
+            verdict_stats.record("local")
+            return verdict["passed"], output, verdict["advice"]
+        verdict_stats.record("judge")
+        judge_model = get_agent(
+            CHAT_MODEL,
+            system_prompt=JUDGE_SYSTEM_PROMPT,
+            output_type=JudgeOutput,
+            model_settings=JUDGE_SETTINGS,
+        )
+        await emit_event(config, "stage", {"stage": "judge"})
+        judge_result = await run_agent(
+            "judge",
+            judge_model,
+            user_prompt="Code:\n"
+            + extract["extracted_code"]+"\n\n\n"+extract["validation_code"]
+            + "\nOutput"
+            + (output or "Error"),
+            deps=agent_deps(),
+        )
+        logger.debug(f"Judge verdict: {judge_result.output}")
+        return judge_result.output["passed"], output, judge_result.output["advice"]
+
+    @staticmethod
+    def build_agent_graph() -> CompiledStateGraph:
+        return (
             StateGraph(State)
-            .add_node(self.summarize, "summarize")
-            .add_node(self.call_model, "call_model")
-            .add_conditional_edges(START, self.should_run)
-            .add_edge("summarize", "call_model")
+            .add_node("call_model", ChatBot.call_model)
+            .add_edge(START, "call_model")
             .add_edge("call_model", END)
             .compile()
         )
-        judge_graph = (
+
+    @staticmethod
+    def build_judge_graph() -> CompiledStateGraph:
+        return (
             StateGraph(State)
-            .add_node(self.try_running, "try_running")
+            .add_node("try_running", ChatBot.try_running)
             .add_edge(START, "try_running")
             .add_edge("try_running", END)
             .compile()
         )
-        reflection_graph = create_reflection_graph(agent_graph, judge_graph).compile()
-        print("DEBUG: Exiting create_reflection")
-        return reflection_graph
 
-    async def create_agent(self):
-        print("DEBUG: Entering create_agent")
-        agent_graph = (
-            StateGraph(State)
-            .add_node(self.summarize, "summarize")
-            .add_node(self.call_model, "call_model")
-            .add_conditional_edges(START, self.should_run)
-            .add_edge("summarize", "call_model")
-            .add_edge("call_model", END)
-            .compile()
-        )
-        print("DEBUG: Exiting create_agent")
-        return agent_graph
+    @staticmethod
+    def build_reflection_graph() -> CompiledStateGraph:
+        return create_reflection_graph(
+            get_graph("agent", ChatBot.build_agent_graph),
+            get_graph("judge", ChatBot.build_judge_graph),
+        ).compile()
 
-    async def chat(self, message: str | None = None) -> Dict[str, str]:
+    @staticmethod
+    def warm_up() -> None:
+        """
+        Compile the graphs and create the agents ahead of the first request.
+        """
+        get_graph("reflection", ChatBot.build_reflection_graph)
+        if API_KEY:
+            get_agent(SUMMARIZER_MODEL, system_prompt=INCREMENTAL_SUMMARIZER_PROMPT, model_settings=SUMMARIZER_SETTINGS)
+            get_agent(CHAT_MODEL, model_settings=CHAT_SETTINGS)
+            get_agent(CHAT_MODEL, system_prompt=EXTRACTION_SYSTEM_PROMPT, output_type=ChatbotCodeOutput, model_settings=CHAT_SETTINGS)
+            get_agent(CHAT_MODEL, system_prompt=VALIDATION_SYSTEM_PROMPT, output_type=ValidationCodeOutput, model_settings=CHAT_SETTINGS)
+            get_agent(CHAT_MODEL, system_prompt=JUDGE_SYSTEM_PROMPT, output_type=JudgeOutput, model_settings=JUDGE_SETTINGS)
+            get_agent(CHAT_MODEL, system_prompt=CODE_REPLACEMENT_PROMPT, output_type=ReplacementOutput, model_settings=REPLACEMENT_SETTINGS)
+
+    async def chat(
+        self, message: str | None = None, emit: Emitter | None = None
+    ) -> Dict[str, Any]:
+        """
+        Run one turn of the conversation.
+
+        Args:
+            message (str | None): The user's message, if any.
+            emit (Emitter | None): Receives 'token' and 'stage' events while the turn runs.
+
+        Returns:
+            Dict[str, Any]: The response, the summary and, at level 2, the messages of the
+                reflection loop, the number of attempts it tested and why it stopped, which is
+                'cached' for a response served from the response cache.
+        """
+        level = current_level.set(str(self._level))
+        try:
+            with span("turn"):
+                return await self._chat(message, emit)
+        finally:
+            current_level.reset(level)
+
+    async def _chat(self, message: str | None, emit: Emitter | None) -> Dict[str, Any]:
         result = None
+        config = {"configurable": {"emit": emit, "code_runner": self._code_runner}}
         if message:
             self._messages.append({"role": "user", "content": message})
+
+        cache_scope = None
+        if self._response_cache is not None:
+            cache_scope = ResponseCache.scope(
+                render_problem(self._problem), self._level, self._messages[:-1], self._summary or ""
+            )
+            cached = await self._response_cache.get(cache_scope, self._messages[-1]["content"])
+            if cached is not None:
+                if emit is not None:
+                    await emit("token", {"content": cached})
+                return {
+                    "response": cached,
+                    "summary": self._summary or "",
+                    "reflection": [],
+                    "iterations": 0,
+                    "stop_reason": "cached",
+                }
+
+        started_at = time.monotonic()
+        state = State(
+            messages=self._messages,
+            extract_code=None,
+            problem=self._problem,
+            summary=self._summary or "",
+            level=self._level,
+            original_response="",
+            iterations=0,
+            max_iterations=self._max_iterations,
+            started_at=started_at,
+            deadline=started_at + self._reflection_timeout,
+            attempts={},
+            stop_reason="",
+        )
+        reflection = []
         if self._level == 2:
-            graph = await self.create_reflection()
-            state = State(messages=self._messages, extract_code=None)
-            result = await graph.ainvoke(state)
-            return {
-                "response": result["messages"][-2].content,
-                "summary": self._summary,
-            }
+            graph = get_graph("reflection", ChatBot.build_reflection_graph)
+            # Each iteration takes two graph steps; keep the recursion limit from cutting the
+            # loop short of its own budget
+            config["recursion_limit"] = max(25, 2 * self._max_iterations + 8)
+            result = await graph.ainvoke(state, config=config)
+            # The tested rewrite, or the last draft when the loop stopped without one
+            response = next(m.content for m in reversed(result["messages"]) if m.type == "ai")
+            # Every message the reflection loop added this turn: drafts, test feedback, rewrites
+            reflection = [
+                {"role": "assistant" if m.type == "ai" else "user", "content": m.content}
+                for m in result["messages"][len(self._messages):]
+            ]
+            REFLECTION_ITERATIONS.observe(result["iterations"], stop=result["stop_reason"])
         else:
-            graph = await self.create_agent()
-            state = {
-                "messages": self._messages,
-            }
-            result = await graph.ainvoke(state)
-            return {
-                "response": result["messages"][-1].content,
-                "summary": self._summary,
-            }
+            graph = get_graph("agent", ChatBot.build_agent_graph)
+            result = await graph.ainvoke(state, config=config)
+            response = result["messages"][-1].content
+        if cache_scope is not None and (
+            self._level != 2 or result["stop_reason"] in CACHEABLE_STOP_REASONS
+        ):
+            await self._response_cache.set(cache_scope, self._messages[-1]["content"], response)
+        return {
+            "response": response,
+            "summary": result["summary"],
+            "reflection": reflection,
+            "iterations": result["iterations"],
+            "stop_reason": result["stop_reason"],
+        }
+
+    async def stream(self, message: str | None = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run one turn of the conversation, yielding events as they happen.
+
+        Yields 'token' and 'stage' events while the turn runs, followed by a final 'done'
+        event carrying the chat result, or an 'error' event if the turn failed.
+
+        Args:
+            message (str | None): The user's message, if any.
+
+        Yields:
+            Dict[str, Any]: Events of the form {"event": ..., "data": ...}.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def emit(event: str, data: Dict[str, Any]) -> None:
+            await queue.put({"event": event, "data": data})
+
+        async def run() -> None:
+            try:
+                result = await self.chat(message=message, emit=emit)
+                await queue.put({"event": "done", "data": result})
+            except Exception as e:
+                await queue.put({"event": "error", "data": {"detail": str(e)}})
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await queue.get()
+                yield item
+                if item["event"] in ("done", "error"):
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
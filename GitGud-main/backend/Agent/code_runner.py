@@ -0,0 +1,234 @@
+"""
+This module provides the async client for the code runner service.
+
+The client shares one pooled httpx.AsyncClient, bounds the number of concurrent executions,
+applies a deadline to every call, retries transient failures and opens a circuit breaker when
+the runner keeps failing, so a slow or unavailable runner cannot stall the chat endpoints.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List
+import httpx
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {502, 503, 504}
+TIMING_KEYS = ("queue_ms", "compile_ms", "run_ms", "compile_cached")
+
+
+class CodeRunnerError(Exception):
+    """Raised when the code runner could not execute a submission."""
+
+
+def describe_batch(batch: Dict[str, Any]) -> str:
+    """
+    Describe the outcome of a test batch for the chat model.
+
+    Args:
+        batch (Dict[str, Any]): The result of `CodeRunnerClient.execute_batch`.
+
+    Returns:
+        str: The error that stopped the program, if any, and every failing test case with the
+            output it produced.
+    """
+    lines = []
+    if batch.get("error"):
+        lines.append(f"Error: {batch['error']}")
+    for test in batch.get("results", []):
+        if test["passed"] or (batch.get("error") and test.get("error") == batch["error"]):
+            continue
+        got = f"error {test['error']}" if test.get("error") else test.get("output")
+        lines.append(f"- {test['input']}: expected {test.get('expected')}, got {got}")
+    passed = sum(test["passed"] for test in batch.get("results", []))
+    lines.append(f"{passed}/{len(batch.get('results', []))} test cases passed")
+    return "\n".join(lines)
+
+
+class CodeRunnerClient:
+    """
+    Async client for the code runner's /execute and /execute_batch endpoints.
+
+    Attributes:
+        url (str): The URL of the /execute endpoint.
+        batch_url (str): The URL of the /execute_batch endpoint, next to /execute by default.
+        timeout (float): Deadline in seconds for a call, including retries.
+        retries (int): Number of retries after a transient failure.
+        backoff (float): Initial delay in seconds between retries, doubled after each retry.
+        failure_threshold (int): Consecutive failures after which the circuit opens.
+        reset_after (float): Seconds the circuit stays open before a trial call is let through.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        client: httpx.AsyncClient | None = None,
+        timeout: float = 20.0,
+        max_concurrency: int = 8,
+        retries: int = 2,
+        backoff: float = 0.25,
+        failure_threshold: int = 5,
+        reset_after: float = 30.0,
+        batch_url: str | None = None,
+    ):
+        self.url = url
+        self.batch_url = batch_url or url.rstrip("/") + "_batch"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+            ),
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    async def execute(
+        self,
+        code: str,
+        language: str,
+        solution: str | None = None,
+        harness: str | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute a submission on the code runner.
+
+        When the solution and the harness that tests it are given separately, the runner compiles
+        the solution once and reuses it for every harness it is tested with.
+
+        Args:
+            code (str): The source code to run.
+            language (str): The language of the code, e.g. 'python'.
+            solution (str | None): The solution part of `code`.
+            harness (str | None): The test code part of `code`.
+
+        Returns:
+            Dict[str, Any]: 'ok' is True if the program ran successfully; 'output' holds its
+                output, or the error reported by the runner otherwise. 'queue_ms' and 'run_ms'
+                hold the time the job waited for a runner worker and the time it ran, when reported.
+                'compile_ms' and 'compile_cached' report the compilation time and whether the
+                compiled program was reused.
+
+        Raises:
+            CodeRunnerError: If the circuit is open or the runner could not be reached in time.
+        """
+        payload = {"code": code, "language": language}
+        if solution is not None and harness is not None:
+            payload.update(solution=solution, harness=harness)
+        resp = await self._call(self.url, payload)
+        body = self._body(resp)
+        if not isinstance(body, dict):
+            return {"ok": False, "output": str(body)}
+        timing = {key: body[key] for key in TIMING_KEYS if key in body}
+        if resp.status_code == 200:
+            return {"ok": True, "output": body.get("output", ""), **timing}
+        return {"ok": False, "output": str(body.get("error", body)), **timing}
+
+    async def execute_batch(
+        self, solution: str, tests: List[Dict[str, Any]], language: str
+    ) -> Dict[str, Any]:
+        """
+        Run a solution against test cases in one process on the code runner.
+
+        Args:
+            solution (str): The solution code.
+            tests (List[Dict[str, Any]]): Test cases with an 'input' expression calling the solution
+                and an optional 'expected' expression for its result.
+            language (str): The language of the code, e.g. 'python'.
+
+        Returns:
+            Dict[str, Any]: 'ok' is False if the runner rejected the batch, with the reason in
+                'error'; 'harness_error' is then True if the test cases themselves could not be
+                run, e.g. because they are not valid in the language. Otherwise 'passed' tells whether every test passed, 'results' holds the
+                per-test verdicts, times and memory, 'output' any other output of the program and
+                'error' the compilation or runtime error that stopped it, if any.
+
+        Raises:
+            CodeRunnerError: If the circuit is open or the runner could not be reached in time.
+        """
+        payload = {"solution": solution, "tests": tests, "language": language}
+        resp = await self._call(self.batch_url, payload)
+        body = self._body(resp)
+        if resp.status_code != 200 or not isinstance(body, dict):
+            error = body.get("error", body) if isinstance(body, dict) else body
+            return {
+                "ok": False,
+                "passed": False,
+                "results": [],
+                "output": "",
+                "error": str(error),
+                "harness_error": isinstance(body, dict) and bool(body.get("harness_error")),
+            }
+        return {"ok": True, **body}
+
+    async def _call(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        self._check_circuit()
+        try:
+            with span("code_runner"):
+                resp = await asyncio.wait_for(self._post(url, payload), self.timeout)
+        except (asyncio.TimeoutError, httpx.HTTPError, CodeRunnerError) as e:
+            self._record_failure()
+            raise CodeRunnerError(f"Code runner request failed: {e!r}") from e
+        self._failures = 0
+        self._opened_at = None
+        return resp
+
+    async def _post(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._slots:
+                    resp = await self._client.post(url, json=payload)
+                if resp.status_code not in RETRY_STATUS_CODES:
+                    return resp
+                error = CodeRunnerError(f"Code runner returned {resp.status_code}")
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.retries:
+                raise error
+            logger.warning(f"Retrying code runner request after {error!r}")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    @staticmethod
+    def _body(resp: httpx.Response) -> Any:
+        try:
+            return resp.json()
+        except ValueError:
+            return resp.text
+
+    def _check_circuit(self) -> None:
+        if self._opened_at is None:
+            return
+        if time.monotonic() - self._opened_at < self.reset_after:
+            raise CodeRunnerError("Code runner circuit is open")
+        # Half-open: let this call through as a trial
+        self._opened_at = None
+        self._failures = self.failure_threshold - 1
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.error("Code runner keeps failing, opening the circuit")
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the client statistics.
+
+        Returns:
+            Dict[str, Any]: Consecutive failures and whether the circuit is open.
+        """
+        return {"consecutive_failures": self._failures, "circuit_open": int(self._opened_at is not None)}
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self._client.aclose()
@@ -0,0 +1,127 @@
+"""
+This module finds solution code in assistant replies without a model call.
+
+Replies show code in fenced Markdown blocks, so the solution and its language can usually be
+read straight from the reply. The extractor model is then only needed to write validation code
+for it, and only at level 2, the one level whose replies contain code and are tested.
+"""
+
+import hashlib
+import re
+from typing import List, TypedDict
+
+# Languages the code runner can execute, by fence tag
+LANGUAGE_TAGS = {
+    "python": "python",
+    "python3": "python",
+    "py": "python",
+    "c++": "c++",
+    "cpp": "c++",
+    "cc": "c++",
+    "cxx": "c++",
+    "c": "c",
+    "java": "java",
+}
+CODE_BLOCK = re.compile(r"^[ \t]*```[ \t]*([\w+#-]*)[^\n]*\n(.*?)^[ \t]*```", re.DOTALL | re.MULTILINE)
+# Signals for untagged blocks, checked in order
+LANGUAGE_HINTS = [
+    ("java", re.compile(r"\b(public|private)\s+(static\s+)?\w[\w<>\[\], ]*\s+\w+\s*\(|System\.out\.")),
+    ("c++", re.compile(r"#include\s*<|\bstd::|\bvector<|\bcout\s*<<")),
+    ("python", re.compile(r"^\s*(def|class)\s+\w+.*:\s*$|^\s*(from\s+\w+\s+)?import\s+\w+", re.MULTILINE)),
+]
+
+
+class CodeBlock(TypedDict):
+    """A fenced block of code in a supported language."""
+
+    language: str
+    code: str
+
+
+def detect_language(code: str) -> str | None:
+    """
+    Guess the language of an untagged code block.
+
+    Args:
+        code (str): The code.
+
+    Returns:
+        str | None: The language, or None if it's not one the code runner supports.
+    """
+    for language, hint in LANGUAGE_HINTS:
+        if hint.search(code):
+            return language
+    return None
+
+
+def find_code_blocks(text: str) -> List[CodeBlock]:
+    """
+    Find the fenced code blocks in a supported language in a reply.
+
+    Args:
+        text (str): The reply.
+
+    Returns:
+        List[CodeBlock]: The code blocks in order of appearance.
+    """
+    blocks = []
+    for match in CODE_BLOCK.finditer(text):
+        tag, code = match.group(1).lower(), match.group(2).strip()
+        language = LANGUAGE_TAGS.get(tag) if tag else detect_language(code)
+        if language and code:
+            blocks.append(CodeBlock(language=language, code=code))
+    return blocks
+
+
+def extract_solution(text: str) -> CodeBlock | None:
+    """
+    Extract the solution code from a reply.
+
+    The solution is taken to be the longest code block; other blocks in the same language are
+    usually fragments or usage examples of it.
+
+    Args:
+        text (str): The reply.
+
+    Returns:
+        CodeBlock | None: The solution, or None if the reply holds no runnable code.
+    """
+    blocks = find_code_blocks(text)
+    if not blocks:
+        return None
+    return max(blocks, key=lambda block: len(block["code"]))
+
+
+def needs_extraction(level: int, text: str) -> bool:
+    """
+    Decide whether a reply needs the extractor model.
+
+    Args:
+        level (int): The assistance level (0, 1, or 2).
+        text (str): The reply.
+
+    Returns:
+        bool: True if code in the reply is tested, i.e. at level 2, and the reply contains a code
+            block that is in a supported language or untagged.
+    """
+    if level != 2:
+        return False
+    return any(
+        not match.group(1) or match.group(1).lower() in LANGUAGE_TAGS
+        for match in CODE_BLOCK.finditer(text)
+    )
+
+
+def code_hash(code: str, language: str | None) -> str:
+    """
+    Fingerprint solution code, ignoring whitespace at line ends and blank lines.
+
+    Args:
+        code (str): The solution code.
+        language (str | None): The language of the code.
+
+    Returns:
+        str: The hex digest identifying the code.
+    """
+    normalized = "\n".join(line.rstrip() for line in code.strip().splitlines() if line.strip())
+    return hashlib.sha256(f"{language}\n{normalized}".encode()).hexdigest()
@@ -1,13 +1,27 @@
-from typing import TypedDict, Annotated, Any
+from typing import TypedDict, Annotated, Any, NotRequired
 from pydantic import BaseModel, Field
 from pydantic.dataclasses import dataclass
 from langgraph.graph.message import add_messages
 
 
+class TestCase(TypedDict):
+    """A test case run against extracted solution code by the code runner."""
+
+    input: str = Field(
+        ...,
+        description="An expression in the solution's language that calls the solution, e.g. 'Solution().twoSum([2, 7, 11, 15], 9)' in Python or 'new Solution().twoSum(new int[] {2, 7, 11, 15}, 9)' in Java",
+    )
+    expected: str = Field(
+        ...,
+        description="An expression in the solution's language for the expected result, of the same type as the result, e.g. '[0, 1]' in Python, 'std::vector<int>{0, 1}' in C++ or 'new int[] {0, 1}' in Java",
+    )
+
+
 class ExtractCode(TypedDict):
     """Type class for extracting Python code."""
 
     validation_code: str
+    test_cases: NotRequired[list[TestCase]]
     extracted_code: str = Field(
         ...,
         description="Only the clean solution code (e.g., the Solution class) without any test cases.",
@@ -33,11 +47,30 @@ class JudgeOutput(TypedDict):
     advice: str = Field(..., description="Give advice on correcting the solution")
 
 
+class CompactProblem(TypedDict):
+    """A problem statement split into its parts, as stored on the chat."""
+
+    statement: str
+    examples: list[str]
+    constraints: list[str]
+
+
 class State(TypedDict):
-    """State class containing messages and extracted code."""
+    """State class containing messages, extracted code and per-conversation data."""
 
     messages: Annotated[list, add_messages]
     extract_code: ExtractCode | None = None
+    problem: CompactProblem
+    summary: str
+    level: int
+    original_response: str
+    # Bounds and progress of the level-2 reflection loop
+    iterations: int
+    max_iterations: int
+    started_at: float
+    deadline: float
+    attempts: dict[str, bool]
+    stop_reason: str
 
 
 class ChatMessage(BaseModel):
@@ -54,17 +87,9 @@ class ChatMessage(BaseModel):
             ]
         }
 
-class ChatbotCodeOutput(TypedDict):
-    """Output model for the chatbot."""
+class ValidationCodeOutput(TypedDict):
+    """Output model for validation code written for extracted solution code."""
 
-    extracted_code_language: str = Field(
-        ...,
-        description="The programming language used for the solution (e.g., 'Python', 'Java').",
-    )
-    extracted_code: str = Field(
-        ...,
-        description="Only the clean solution code (e.g., the Solution class).",
-    )
     validation_code: str = Field(
         ...,
         description="Validation Code should print/give an output 'True' if it passes all test cases",
@@ -97,6 +122,23 @@ class ChatbotCodeOutput(TypedDict):
             """,
         ],
     )
+    test_cases: NotRequired[list[TestCase]] = Field(
+        ...,
+        description="The same test cases as structured input/expected expressions, so they can be checked individually",
+    )
+
+
+class ChatbotCodeOutput(ValidationCodeOutput):
+    """Output model for the chatbot."""
+
+    extracted_code_language: str = Field(
+        ...,
+        description="The programming language used for the solution (e.g., 'Python', 'Java').",
+    )
+    extracted_code: str = Field(
+        ...,
+        description="Only the clean solution code (e.g., the Solution class).",
+    )
 
 class ReplacementOutput(BaseModel):
     """Output model for the chatbot."""
@@ -116,7 +158,4 @@ class AgentDeps:
     """Dependencies for the agent."""
 
     api_key: str
-    http_client: Any
-
-    class Config:
-        arbitrary_types_allowed = True
+    system_prompt: str = ""
@@ -0,0 +1,194 @@
+"""
+This module builds the chat model's system prompt within a token budget.
+
+Problem statements are compacted once, when the chat is prepared, into the statement, its
+examples and its constraints, and stored on the chat. Each turn the prompt is assembled from the
+level instructions, the problem, the conversation summary and the recent history, in order of
+priority: the instructions, statement, constraints and first example are always kept; the
+summary and the most recent messages come next; further examples are added while the budget
+allows. Tokens are counted with `tokens.count_tokens`.
+"""
+
+import os
+import re
+from typing import Dict, List, Sequence, Tuple
+from Agent.models import CompactProblem
+from tokens import count_tokens
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+SECTION_HEADER = re.compile(r"^(Example\s*\d*|Constraints|Follow[- ]?up)\s*:\s*(.*)$", re.IGNORECASE)
+# Lines that start a new line of their own when fragmented statements are rejoined
+LINE_START = re.compile(r"^(- |(Input|Output|Explanation|Follow-up)\s*:)", re.IGNORECASE)
+# Statements scraped before superscripts were kept lose the caret, e.g. '10\n4' for 10^4
+SPLIT_POWER = re.compile(r"\b10 (\d{1,2})\b")
+SUMMARY_HEADER = "\n\nSummary of the earlier chat history:\n"
+HISTORY_HEADER = "\n\nThe below is the recent chat history:\n"
+
+
+def _join(lines: Sequence[str]) -> List[str]:
+    # Rejoin fragments of a sentence that the scraper put on separate lines
+    joined: List[str] = []
+    for line in lines:
+        if joined and not LINE_START.match(line) and not joined[-1].endswith((".", "?", "!")):
+            joined[-1] += " " + line
+        else:
+            joined.append(line)
+    return [re.sub(r" ([,.;:?!)\]])", r"\1", line) for line in joined]
+
+
+def compact_problem(statement: str) -> CompactProblem:
+    """
+    Split a problem statement into its statement, examples and constraints, without blank lines
+    and repeated whitespace.
+
+    Args:
+        statement (str): The plain-text problem statement.
+
+    Returns:
+        CompactProblem: The compacted problem.
+    """
+    statement_lines: List[str] = []
+    examples: List[List[str]] = []
+    constraints: List[str] = []
+    section = statement_lines
+    for line in statement.splitlines():
+        line = " ".join(line.replace("\xa0", " ").split())
+        if not line:
+            continue
+        header = SECTION_HEADER.match(line)
+        if header:
+            name = header.group(1).lower()
+            if name.startswith("example"):
+                examples.append([])
+                section = examples[-1]
+            elif name.startswith("constraints"):
+                section = constraints
+            else:
+                constraints.append("Follow-up:")
+                section = constraints
+            if header.group(2):
+                section.append(header.group(2))
+            continue
+        section.append(line)
+
+    constraints = [SPLIT_POWER.sub(r"10^\1", line) for line in _join(constraints)]
+    return CompactProblem(
+        statement="\n".join(_join(statement_lines)),
+        examples=["\n".join(_join(example)) for example in examples if example],
+        constraints=[line.removeprefix("- ") for line in constraints],
+    )
+
+
+def render_problem(problem: CompactProblem, examples: int | None = None) -> str:
+    """
+    Render a compacted problem as text.
+
+    Args:
+        problem (CompactProblem): The compacted problem.
+        examples (int | None): The number of examples to include; all of them by default.
+
+    Returns:
+        str: The problem text.
+    """
+    parts = [problem["statement"]]
+    for i, example in enumerate(problem["examples"][:examples], start=1):
+        parts.append(f"Example {i}:\n{example}")
+    if problem["constraints"]:
+        parts.append("Constraints:\n" + "\n".join(f"- {line}" for line in problem["constraints"]))
+    return "\n\n".join(part for part in parts if part)
+
+
+def _keep_tail(text: str, tokens: int, total: int) -> str:
+    if tokens <= 0:
+        return ""
+    # Start from the proportional share of the text and shorten it until it fits
+    length = len(text) * tokens // total
+    while length > 0:
+        tail = "..." + text[-length:]
+        if count_tokens(tail) <= tokens:
+            return tail
+        length = min(length - 1, length * 9 // 10)
+    return ""
+
+
+def build_system_prompt(
+    instructions: str,
+    problem: CompactProblem,
+    summary: str = "",
+    history: Sequence[str] = (),
+    budget: int = PROMPT_TOKEN_BUDGET,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Assemble the system prompt of a turn within a token budget.
+
+    Args:
+        instructions (str): The instructions of the assistance level.
+        problem (CompactProblem): The compacted problem.
+        summary (str): The summary of the earlier chat history.
+        history (Sequence[str]): The recent messages, oldest first, e.g. 'User: ...'.
+        budget (int): The number of tokens the prompt should fit in.
+
+    Returns:
+        Tuple[str, Dict[str, int]]: The prompt, and its 'tokens', the 'untrimmed' tokens of the
+            prompt with every example and message, and the 'dropped_examples' and
+            'dropped_messages'.
+    """
+    head = instructions + "\n\nProblem:\n"
+    example_tokens = [count_tokens(f"Example {i}:\n{e}") for i, e in enumerate(problem["examples"], 1)]
+    summary_tokens = count_tokens(summary)
+    summary_header_tokens = count_tokens(SUMMARY_HEADER) if summary else 0
+    message_tokens = [count_tokens(message) for message in history]
+    history_header_tokens = count_tokens(HISTORY_HEADER) if history else 0
+
+    tokens = count_tokens(head) + count_tokens(render_problem(problem, examples=1))
+    untrimmed = (
+        tokens
+        + sum(example_tokens[1:])
+        + summary_header_tokens
+        + summary_tokens
+        + history_header_tokens
+        + sum(message_tokens)
+    )
+
+    left = budget - tokens - summary_header_tokens - history_header_tokens
+    if summary_tokens > left:
+        summary = _keep_tail(summary, left, summary_tokens)
+        summary_tokens = count_tokens(summary)
+    left -= summary_tokens if summary else -summary_header_tokens
+
+    # The most recent messages matter most; older ones are covered by the summary
+    kept: List[str] = []
+    for message, cost in zip(reversed(history), reversed(message_tokens)):
+        if cost > left:
+            # Keep the end of the last message rather than nothing at all
+            role, _, content = message.partition(": ")
+            tail = _keep_tail(content, left - count_tokens(role + ": "), cost) if not kept else ""
+            if tail:
+                kept.append(f"{role}: {tail}")
+                left -= count_tokens(kept[-1])
+            break
+        kept.append(message)
+        left -= cost
+    kept.reverse()
+    if not kept:
+        left += history_header_tokens
+
+    examples = min(1, len(problem["examples"]))
+    for cost in example_tokens[1:]:
+        if cost > left:
+            break
+        examples += 1
+        left -= cost
+
+    prompt = head + render_problem(problem, examples=examples)
+    if summary:
+        prompt += SUMMARY_HEADER + summary
+    if kept:
+        prompt += HISTORY_HEADER + "\n".join(kept) + "\n"
+    return prompt, {
+        "tokens": budget - left,
+        "untrimmed": untrimmed,
+        "dropped_examples": len(problem["examples"]) - examples,
+        "dropped_messages": len(history) - len(kept),
+    }
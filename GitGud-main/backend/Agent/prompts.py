@@ -63,6 +63,32 @@ Formatting rules:
 """
 
 
+INCREMENTAL_SUMMARIZER_PROMPT = """
+You are a conversation flow summarizer.
+
+You are given the existing summary of a conversation between a user and an assistant, followed by new chat messages that happened after it. Extend the summary so it also covers the new messages. Focus on:
+
+- How the conversation progressed (questions, clarifications, new directions)
+- Any resolutions, follow-ups, or ending
+
+Formatting rules:
+- Output the complete updated summary in numbered steps, like a flow or timeline
+- Keep the existing steps, condensing them only if the summary grows long
+- Each step should be 1-2 sentences long
+- Do not include speaker names, timestamps, or extra explanations
+
+"""
+
+
+TEST_CASES_INSTRUCTIONS = """- Test Cases: Also list the same test cases as structured test cases, each with:
+    - input: a single expression that calls the solution
+    - expected: a single expression for the expected result, of the same type as the result
+- Write both expressions in the solution's language, never in another one:
+    - Python: input Solution().twoSum([2, 7, 11, 15], 9), expected [0, 1]
+    - C++: input [] { std::vector<int> nums{2, 7, 11, 15}; return Solution().twoSum(nums, 9); }(), expected std::vector<int>{0, 1}
+    - Java: input new Solution().twoSum(new int[] {2, 7, 11, 15}, 9), expected new int[] {0, 1}
+"""
+
 EXTRACTION_SYSTEM_PROMPT = """
 You are an AI assistant designed to extract solution code from user messages and generate corresponding validation code.
 
@@ -72,7 +98,18 @@ Instructions:
     - Test cases covering typical and edge scenarios.
     - Assertions to verify the correctness of the solution.
     - Clear comments explaining each test case.
-"""
+""" + TEST_CASES_INSTRUCTIONS
+
+VALIDATION_SYSTEM_PROMPT = """
+You are an AI assistant designed to generate validation code for a given solution code.
+
+Instructions:
+- Validation Code Generation: Based on the solution, generate validation code in the same language that includes:
+    - Test cases covering typical and edge scenarios.
+    - A line printing 'True' for every passing test case.
+    - Clear comments explaining each test case.
+- The validation code is appended to the solution code and run, so it must not repeat the solution.
+""" + TEST_CASES_INSTRUCTIONS
 
 CODE_REPLACEMENT_PROMPT= """
 You are an AI assistant designed to process user messages that contain both solution code and accompanying explanations.
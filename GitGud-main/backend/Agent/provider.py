@@ -0,0 +1,119 @@
+"""
+This module provides the application-wide connection to the LLM API.
+
+Every agent talks to Groq through one AsyncGroq client on one pooled httpx client, created in
+the FastAPI lifespan and handed to the agent registry. Connections are kept alive between turns
+(HTTP/2 when the 'h2' package is installed), so calls don't pay for a new TLS handshake. Calls
+have their own timeouts, and rate limits (429) and server errors (5xx) are retried by the Groq
+client with exponential backoff that honours Retry-After. A single agent call can override the
+timeout with the 'timeout' model setting.
+"""
+
+import importlib.util
+import logging
+import os
+from typing import Dict
+from groq import AsyncGroq
+from httpx import AsyncClient, Limits, Timeout
+from pydantic_ai.models import Model
+from pydantic_ai.models.groq import GroqModel
+from pydantic_ai.providers.groq import GroqProvider
+
+logger = logging.getLogger(__name__)
+
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+# Long enough to keep connections open between a user's turns; httpx closes them after 5s
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+
+def http2_available() -> bool:
+    """Check whether httpx can speak HTTP/2, which needs the optional 'h2' package."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class LLMProvider:
+    """
+    The shared Groq client and the models built on it.
+
+    Attributes:
+        http_client (AsyncClient): The pooled HTTP client.
+        groq_client (AsyncGroq): The Groq client, which retries rate limits and server errors.
+        http2 (bool): Whether HTTP/2 is used.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = GROQ_BASE_URL,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT_SECONDS,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.http2 = http2_available()
+        timeouts = Timeout(timeout, connect=connect_timeout)
+        self.http_client = AsyncClient(
+            http2=self.http2,
+            timeout=timeouts,
+            limits=Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.groq_client = AsyncGroq(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            timeout=timeouts,
+            max_retries=max_retries,
+        )
+        self._provider = GroqProvider(groq_client=self.groq_client)
+        self._models: Dict[str, Model] = {}
+
+    def model(self, name: str) -> Model | str:
+        """
+        Resolve a model identifier to a model on the shared client.
+
+        Args:
+            name (str): The model identifier, e.g. 'groq:qwen-qwq-32b'.
+
+        Returns:
+            Model | str: The shared model, or the identifier unchanged if it's not a Groq model.
+        """
+        provider, _, model_name = name.partition(":")
+        if provider != "groq" or not model_name:
+            return name
+        model = self._models.get(model_name)
+        if model is None:
+            model = GroqModel(model_name, provider=self._provider)
+            self._models[model_name] = model
+        return model
+
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        await self.http_client.aclose()
+
+
+def create_llm_provider() -> LLMProvider | None:
+    """
+    Create the LLM provider configured by the environment.
+
+    Returns:
+        LLMProvider | None: The provider, or None if GROQ_API_KEY is not set.
+    """
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        logger.warning("GROQ_API_KEY is not set, agents will create their own clients")
+        return None
+    provider = LLMProvider(api_key)
+    if not provider.http2:
+        logger.info("h2 is not installed, the LLM client uses HTTP/1.1")
+    return provider
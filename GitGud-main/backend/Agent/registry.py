@@ -0,0 +1,96 @@
+"""
+This module keeps process-wide pydantic_ai Agents and compiled LangGraph graphs.
+
+Agents are cached per (model, system prompt, output type, model settings) and graphs are
+compiled once per topology, so building a chatbot for a request is a dictionary lookup.
+Per-conversation data travels through the graph state and the AgentDeps passed at run time.
+Once an LLMProvider is registered with `use_provider`, every agent runs on its shared client.
+"""
+
+from typing import Any, Callable, Dict, Tuple
+from langgraph.graph.state import CompiledStateGraph
+from pydantic_ai import Agent, RunContext
+from Agent.models import AgentDeps
+from Agent.provider import LLMProvider
+
+_agents: Dict[Tuple, Agent] = {}
+_graphs: Dict[str, CompiledStateGraph] = {}
+_provider: LLMProvider | None = None
+
+
+def use_provider(provider: LLMProvider | None) -> None:
+    """
+    Run all agents on a shared LLM provider.
+
+    Agents created before are dropped so they are recreated on the provider.
+
+    Args:
+        provider (LLMProvider | None): The provider, or None to let agents resolve their own.
+    """
+    global _provider
+    _provider = provider
+    _agents.clear()
+
+
+def _deps_system_prompt(ctx: RunContext[AgentDeps]) -> str:
+    return ctx.deps.system_prompt
+
+
+def get_agent(
+    model: str,
+    system_prompt: str | None = None,
+    output_type: Any = str,
+    model_settings: Dict[str, Any] | None = None,
+) -> Agent:
+    """
+    Return the shared Agent for a model, prompt template and output type.
+
+    Args:
+        model (str): The model identifier, e.g. 'groq:qwen-qwq-32b'.
+        system_prompt (str | None): A static system prompt. When None, the system prompt
+            is read from `AgentDeps.system_prompt` on every run.
+        output_type (Any): The structured output type of the agent.
+        model_settings (Dict[str, Any] | None): Model settings such as temperature.
+
+    Returns:
+        Agent: The cached agent, created on first use.
+    """
+    key = (
+        model,
+        system_prompt,
+        output_type,
+        tuple(sorted((model_settings or {}).items())),
+    )
+    agent = _agents.get(key)
+    if agent is None:
+        agent = Agent(
+            model=_provider.model(model) if _provider is not None else model,
+            system_prompt=system_prompt or (),
+            output_type=output_type,
+            model_settings=model_settings,
+            deps_type=AgentDeps,
+        )
+        if system_prompt is None:
+            agent.system_prompt(_deps_system_prompt)
+        _agents[key] = agent
+    return agent
+
+
+def get_graph(
+    name: str, builder: Callable[[], CompiledStateGraph]
+) -> CompiledStateGraph:
+    """
+    Return the compiled graph registered under a name, compiling it on first use.
+
+    Args:
+        name (str): The name of the graph topology.
+        builder (Callable[[], CompiledStateGraph]): Builds and compiles the graph.
+
+    Returns:
+        CompiledStateGraph: The shared compiled graph.
+    """
+    graph = _graphs.get(name)
+    if graph is None:
+        graph = builder()
+        _graphs[name] = graph
+    return graph
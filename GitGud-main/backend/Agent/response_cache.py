@@ -0,0 +1,232 @@
+"""
+This module provides the cache of assistant responses.
+
+Many users open chats for the same popular problems, and every chat starts with the same
+opener, so the same question is often asked about the same problem with the same conversation
+before it. Responses are cached by the problem statement, the assistance level, the conversation
+so far and the normalized question. Lookups match exactly first; optionally, an embedding model
+(fastembed, if installed) also matches differently worded questions within the same problem,
+level and conversation.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Protocol, Sequence
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "21600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_EMBEDDING_MODEL = os.getenv("RESPONSE_CACHE_EMBEDDING_MODEL", "")
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+
+class Embedder(Protocol):
+    """Turns text into an embedding vector."""
+
+    def embed(self, text: str) -> List[float]: ...
+
+
+class FastEmbedder:
+    """
+    Local sentence embeddings with fastembed.
+
+    Attributes:
+        model_name (str): The fastembed model, e.g. 'BAAI/bge-small-en-v1.5'.
+    """
+
+    def __init__(self, model_name: str):
+        from fastembed import TextEmbedding
+
+        self.model_name = model_name
+        self._model = TextEmbedding(model_name)
+
+    def embed(self, text: str) -> List[float]:
+        return list(next(iter(self._model.embed([text]))))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a question so trivially different wordings share a cache entry.
+
+    Args:
+        prompt (str): The question.
+
+    Returns:
+        str: The question in lower case, with whitespace collapsed and trailing punctuation removed.
+    """
+    return re.sub(r"\s+", " ", prompt).strip().rstrip("?!. ").lower()
+
+
+def _digest(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _normalized(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class ResponseCache:
+    """
+    TTL/LRU cache of assistant responses with an optional embedding-similarity tier.
+
+    Attributes:
+        ttl (float): Seconds a response stays cached.
+        max_entries (int): Maximum number of cached responses.
+        embedder (Embedder | None): Embeds questions for similarity matching; None for exact matching only.
+        similarity (float): Minimum cosine similarity for a similarity match.
+        exact_hits (int): Lookups answered by an exact match.
+        similar_hits (int): Lookups answered by a similarity match.
+        misses (int): Lookups that had to go to the model.
+    """
+
+    def __init__(
+        self,
+        ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        embedder: Embedder | None = None,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedder = embedder
+        self.similarity = similarity
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        # key -> (expires_at, scope, vector, response)
+        self._entries: OrderedDict[str, tuple[float, str, List[float] | None, str]] = OrderedDict()
+        # scope -> keys of the entries in it, for similarity matching
+        self._scopes: Dict[str, set] = {}
+
+    @staticmethod
+    def scope(problem: str, level: int, history: List[Dict[str, Any]], summary: str = "") -> str:
+        """
+        Identify what a response depends on besides the question.
+
+        Args:
+            problem (str): The problem statement.
+            level (int): The assistance level.
+            history (List[Dict[str, Any]]): The messages before the question.
+            summary (str): The summary of older messages.
+
+        Returns:
+            str: A hash of the problem, level, summary and conversation.
+        """
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in history)
+        return _digest(problem, str(level), summary or "", transcript)
+
+    async def get(self, scope: str, prompt: str) -> str | None:
+        """
+        Look up the cached response to a question.
+
+        Args:
+            scope (str): The scope returned by `scope`.
+            prompt (str): The question.
+
+        Returns:
+            str | None: The cached response, or None on a miss.
+        """
+        key = _digest(scope, normalize_prompt(prompt))
+        response = self._lookup(key)
+        if response is not None:
+            self.exact_hits += 1
+            return response
+        if self.embedder is not None and self._scopes.get(scope):
+            vector = await self._embed(prompt)
+            best_key, best = None, self.similarity
+            for other in self._scopes[scope]:
+                other_vector = self._entries[other][2]
+                score = sum(a * b for a, b in zip(vector, other_vector))
+                if score >= best:
+                    best_key, best = other, score
+            response = self._lookup(best_key) if best_key else None
+            if response is not None:
+                self.similar_hits += 1
+                return response
+        self.misses += 1
+        return None
+
+    async def set(self, scope: str, prompt: str, response: str) -> None:
+        """
+        Cache the response to a question.
+
+        Args:
+            scope (str): The scope returned by `scope`.
+            prompt (str): The question.
+            response (str): The response.
+        """
+        key = _digest(scope, normalize_prompt(prompt))
+        vector = await self._embed(prompt) if self.embedder is not None else None
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, scope, vector, response)
+        if vector is not None:
+            self._scopes.setdefault(scope, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _lookup(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[3]
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[1] in self._scopes:
+            self._scopes[entry[1]].discard(key)
+            if not self._scopes[entry[1]]:
+                del self._scopes[entry[1]]
+
+    async def _embed(self, text: str) -> List[float]:
+        # Embedding is CPU-bound, so keep it off the event loop
+        return _normalized(await asyncio.to_thread(self.embedder.embed, normalize_prompt(text)))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the cache statistics.
+
+        Returns:
+            Dict[str, float]: Hits by tier, misses, the hit ratio and the number of cached responses.
+        """
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    """
+    Create the response cache configured by the environment.
+
+    The similarity tier is enabled by RESPONSE_CACHE_EMBEDDING_MODEL, which requires fastembed.
+
+    Returns:
+        ResponseCache: The response cache.
+    """
+    embedder = None
+    if RESPONSE_CACHE_EMBEDDING_MODEL:
+        try:
+            embedder = FastEmbedder(RESPONSE_CACHE_EMBEDDING_MODEL)
+        except ImportError:
+            logger.warning("fastembed is not installed, the response cache matches questions exactly")
+    return ResponseCache(embedder=embedder)
@@ -0,0 +1,106 @@
+"""
+This module maintains the rolling conversation summary of a chat.
+
+The summary is stored on the 'Chat List' document together with a watermark, the timestamp and
+ID of the last message folded into it. After each turn, messages past the watermark are folded into the
+existing summary in a background task, keeping the most recent ones verbatim, so the cost of a
+turn does not grow with the length of the conversation.
+"""
+
+import logging
+from bson import ObjectId
+from pymongo import ASCENDING
+from Database.history import after_watermark, watermark_of
+from Agent.agent import agent_deps, SUMMARIZER_MODEL, SUMMARIZER_SETTINGS
+from Agent.prompts import INCREMENTAL_SUMMARIZER_PROMPT
+from Agent.registry import get_agent
+from metrics import run_agent, span
+
+logger = logging.getLogger(__name__)
+
+# Number of messages past the watermark that triggers a fold
+SUMMARY_THRESHOLD = 10
+# Number of most recent messages that are left out of the summary
+SUMMARY_KEEP_RECENT = 4
+# Maximum number of messages folded at once; a longer backlog is folded over several turns
+SUMMARY_MAX_FOLD = 50
+
+_folding: set[ObjectId] = set()
+
+
+async def fold_summary(database, chat_id: ObjectId, user_id: ObjectId) -> None:
+    """
+    Fold the messages after the summary watermark into the summary of a chat.
+
+    Does nothing while fewer than SUMMARY_THRESHOLD messages are past the watermark or when a
+    fold for the same chat is already running. The update is conditional on the watermark it
+    started from, so concurrent folds can never move the summary backwards.
+
+    Args:
+        database: The database connection.
+        chat_id (ObjectId): The ID of the chat.
+        user_id (ObjectId): The ID of the chat's owner.
+    """
+    if chat_id in _folding:
+        return
+    _folding.add(chat_id)
+    try:
+        chat = await database["Chat List"].find_one(
+            {"_id": chat_id, "user_id": user_id},
+            {"summary": 1, "summary_watermark": 1},
+        )
+        if not chat:
+            return
+        watermark = chat.get("summary_watermark")
+
+        query = {"chat_id": chat_id, "user_id": user_id}
+        if watermark is not None:
+            query.update(after_watermark(watermark))
+        limit = SUMMARY_MAX_FOLD + SUMMARY_KEEP_RECENT
+        pending = (
+            await database["Messages"]
+            .find(query, {"role": 1, "message": 1, "timestamp": 1})
+            .sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+            .limit(limit)
+            .to_list(length=limit)
+        )
+        if len(pending) <= SUMMARY_THRESHOLD:
+            return
+
+        to_fold = pending[:-SUMMARY_KEEP_RECENT]
+        chat_history = ""
+        for m in to_fold:
+            if m["role"] == "user":
+                chat_history += "User: " + m["message"] + "\n"
+            elif m["role"] == "assistant":
+                chat_history += "Assistant: " + m["message"] + "\n"
+
+        summarizer_model = get_agent(
+            SUMMARIZER_MODEL,
+            system_prompt=INCREMENTAL_SUMMARIZER_PROMPT,
+            model_settings=SUMMARIZER_SETTINGS,
+        )
+        result = await run_agent(
+            "summarize",
+            summarizer_model,
+            "Existing summary:\n"
+            + (chat.get("summary") or "(empty)")
+            + "\n\nNew messages:\n"
+            + chat_history,
+            deps=agent_deps(),
+        )
+
+        with span("write_summary"):
+            await database["Chat List"].update_one(
+                {"_id": chat_id, "user_id": user_id, "summary_watermark": watermark},
+                {
+                    "$set": {
+                        "summary": result.output,
+                        "summary_watermark": watermark_of(to_fold[-1]),
+                    }
+                },
+            )
+    except Exception as e:
+        logger.error(f"Error summarizing chat {chat_id}: {e}")
+    finally:
+        _folding.discard(chat_id)
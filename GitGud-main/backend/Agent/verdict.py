@@ -0,0 +1,115 @@
+"""
+This module decides locally whether extracted code passed its validation code.
+
+The validation code prints 'True' for every passing test, so most runner outputs can be judged
+without a model call: all-True output passes, and a 'False' line, a traceback, a failed
+assertion, a compilation error, a time limit or a non-zero exit fails. Only outputs that fit none
+of these, such as free-form prints, are escalated to the judge model.
+"""
+
+import re
+from collections import Counter
+from typing import Dict
+from Agent.models import JudgeOutput
+
+# A test result line: 'True', 'False', optionally after a label such as 'Test 1:' or 'case ='
+RESULT_LINE = re.compile(
+    r"^(?:.*?[:=\-]\s*)?(true|false|pass(?:ed)?|fail(?:ed)?)[.!]?$", re.IGNORECASE
+)
+COMPILE_ERROR = re.compile(r"^\S+\.(?:c|cpp|h|java):\d+(?::\d+)?: error: (.*)$", re.MULTILINE)
+
+
+class VerdictStats:
+    """
+    Counts how test verdicts were reached.
+
+    Attributes:
+        counts (Counter): Verdicts by source: 'batch' (structured test results), 'local' (parsed
+            runner output) or 'judge' (escalated to the judge model).
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def record(self, source: str) -> None:
+        self.counts[source] += 1
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the verdict statistics.
+
+        Returns:
+            Dict[str, float]: Verdicts per source and the share of judge calls avoided.
+        """
+        total = sum(self.counts.values())
+        return {
+            "batch": self.counts["batch"],
+            "local": self.counts["local"],
+            "judge": self.counts["judge"],
+            "fast_path_ratio": (total - self.counts["judge"]) / total if total else 0.0,
+        }
+
+
+verdict_stats = VerdictStats()
+
+
+def _failure(advice: str) -> JudgeOutput:
+    return JudgeOutput(passed=False, advice=advice)
+
+
+def local_verdict(output: str, ok: bool | None, validation_code: str = "") -> JudgeOutput | None:
+    """
+    Judge the runner output of extracted code plus its validation code.
+
+    Args:
+        output (str): The program's output, or the error reported by the runner.
+        ok (bool | None): Whether the program exited successfully, or None if it could not be run.
+        validation_code (str): The validation code that produced the output.
+
+    Returns:
+        JudgeOutput | None: The verdict with advice, or None if the output is ambiguous and the
+            judge model has to decide.
+    """
+    if ok is None:
+        return None
+    output = (output or "").strip()
+
+    if not ok:
+        if output.startswith("Time limit exceeded") or output == "CPU time limit exceeded":
+            return _failure(
+                "The code took too long to run. Look for an infinite loop or use a more efficient algorithm."
+            )
+        compile_error = COMPILE_ERROR.search(output)
+        if compile_error:
+            return _failure(f"The code does not compile: {compile_error.group(1)}")
+        java_error = re.search(r"^Exception in thread \S+ (.*)$", output, re.MULTILINE)
+        if "Traceback (most recent call last)" in output or java_error:
+            error = java_error.group(1) if java_error else output.splitlines()[-1].strip()
+            if "AssertionError" in error:
+                return _failure(f"A test assertion failed ({error}). Check the solution against that test case.")
+            return _failure(f"The code raised an error: {error}. Fix it so every test case runs.")
+        if "MemoryError" in output or "OutOfMemoryError" in output:
+            return _failure("The code used too much memory. Use a more memory-efficient approach.")
+        last_line = output.splitlines()[-1] if output else "no error message"
+        return _failure(f"The program exited with an error: {last_line}")
+
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    if not lines:
+        # Assertion-based validation prints nothing when every assertion holds
+        if re.search(r"\bassert\b", validation_code):
+            return JudgeOutput(passed=True, advice="")
+        return None
+    results = [RESULT_LINE.match(line) for line in lines]
+    if not all(results):
+        return None
+    failed = [
+        str(number)
+        for number, match in enumerate(results, start=1)
+        if match.group(1).lower().startswith(("false", "fail"))
+    ]
+    if failed:
+        return _failure(
+            f"Test case{'s' if len(failed) > 1 else ''} {', '.join(failed)} of {len(results)} "
+            "failed. Check the solution against those test cases."
+        )
+    return JudgeOutput(passed=True, advice="")
@@ -0,0 +1,98 @@
+"""
+This module provides the cache of authenticated user principals.
+
+`get_current_user` runs on every authenticated request; caching the user document for a short
+time saves a Users lookup per request. The storage is pluggable: the default backend is an
+in-process TTL/LRU cache, and any object with the same async get/set methods (for example a
+Redis-backed one) can be used instead to share entries between workers.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Protocol
+
+
+class CacheBackend(Protocol):
+    """Storage used by UserCache."""
+
+    async def get(self, key: str) -> Dict[str, Any] | None: ...
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float) -> None: ...
+
+
+class MemoryCacheBackend:
+    """
+    An in-process TTL/LRU cache.
+
+    Attributes:
+        max_entries (int): Maximum number of entries kept before the least recently used are evicted.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Dict[str, Any]]] = OrderedDict()
+
+    async def get(self, key: str) -> Dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class UserCache:
+    """
+    Caches user principals by user ID and counts hits and misses.
+
+    The password hash is never cached. Users are never updated or deleted once registered, so
+    entries are not invalidated and only expire.
+
+    Attributes:
+        backend (CacheBackend): The storage for cached principals.
+        ttl (float): Seconds a principal stays cached.
+        hits (int): Lookups answered from the cache, i.e. database calls saved.
+        misses (int): Lookups that had to go to the database.
+    """
+
+    def __init__(self, backend: CacheBackend | None = None, ttl: float = 60):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id) -> Dict[str, Any] | None:
+        user = await self.backend.get(str(user_id))
+        if user is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(user)
+
+    async def set(self, user: Dict[str, Any]) -> None:
+        principal = {key: value for key, value in user.items() if key != "password"}
+        await self.backend.set(str(user["_id"]), principal, self.ttl)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the cache statistics.
+
+        Returns:
+            Dict[str, float]: Hits, misses, the hit ratio and the number of saved database calls.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "saved_db_calls": self.hits,
+        }
@@ -83,6 +83,8 @@ async def login(login_data: LoginReqModel, response: Response, request: Request)
             REFRESH_TOKEN=await create_refresh_token(str(user["_id"])),
             ACCESS_TOKEN=await create_access_token(str(user["_id"])),
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during login: {e}")
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -5,6 +5,8 @@ It includes functions for creating and verifying tokens, hashing passwords, and
 """
 
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from dotenv import load_dotenv
 from typing import Union, Any, Annotated
@@ -16,16 +18,29 @@ from pydantic import BaseModel
 import datetime
 from jose.exceptions import ExpiredSignatureError
 from jwt.exceptions import InvalidTokenError
+from Auth.cache import UserCache
+from metrics import span
 
 load_dotenv()
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+password_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_jobs = 0
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24
 ALGORITHM = "HS256"
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_REFRESH_SECRET_KEY = os.getenv("JWT_REFRESH_SECRET_KEY")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+user_cache = UserCache(ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")))
 
 
 class TokenData(BaseModel):
@@ -113,6 +128,39 @@ async def create_refresh_token(
     return encoded_jwt
 
 
+async def run_password_job(fn, *args):
+    """
+    Run a password hashing function on the password worker pool.
+
+    At most PASSWORD_HASH_WORKERS jobs run at once and PASSWORD_HASH_QUEUE_SIZE more may wait;
+    further jobs are rejected so a burst of logins cannot build an unbounded backlog.
+
+    Args:
+        fn: The blocking function to run.
+        *args: The arguments to pass to the function.
+
+    Returns:
+        The result of the function.
+
+    Raises:
+        HTTPException: 503 if the worker pool and its queue are full.
+    """
+    global _password_jobs
+    if _password_jobs >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please try again",
+            headers={"Retry-After": "1"},
+        )
+    _password_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            password_executor, fn, *args
+        )
+    finally:
+        _password_jobs -= 1
+
+
 async def verify_password(password: str, hashed_pass: str) -> bool:
     """
     Verify a password against its hashed version.
@@ -124,7 +172,7 @@ async def verify_password(password: str, hashed_pass: str) -> bool:
     Returns:
         bool: True if the password matches the hash, False otherwise.
     """
-    return password_context.verify(password, hashed_pass)
+    return await run_password_job(password_context.verify, password, hashed_pass)
 
 
 async def get_hashed_password(password: str) -> str:
@@ -137,7 +185,7 @@ async def get_hashed_password(password: str) -> str:
     Returns:
         str: The hashed password.
     """
-    return password_context.hash(password)
+    return await run_password_job(password_context.hash, password)
 
 
 async def get_current_user_refresh(request: Request):
@@ -187,6 +235,10 @@ async def get_current_user(
     """
     Retrieve the current user based on the access token in the request.
 
+    User principals are cached for a short time (USER_CACHE_TTL_SECONDS), so most requests do
+    not need a Users lookup. Whether the lookup was served from the cache is recorded in
+    `request.state.user_cache_hit`.
+
     Args:
         token (str): The JWT access token.
         request (Request): The FastAPI request object.
@@ -204,9 +256,14 @@ async def get_current_user(
         _id = ObjectId(payload.get("sub"))
         if _id is None:
             raise credentials_exception
-        user = await get_user_by_id(request.app.database, _id=_id)
-        if user is None:
-            raise credentials_exception
+        with span("auth"):
+            user = await user_cache.get(_id)
+            request.state.user_cache_hit = user is not None
+            if user is None:
+                user = await get_user_by_id(request.app.database, _id=_id)
+                if user is None:
+                    raise credentials_exception
+                await user_cache.set(user)
         return user
     except InvalidTokenError:
         raise credentials_exception
@@ -0,0 +1,129 @@
+"""
+This module provides bounded loaders for chat history.
+
+Only the tail of a conversation is fetched, with a projection of the fields the chatbot needs,
+so the cost of a turn stays flat however long the chat grows. Older messages are represented
+by the rolling summary stored on the 'Chat List' document, up to its watermark: the timestamp
+and ID of the last message folded into it. Messages are ordered by (timestamp, _id), as their IDs
+are generated by different processes and do not follow the order they were written in.
+"""
+
+import datetime as dt
+from datetime import timezone
+from typing import Any, Dict
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from tokens import count_tokens
+from Database.pagination import after_position
+
+HISTORY_LIMIT = 20
+HISTORY_TOKEN_BUDGET = 3000
+HISTORY_PROJECTION = {"_id": 1, "role": 1, "message": 1, "timestamp": 1}
+
+
+def watermark_of(message: dict) -> Dict[str, Any]:
+    """
+    Return the summary watermark that marks a message as folded into the summary.
+
+    Args:
+        message (dict): The message, with its '_id' and 'timestamp'.
+
+    Returns:
+        Dict[str, Any]: The message's 'timestamp' and '_id'.
+    """
+    return {"timestamp": message["timestamp"], "_id": message["_id"]}
+
+
+def after_watermark(watermark: Dict[str, Any] | ObjectId) -> Dict[str, Any]:
+    """
+    Build the query filter selecting the messages after a summary watermark.
+
+    Args:
+        watermark (Dict[str, Any] | ObjectId): The watermark returned by `watermark_of`. Chats
+            summarized before watermarks held the timestamp store only the message ID.
+
+    Returns:
+        Dict[str, Any]: A filter on ('timestamp', '_id'), or on '_id' for an ID-only watermark.
+    """
+    if isinstance(watermark, ObjectId):
+        return after_position({"_id": watermark})
+    return after_position(watermark)
+
+
+async def load_recent_messages(
+    database,
+    chat_id: ObjectId,
+    user_id: ObjectId,
+    after: Dict[str, Any] | ObjectId | None = None,
+    limit: int = HISTORY_LIMIT,
+    token_budget: int | None = HISTORY_TOKEN_BUDGET,
+) -> list[dict]:
+    """
+    Load the most recent messages of a chat in chronological order.
+
+    Args:
+        database: The database connection.
+        chat_id (ObjectId): The ID of the chat.
+        user_id (ObjectId): The ID of the chat's owner.
+        after (Dict[str, Any] | ObjectId | None): Only load messages after this summary watermark.
+        limit (int): The maximum number of messages to load.
+        token_budget (int | None): Drop the oldest loaded messages until their token count, as
+            counted for the system prompt, fits this budget. The newest message is always kept.
+
+    Returns:
+        list[dict]: The messages with their '_id', 'role', 'message' and 'timestamp'.
+    """
+    query = {"chat_id": chat_id, "user_id": user_id}
+    if after is not None:
+        query.update(after_watermark(after))
+    messages = (
+        await database["Messages"]
+        .find(query, HISTORY_PROJECTION)
+        .sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit)
+        .to_list(length=limit)
+    )
+
+    if token_budget is not None:
+        used = 0
+        for i, m in enumerate(messages):
+            used += count_tokens(m["message"])
+            if used > token_budget and i > 0:
+                messages = messages[:i]
+                break
+
+    messages.reverse()
+    return messages
+
+
+async def get_chat_start(database, chat: dict) -> dt.datetime | None:
+    """
+    Return the time a chat was started.
+
+    Chats store 'created_at' when they are created. For older chats the timestamp of the first
+    message is used instead and written back to the chat so the lookup only happens once.
+
+    Args:
+        database: The database connection.
+        chat (dict): The 'Chat List' document, including its 'created_at' field if present.
+
+    Returns:
+        datetime | None: The timezone-aware start time, or None if the chat has no messages.
+    """
+    started_at = chat.get("created_at")
+    if started_at is None:
+        earliest_message = await database["Messages"].find_one(
+            {"chat_id": chat["_id"], "user_id": chat["user_id"]},
+            {"timestamp": 1},
+            sort=[("timestamp", ASCENDING)],
+        )
+        if not earliest_message or "timestamp" not in earliest_message:
+            return None
+        started_at = earliest_message["timestamp"]
+        await database["Chat List"].update_one(
+            {"_id": chat["_id"]}, {"$set": {"created_at": started_at}}
+        )
+
+    if started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=timezone.utc)
+    return started_at
@@ -0,0 +1,238 @@
+"""
+This module declares the MongoDB indexes used by the hot queries of the API.
+
+`ensure_indexes` is run from the application lifespan and is idempotent. Running the module
+checks the query plans of the hot queries and exits with a non-zero status if any of them
+falls back to a collection scan or sorts in memory:
+
+    MONGO_URI=mongodb://localhost:27017 python -m Database.indexes
+"""
+
+import asyncio
+import datetime as dt
+import logging
+import os
+import sys
+from datetime import timezone
+from typing import Any, Dict, List
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from Database.pagination import after_filter, after_position, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "Users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "Messages": [
+        IndexModel(
+            [
+                ("chat_id", ASCENDING),
+                ("user_id", ASCENDING),
+                ("timestamp", ASCENDING),
+                ("_id", ASCENDING),
+            ],
+            name="chat_user_timestamp_id",
+        ),
+    ],
+    "Chat List": [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_chats"),
+    ],
+}
+# Indexes replaced by a declared one, dropped when the indexes are ensured
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    "Messages": ["chat_user_timestamp"],
+}
+# Plan stages that mean an index does not serve the query: a collection scan, or a sort that
+# has to read every match into memory before returning the first one
+FAILING_STAGES = ("COLLSCAN", "SORT")
+
+
+async def ensure_indexes(database) -> None:
+    """
+    Create the declared indexes that do not exist yet and drop the obsolete ones.
+
+    Failures, such as duplicate emails preventing the unique index, are logged and do not stop
+    the remaining indexes from being created.
+
+    Args:
+        database: The database connection.
+    """
+    for collection, indexes in INDEXES.items():
+        try:
+            await database[collection].create_indexes(indexes)
+        except Exception as e:
+            logger.error(f"Error creating indexes on '{collection}': {e}")
+    for collection, names in OBSOLETE_INDEXES.items():
+        try:
+            existing = await database[collection].index_information()
+            for name in set(names) & existing.keys():
+                await database[collection].drop_index(name)
+        except Exception as e:
+            logger.error(f"Error dropping obsolete indexes on '{collection}': {e}")
+
+
+def hot_queries() -> List[Dict[str, Any]]:
+    """
+    Return the hot queries of the API with placeholder values.
+
+    Returns:
+        List[Dict[str, Any]]: Each query's name, collection, filter and optional sort/limit, or
+            'count' for queries run with `count_documents`.
+    """
+    user_id, chat_id, cursor_id = ObjectId(), ObjectId(), ObjectId()
+    watermark = {"timestamp": dt.datetime.now(timezone.utc), "_id": ObjectId()}
+    return [
+        {"name": "get_user", "collection": "Users", "filter": {"email": "user@example.com"}},
+        {"name": "get_user_by_id", "collection": "Users", "filter": {"_id": user_id}},
+        {
+            "name": "load_chat",
+            "collection": "Chat List",
+            "filter": {"_id": chat_id, "user_id": user_id},
+        },
+        {
+            "name": "get_chats",
+            "collection": "Chat List",
+            "filter": {"user_id": user_id},
+            "sort": [("_id", ASCENDING)],
+            "limit": 25,
+        },
+        {
+            "name": "get_chats_after",
+            "collection": "Chat List",
+            "filter": {"user_id": user_id, **after_filter(encode_cursor({"_id": cursor_id}))},
+            "sort": [("_id", ASCENDING)],
+            "limit": 25,
+        },
+        {
+            # X-Total-Count of /chats and /len_chat
+            "name": "count_chats",
+            "collection": "Chat List",
+            "filter": {"user_id": user_id},
+            "count": True,
+        },
+        {
+            "name": "get_messages",
+            "collection": "Messages",
+            "filter": {"chat_id": chat_id, "user_id": user_id},
+            "sort": [("timestamp", ASCENDING), ("_id", ASCENDING)],
+            "limit": 1000,
+        },
+        {
+            "name": "get_messages_after",
+            "collection": "Messages",
+            "filter": {
+                "chat_id": chat_id,
+                "user_id": user_id,
+                **after_filter(
+                    encode_cursor(
+                        {"_id": cursor_id, "timestamp": dt.datetime.now(timezone.utc)},
+                        with_timestamp=True,
+                    )
+                ),
+            },
+            "sort": [("timestamp", ASCENDING), ("_id", ASCENDING)],
+            "limit": 1000,
+        },
+        {
+            "name": "load_recent_messages",
+            "collection": "Messages",
+            "filter": {"chat_id": chat_id, "user_id": user_id, **after_position(watermark)},
+            "sort": [("timestamp", DESCENDING), ("_id", DESCENDING)],
+            "limit": 20,
+        },
+        {
+            "name": "fold_summary",
+            "collection": "Messages",
+            "filter": {"chat_id": chat_id, "user_id": user_id, **after_position(watermark)},
+            "sort": [("timestamp", ASCENDING), ("_id", ASCENDING)],
+            "limit": 54,
+        },
+    ]
+
+
+def _stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return [stage for stage in stages if stage]
+
+
+def failing_stages(stages: List[str]) -> List[str]:
+    """
+    Return the stages of a plan that show its query is not served by an index.
+
+    Args:
+        stages (List[str]): The stages of the winning plan.
+
+    Returns:
+        List[str]: The COLLSCAN and blocking SORT stages of the plan.
+    """
+    return [stage for stage in stages if stage in FAILING_STAGES]
+
+
+async def verify_query_plans(database) -> Dict[str, List[str]]:
+    """
+    Explain each hot query and return the stages of its winning plan.
+
+    Args:
+        database: The database connection.
+
+    Returns:
+        Dict[str, List[str]]: The plan stages keyed by query name.
+    """
+    plans = {}
+    for query in hot_queries():
+        if query.get("count"):
+            explanation = await _explain_count(database, query["collection"], query["filter"])
+        else:
+            cursor = database[query["collection"]].find(query["filter"])
+            if "sort" in query:
+                cursor = cursor.sort(query["sort"])
+            if "limit" in query:
+                cursor = cursor.limit(query["limit"])
+            explanation = await cursor.explain()
+        plans[query["name"]] = _stages(explanation["queryPlanner"]["winningPlan"])
+    return plans
+
+
+async def _explain_count(database, collection: str, filter: Dict[str, Any]) -> Dict[str, Any]:
+    # count_documents runs this pipeline; its $match is pushed down to the query planner
+    explanation = await database.command(
+        "explain",
+        {
+            "aggregate": collection,
+            "pipeline": [{"$match": filter}, {"$group": {"_id": 1, "n": {"$sum": 1}}}],
+            "cursor": {},
+        },
+        verbosity="queryPlanner",
+    )
+    if "queryPlanner" in explanation:
+        return explanation
+    return explanation["stages"][0]["$cursor"]
+
+
+async def main() -> int:
+    client = AsyncIOMotorClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    database = client["GitGud"]
+    try:
+        await ensure_indexes(database)
+        plans = await verify_query_plans(database)
+    finally:
+        client.close()
+
+    failed = False
+    for name, stages in plans.items():
+        failing = bool(failing_stages(stages))
+        failed = failed or failing
+        print(f"{'FAIL' if failing else 'ok  '} {name:<22} {' <- '.join(stages)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,149 @@
+"""
+This module provides a background job queue.
+
+Work that doesn't have to finish before a response, such as preparing a new chat, is submitted
+as a job and processed by a bounded number of asyncio workers. Jobs travel through a broker:
+the default keeps them in an in-memory queue, and any object with the same methods (for example
+one backed by Redis or a message queue) can be used instead to share jobs between processes.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Protocol
+
+logger = logging.getLogger(__name__)
+
+Job = Dict[str, Any]
+Handler = Callable[[Job], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is full."""
+
+
+class JobBroker(Protocol):
+    """Transport for jobs."""
+
+    async def put(self, job: Job) -> None: ...
+
+    async def get(self) -> Job: ...
+
+    def full(self) -> bool: ...
+
+    def empty(self) -> bool: ...
+
+
+class MemoryBroker:
+    """
+    An in-process job broker.
+
+    Attributes:
+        max_size (int): Maximum number of waiting jobs.
+    """
+
+    def __init__(self, max_size: int = 100):
+        self.max_size = max_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+
+    async def put(self, job: Job) -> None:
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull("The job queue is full")
+
+    async def get(self) -> Job:
+        return await self._queue.get()
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class JobQueue:
+    """
+    Processes jobs with a fixed number of asyncio workers.
+
+    Attributes:
+        handler (Handler): Processes one job; its exceptions are logged and don't stop the worker.
+        broker (JobBroker): The transport for jobs.
+        concurrency (int): Number of jobs processed at the same time.
+        processed (int): Jobs completed.
+        failed (int): Jobs whose handler raised.
+    """
+
+    def __init__(self, handler: Handler, broker: JobBroker | None = None, concurrency: int = 4):
+        self.handler = handler
+        self.broker = broker or MemoryBroker()
+        self.concurrency = concurrency
+        self.processed = 0
+        self.failed = 0
+        self._workers: List[asyncio.Task] = []
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def start(self) -> None:
+        """Start the workers."""
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def full(self) -> bool:
+        return self.broker.full()
+
+    async def submit(self, job: Job) -> None:
+        """
+        Submit a job.
+
+        Args:
+            job (Job): The job.
+
+        Raises:
+            QueueFull: If the broker can't take more jobs.
+        """
+        await self.broker.put(job)
+        self._idle.clear()
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.broker.get()
+            self._active += 1
+            self._idle.clear()
+            try:
+                await self.handler(job)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Job {job} failed: {e!r}")
+            finally:
+                self._active -= 1
+                if self._active == 0 and self.broker.empty():
+                    self._idle.set()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the workers, giving the running and waiting jobs up to `timeout` seconds to finish.
+
+        Args:
+            timeout (float): Seconds to wait for the jobs.
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping the job queue with jobs still running or waiting")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the queue statistics.
+
+        Returns:
+            Dict[str, int]: Jobs processed, failed and running.
+        """
+        return {"processed": self.processed, "failed": self.failed, "running": self._active}
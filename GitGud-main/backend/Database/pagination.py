@@ -0,0 +1,88 @@
+"""
+This module provides opaque cursors for keyset pagination.
+
+A cursor encodes the sort key of the last item of a page. The next page is fetched with a range
+filter on that key, which the indexes serve directly, instead of skipping over all previous
+pages.
+"""
+
+import base64
+import datetime as dt
+import json
+from typing import Any, Dict
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+
+def encode_cursor(doc: Dict[str, Any], with_timestamp: bool = False) -> str:
+    """
+    Encode the position of a document as an opaque cursor.
+
+    Args:
+        doc (Dict[str, Any]): The last document of a page.
+        with_timestamp (bool): Include the document's 'timestamp' in the cursor.
+
+    Returns:
+        str: The URL-safe cursor.
+    """
+    key = {"id": str(doc["_id"])}
+    if with_timestamp:
+        key["ts"] = doc["timestamp"].isoformat()
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor sent by the client.
+
+    Returns:
+        Dict[str, Any]: The '_id' and, if encoded, the 'timestamp' of the document.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        position = {"_id": ObjectId(key["id"])}
+        if "ts" in key:
+            position["timestamp"] = dt.datetime.fromisoformat(key["ts"])
+        return position
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def after_filter(cursor: str) -> Dict[str, Any]:
+    """
+    Build the query filter selecting the documents that follow a cursor.
+
+    Args:
+        cursor (str): The cursor sent by the client.
+
+    Returns:
+        Dict[str, Any]: A filter on '_id', or on ('timestamp', '_id') for timestamped cursors.
+    """
+    return after_position(decode_cursor(cursor))
+
+
+def after_position(position: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the query filter selecting the documents that follow a position.
+
+    Args:
+        position (Dict[str, Any]): The '_id' and optionally the 'timestamp' of a document.
+
+    Returns:
+        Dict[str, Any]: A filter on '_id', or on ('timestamp', '_id') if the timestamp is given.
+    """
+    if "timestamp" not in position:
+        return {"_id": {"$gt": position["_id"]}}
+    return {
+        "$or": [
+            {"timestamp": {"$gt": position["timestamp"]}},
+            {"timestamp": position["timestamp"], "_id": {"$gt": position["_id"]}},
+        ]
+    }
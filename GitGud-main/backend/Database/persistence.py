@@ -0,0 +1,305 @@
+"""
+This module persists the messages of completed chat turns.
+
+A turn is the user's message and the assistant's response, written with one `insert_many`,
+plus the chat's last activity. The intermediate messages of the level-2 reflection loop (the
+first draft, test feedback, rewrites) can be kept on the response's document under
+'reflection'. With write-behind enabled, turns are buffered and written in batches off the
+response path; buffered turns of a chat are flushed before it is read again, and the buffer is
+flushed on shutdown. Writes are idempotent, so a batch that failed part-way can be retried;
+turns that keep failing are dropped after MESSAGE_WRITE_ATTEMPTS attempts.
+"""
+
+import asyncio
+import datetime as dt
+import logging
+import os
+from datetime import timezone
+from typing import Any, Dict, List
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+PERSIST_REFLECTION = os.getenv("PERSIST_REFLECTION", "false").lower() == "true"
+MESSAGE_TRANSACTIONS = os.getenv("MESSAGE_TRANSACTIONS", "false").lower() == "true"
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() == "true"
+MESSAGE_FLUSH_INTERVAL_MS = float(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "200"))
+MESSAGE_FLUSH_BATCH = int(os.getenv("MESSAGE_FLUSH_BATCH", "100"))
+MESSAGE_WRITE_ATTEMPTS = int(os.getenv("MESSAGE_WRITE_ATTEMPTS", "5"))
+DUPLICATE_KEY = 11000
+
+
+def only_duplicates(error: BulkWriteError) -> bool:
+    """
+    Check whether a bulk write failed only because some documents already existed.
+
+    Args:
+        error (BulkWriteError): The error raised by the bulk write.
+
+    Returns:
+        bool: True if every write error is a duplicate key error and there are no write concern
+            errors.
+    """
+    details = error.details or {}
+    return not details.get("writeConcernErrors") and all(
+        e.get("code") == DUPLICATE_KEY for e in details.get("writeErrors", [])
+    )
+
+
+def turn_documents(
+    chat_id: ObjectId,
+    user_id: ObjectId,
+    message: str,
+    response: str,
+    reflection: List[Dict[str, str]] | None = None,
+    now: dt.datetime | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build the message documents of a turn.
+
+    Args:
+        chat_id (ObjectId): The ID of the chat.
+        user_id (ObjectId): The ID of the chat's owner.
+        message (str): The user's message.
+        response (str): The assistant's response.
+        reflection (List[Dict[str, str]] | None): The intermediate messages of the reflection
+            loop, stored on the response's document.
+        now (datetime | None): The time of the turn; defaults to the current time.
+
+    Returns:
+        List[Dict[str, Any]]: The user's and the assistant's message documents.
+    """
+    now = now or dt.datetime.now(timezone.utc)
+    documents = [
+        {"chat_id": chat_id, "user_id": user_id, "role": "user", "message": message, "timestamp": now},
+        {
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "role": "assistant",
+            "message": response,
+            # MongoDB keeps milliseconds, so keep the response strictly after the message
+            "timestamp": now + dt.timedelta(milliseconds=1),
+        },
+    ]
+    if reflection:
+        documents[1]["reflection"] = reflection
+    return documents
+
+
+class TurnWriter:
+    """
+    Writes completed turns to the database.
+
+    Attributes:
+        database: The database connection.
+        persist_reflection (bool): Store the intermediate messages of the reflection loop.
+        transactions (bool): Write the messages and the chat's activity in one transaction.
+            Requires a replica set.
+        write_behind (bool): Buffer turns and write them in batches instead of before responding.
+        flush_interval (float): Seconds between write-behind flushes.
+        batch_size (int): Buffered turns that trigger an early flush.
+        max_attempts (int): Failed writes after which a buffered turn is dropped.
+        turns (int): Turns written.
+        writes (int): Batches written.
+        dropped (int): Buffered turns dropped after failing to be written.
+    """
+
+    def __init__(
+        self,
+        database,
+        persist_reflection: bool = PERSIST_REFLECTION,
+        transactions: bool = MESSAGE_TRANSACTIONS,
+        write_behind: bool = MESSAGE_WRITE_BEHIND,
+        flush_interval: float = MESSAGE_FLUSH_INTERVAL_MS / 1000,
+        batch_size: int = MESSAGE_FLUSH_BATCH,
+        max_attempts: int = MESSAGE_WRITE_ATTEMPTS,
+    ):
+        self.database = database
+        self.persist_reflection = persist_reflection
+        self.transactions = transactions
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.turns = 0
+        self.writes = 0
+        self.dropped = 0
+        # Buffered turns: their 'documents' and the 'attempts' made to write them
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start the write-behind flusher, if write-behind is enabled."""
+        if self.write_behind and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def save(
+        self, chat_id: ObjectId, user_id: ObjectId, message: str, result: Dict[str, Any]
+    ) -> None:
+        """
+        Persist a completed turn.
+
+        Args:
+            chat_id (ObjectId): The ID of the chat.
+            user_id (ObjectId): The ID of the chat's owner.
+            message (str): The user's message.
+            result (Dict[str, Any]): The chatbot result with the 'response' and, at level 2,
+                the 'reflection' messages.
+        """
+        documents = turn_documents(
+            chat_id,
+            user_id,
+            message,
+            result["response"],
+            reflection=result.get("reflection") if self.persist_reflection else None,
+        )
+        if self._flusher is None:
+            await self._write([documents])
+            return
+        self._buffer.append({"documents": documents, "attempts": 0})
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def pending(self, chat_id: ObjectId) -> bool:
+        """
+        Check whether a chat has turns waiting to be written.
+
+        Args:
+            chat_id (ObjectId): The ID of the chat.
+
+        Returns:
+            bool: True if a turn of the chat is buffered.
+        """
+        return any(turn["documents"][0]["chat_id"] == chat_id for turn in self._buffer)
+
+    async def sync(self, chat_id: ObjectId) -> None:
+        """
+        Write the buffered turns if the chat has any, so it can be read back consistently.
+
+        Args:
+            chat_id (ObjectId): The ID of the chat.
+        """
+        if self.pending(chat_id):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Write all buffered turns. Turns that fail to be written stay buffered, until they have
+        failed `max_attempts` times.
+        """
+        async with self._lock:
+            if not self._buffer:
+                return
+            turns, self._buffer = self._buffer, []
+            try:
+                await self._write([turn["documents"] for turn in turns])
+            except Exception as e:
+                retry = []
+                for turn in turns:
+                    turn["attempts"] += 1
+                    if turn["attempts"] < self.max_attempts:
+                        retry.append(turn)
+                        continue
+                    self.dropped += 1
+                    user_message = turn["documents"][0]
+                    logger.error(
+                        f"Dropping a turn of chat {user_message['chat_id']} from "
+                        f"{user_message['timestamp'].isoformat()} after {turn['attempts']} failed "
+                        f"writes: {e}"
+                    )
+                self._buffer = retry + self._buffer
+                raise
+
+    async def _write(self, turns: List[List[Dict[str, Any]]]) -> None:
+        documents = [document for turn in turns for document in turn]
+        activity: Dict[ObjectId, dt.datetime] = {}
+        for document in documents:
+            activity[document["chat_id"]] = max(
+                document["timestamp"], activity.get(document["chat_id"], document["timestamp"])
+            )
+        updates = [
+            UpdateOne({"_id": chat_id}, {"$max": {"last_activity": timestamp}})
+            for chat_id, timestamp in activity.items()
+        ]
+        messages, chats = self.database["Messages"], self.database["Chat List"]
+        with span("write_turn"):
+            await self._write_batch(messages, chats, documents, updates)
+        self.turns += len(turns)
+        self.writes += 1
+
+    async def _write_batch(self, messages, chats, documents, updates) -> None:
+        # A retried batch keeps the _ids insert_many gave its documents, so messages written by
+        # an earlier attempt fail as duplicates and are skipped; the $max updates are idempotent
+        if self.transactions:
+            try:
+                async with await self.database.client.start_session() as session:
+                    async with session.start_transaction():
+                        await messages.insert_many(documents, ordered=False, session=session)
+                        await chats.bulk_write(updates, ordered=False, session=session)
+                return
+            except BulkWriteError as e:
+                if not only_duplicates(e):
+                    raise
+            # An earlier attempt committed, or some of the messages were written before
+            await self._insert(messages, documents)
+            await chats.bulk_write(updates, ordered=False)
+        else:
+            await asyncio.gather(
+                self._insert(messages, documents), chats.bulk_write(updates, ordered=False)
+            )
+
+    @staticmethod
+    async def _insert(messages, documents) -> None:
+        try:
+            await messages.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            if not only_duplicates(e):
+                raise
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error writing buffered messages: {e}")
+
+    async def close(self) -> None:
+        """
+        Stop the write-behind flusher and write the remaining buffered turns.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            chats = sorted({str(turn["documents"][0]["chat_id"]) for turn in self._buffer})
+            logger.error(
+                f"Error writing {len(self._buffer)} buffered turns of chats {', '.join(chats)} "
+                f"on shutdown: {e}"
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the writer statistics.
+
+        Returns:
+            Dict[str, int]: Turns written, batches written, turns still buffered and turns dropped.
+        """
+        return {
+            "turns": self.turns,
+            "writes": self.writes,
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+        }
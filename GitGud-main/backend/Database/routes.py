@@ -1,17 +1,125 @@
 from fastapi import APIRouter, Response, status, Request, Depends, Query
+import asyncio
 import logging
+from typing import Any, Dict, Optional
 from Database.models import *
 from Auth import *
-from utils import scraper
 import datetime as dt
 from datetime import timezone
 from Agent.agent import ChatBot
+from Agent.prompt_builder import compact_problem, render_problem
+from tokens import count_tokens
+from Database.pagination import encode_cursor, after_filter
+from Database.jobs import QueueFull
+from utils import extract_slug
+from metrics import span
+from pymongo import ASCENDING
 
 db_router = APIRouter()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CHAT_LIST_PROJECTION = {"problem": 1, "status": 1, "created_at": 1, "last_activity": 1}
+CHAT_OPENER = "Explain me the problem"
+
+
+async def count_chats(database, user_id) -> int:
+    """
+    Count the chats of a user using the (user_id, _id) index.
+
+    Args:
+        database: The database connection.
+        user_id: The ID of the user.
+
+    Returns:
+        int: The number of chats.
+    """
+    return await database["Chat List"].count_documents({"user_id": ObjectId(user_id)})
+
+
+async def prepare_chat(app, job: Dict[str, Any]) -> None:
+    """
+    Prepare a pending chat: fetch and compact its problem statement and generate the opening
+    message.
+
+    Runs as a background job submitted by `create_chat`. The chat ends up 'ready', or 'failed'
+    with an error if the problem could not be fetched or the opener not generated.
+
+    Args:
+        app: The FastAPI application.
+        job (Dict[str, Any]): The 'chat_id', 'user_id' and 'problem_url' of the chat.
+    """
+    chat_id, user_id = ObjectId(job["chat_id"]), ObjectId(job["user_id"])
+    chats = app.database["Chat List"]
+    try:
+        problem_statement = await app.problem_fetcher.fetch(job["problem_url"])
+        if not problem_statement:
+            await chats.update_one(
+                {"_id": chat_id}, {"$set": {"status": "failed", "error": "Invalid problem URL"}}
+            )
+            return
+        problem = compact_problem(problem_statement)
+        logger.info(
+            f"Compacted the problem statement from {count_tokens(problem_statement)} "
+            f"to {count_tokens(render_problem(problem))} tokens"
+        )
+        chatbot = ChatBot(
+            messages=[{"role": "user", "content": CHAT_OPENER}],
+            summary="",
+            problem=problem,
+            response_cache=app.response_cache,
+        )
+        result = await chatbot.chat()
+        with span("write_chat"):
+            await app.database["Messages"].insert_one(
+                {
+                    "chat_id": chat_id,
+                    "user_id": user_id,
+                    "role": "assistant",
+                    "message": result["response"],
+                    "timestamp": dt.datetime.now(timezone.utc),
+                }
+            )
+            await chats.update_one(
+                {"_id": chat_id},
+                {
+                    "$set": {
+                        "problem_statement": problem_statement,
+                        "problem_compact": problem,
+                        "status": "ready",
+                    }
+                },
+            )
+    except Exception as e:
+        await chats.update_one(
+            {"_id": chat_id}, {"$set": {"status": "failed", "error": "Could not prepare the chat"}}
+        )
+        raise e
+
+
+async def resume_pending_chats(app) -> None:
+    """
+    Resubmit the chats left pending by a previous run, e.g. after a restart.
+
+    Args:
+        app: The FastAPI application.
+    """
+    cursor = app.database["Chat List"].find(
+        {"status": "pending"}, {"user_id": 1, "problem_url": 1}
+    )
+    async for chat in cursor:
+        if app.chat_jobs.full():
+            logger.warning("Job queue is full, not all pending chats were resumed")
+            break
+        await app.chat_jobs.submit(
+            {
+                "chat_id": str(chat["_id"]),
+                "user_id": str(chat["user_id"]),
+                "problem_url": chat["problem_url"],
+            }
+        )
+
 
 @db_router.post("/create_chat", summary="Create a new chat room for a leetcode problem")
 async def create_chat(
@@ -23,6 +131,9 @@ async def create_chat(
     """
     Create a new chat room for a given LeetCode problem.
 
+    The chat is created right away with a 'pending' status; the problem statement is fetched and
+    the opening message generated in the background. Poll /chat_status until it is 'ready'.
+
     Args:
         chat (CreateChatReqModel): The chat creation data.
         request (Request): The HTTP request object.
@@ -30,67 +141,99 @@ async def create_chat(
         user: The current user obtained from the access token.
 
     Returns:
-        dict: A message indicating the success of the chat creation.
+        dict: A message indicating the success of the chat creation, the chat ID and its status.
     """
     try:
         problem_url = chat.problem_url
-        problem_nickname = chat.problem_nickname
-        problem_statement = scraper(problem_url)
-        messages = [{"role": "user", "content": "Explain me the problem"}]
-        if not problem_statement:
+        if not extract_slug(problem_url):
             response.status_code = status.HTTP_400_BAD_REQUEST
             return {"error": "Invalid problem URL"}
-        if problem_nickname:
-            chatbot = ChatBot(messages=messages, summary="", problem=problem_statement)
-            result = await chatbot.chat()
-            resp = await request.app.database["Chat List"].insert_one(  
-                {
-                    "problem": problem_nickname,
-                    "user_id": user["_id"],
-                    "problem_statement": problem_statement,
-                    "summary": "",
-                }
-            )
-            await request.app.database["Messages"].insert_one(
-                {
-                    "chat_id": resp.inserted_id,
-                    "user_id": ObjectId(user["_id"]),
-                    "role": "assistant",
-                    "message": result["response"],
-                    "timestamp": dt.datetime.now(timezone.utc),
-                }
-            )
-            return {"message": "Chat created successfully", "chat_id": str(resp.inserted_id)}
-        else:
-            chatbot = ChatBot(messages=messages, summary="", problem=problem_statement)
-            result = await chatbot.chat()
+        if request.app.chat_jobs.full():
+            response.headers["Retry-After"] = "5"
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            return {"error": "Too many chats are being created, please try again shortly"}
+        now = dt.datetime.now(timezone.utc)
+        with span("write_chat"):
             resp = await request.app.database["Chat List"].insert_one(
                 {
-                    "problem": problem_url,
+                    "problem": chat.problem_nickname or problem_url,
                     "user_id": user["_id"],
-                    "problem_statement": problem_statement,
+                    "problem_url": problem_url,
+                    "problem_statement": "",
+                    "status": "pending",
                     "summary": "",
+                    "summary_watermark": None,
+                    "created_at": now,
+                    "last_activity": now,
                 }
             )
-            await request.app.database["Messages"].insert_one(
+        try:
+            await request.app.chat_jobs.submit(
                 {
-                    "chat_id": resp.inserted_id,
-                    "user_id": ObjectId(user["_id"]),
-                    "role": "assistant",
-                    "message": result["response"],
-                    "timestamp": dt.datetime.now(timezone.utc),
+                    "chat_id": str(resp.inserted_id),
+                    "user_id": str(user["_id"]),
+                    "problem_url": problem_url,
                 }
             )
-            return {"message": "Chat created successfully", "chat_id": str(resp.inserted_id)}
+        except QueueFull:
+            await request.app.database["Chat List"].delete_one({"_id": resp.inserted_id})
+            response.headers["Retry-After"] = "5"
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            return {"error": "Too many chats are being created, please try again shortly"}
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {
+            "message": "Chat created successfully",
+            "chat_id": str(resp.inserted_id),
+            "status": "pending",
+        }
     except Exception as e:
         logger.error(f"Error creating chat: {e}")
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@db_router.get("/chat_status", summary="Get the preparation status of a chat")
+async def chat_status(
+    chat_id: str, request: Request, response: Response, user=Depends(get_current_user)
+):
+    """
+    Get whether a chat is still being prepared.
+
+    Args:
+        chat_id (str): The ID of the chat.
+        request (Request): The HTTP request object.
+        response (Response): The HTTP response object.
+        user: The current user obtained from the access token.
+
+    Returns:
+        dict: The chat's status, 'pending', 'ready' or 'failed', and the error if it failed.
+    """
+    try:
+        chat = await request.app.database["Chat List"].find_one(
+            {"_id": ObjectId(chat_id), "user_id": ObjectId(user["_id"])},
+            {"status": 1, "error": 1},
+        )
+        if not chat:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+        # Chats created before background preparation have no status and are ready
+        return {
+            "chat_id": chat_id,
+            "status": chat.get("status", "ready"),
+            "error": chat.get("error"),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting chat status: {e}")
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @db_router.get("/messages", summary="Get chat history for a leetcode problem")
 async def get_messages(
-    chat_id : str, request: Request, response: Response, user=Depends(get_current_user)
+    chat_id : str, request: Request, response: Response, user=Depends(get_current_user),
+    after: Optional[str] = None,
+    limit: int = Query(1000, gt=0, le=1000)
 ):
     """
     Retrieve the chat history for a given LeetCode problem.
@@ -100,23 +243,36 @@ async def get_messages(
         request (Request): The HTTP request object.
         response (Response): The HTTP response object.
         user: The current user obtained from the access token.
+        after: cursor from a previous page's X-Next-Cursor header to continue after
+        limit: number of messages that can be sent
 
     Returns:
-        dict: The chat history for the specified problem.
+        dict: The chat history for the specified problem, oldest first. When more messages
+            follow, the cursor of the next page is sent in the X-Next-Cursor header.
     """
     try:
-        chat_history = request.app.database["Messages"].find(
-            {"chat_id": ObjectId(chat_id), "user_id": ObjectId(user["_id"])}
-        )
-        chat_history_list = await chat_history.to_list(length=1000)
+        query = {"chat_id": ObjectId(chat_id), "user_id": ObjectId(user["_id"])}
+        if after:
+            query.update(after_filter(after))
+        await request.app.turn_writer.sync(query["chat_id"])
+        chat_history = request.app.database["Messages"].find(query, {"reflection": 0}).sort(
+            [("timestamp", ASCENDING), ("_id", ASCENDING)]
+        ).limit(limit)
+        chat_history_list = await chat_history.to_list(length=limit)
+        if len(chat_history_list) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(
+                chat_history_list[-1], with_timestamp=True
+            )
         for message in chat_history_list:
             message["_id"] = str(message["_id"])
             message["chat_id"] = str(message["chat_id"])
             message["user_id"] = str(message["user_id"])
-        if not chat_history_list:
+        if not chat_history_list and not after:
             response.status_code = status.HTTP_404_NOT_FOUND
             return {"error": "Chat not found"}
         return chat_history_list
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving chat: {e}")
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -127,31 +283,49 @@ async def get_messages(
 async def get_chats(
     request: Request, response: Response, user=Depends(get_current_user),
     skip: int = Query(0, ge=0),
-    limit: int = Query(25, gt=0, le=100)
+    limit: int = Query(25, gt=0, le=100),
+    after: Optional[str] = None
 ):
     """
     Retrieve the chat lists for a given LeetCode problem.
 
+    Only the fields needed for listing are returned: the chat ID, the problem name, and the
+    creation and last activity times.
+
     Args:
         request (Request): The HTTP request object.
         response (Response): The HTTP response object.
         user: The current user obtained from the access token.
         skip: for pagination where the it starts
         limit: number of chats that can be sent
+        after: cursor from a previous page's X-Next-Cursor header; when given, skip is ignored
 
     Returns:
-        dict: The chat lists for a user.
+        dict: The chat lists for a user. The total number of chats is sent in the
+            X-Total-Count header and the cursor of the next page in X-Next-Cursor.
     """
 
     try:
-        chats = request.app.database["Chat List"].find(
-            {"user_id": ObjectId(user["_id"])}
-        ).skip(skip).limit(limit)
-        chat_lists = await chats.to_list()
+        query = {"user_id": ObjectId(user["_id"])}
+        if after:
+            query.update(after_filter(after))
+        chats = request.app.database["Chat List"].find(query, CHAT_LIST_PROJECTION).sort(
+            "_id", ASCENDING
+        )
+        if not after:
+            chats = chats.skip(skip)
+        chats = chats.limit(limit)
+        chat_lists, total = await asyncio.gather(
+            chats.to_list(), count_chats(request.app.database, user["_id"])
+        )
+        if len(chat_lists) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(chat_lists[-1])
         for chat in chat_lists:
             chat["_id"] = str(chat["_id"])
-            chat["user_id"] = str(chat["user_id"])
+        response.headers["X-Total-Count"] = str(total)
         return chat_lists
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retreving chat lists")
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -160,13 +334,20 @@ async def get_chats(
         
 @db_router.get('/len_chat', summary = "Get Chat lists for a user")
 async def get_length(request: Request, response: Response,user = Depends(get_current_user)):
+    """
+    Count the chats of a user.
+
+    Args:
+        request (Request): The HTTP request object.
+        response (Response): The HTTP response object.
+        user: The current user obtained from the access token.
+
+    Returns:
+        dict: The number of chats of the user.
+    """
     try:
-        chats = request.app.database["Chat List"].find(
-            {"user_id":ObjectId(user["_id"])}
-        )
-        chats_list = await chats.to_list()
-        return{
-            "length":len(chats_list)
+        return {
+            "length": await count_chats(request.app.database, user["_id"])
         }
     except Exception as e:
         logger.error(f"Error retreiving chat lists")
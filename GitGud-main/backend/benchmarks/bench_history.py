@@ -0,0 +1,88 @@
+"""
+Benchmark for loading chat history on /chat_message.
+
+Seeds synthetic chats with 1k and 10k messages into a scratch database and compares loading
+the full history (plus a second query for the earliest message), as /chat_message used to do,
+with the bounded tail loader.
+
+Usage (from the backend directory, with a local mongod running):
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_history
+"""
+
+import asyncio
+import datetime as dt
+import os
+import time
+from datetime import timezone
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from Database.history import load_recent_messages, get_chat_start
+
+SIZES = [1_000, 10_000]
+ROUNDS = 20
+
+
+async def seed(database, size: int) -> dict:
+    user_id = ObjectId()
+    start = dt.datetime.now(timezone.utc) - dt.timedelta(hours=1)
+    chat = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "problem_statement": "x" * 2000,
+        "summary": "",
+        "created_at": start,
+    }
+    await database["Chat List"].insert_one(chat)
+    await database["Messages"].insert_many(
+        {
+            "chat_id": chat["_id"],
+            "user_id": user_id,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "message": f"message {i} " + "lorem ipsum " * 40,
+            "timestamp": start + dt.timedelta(milliseconds=i),
+        }
+        for i in range(size)
+    )
+    return chat
+
+
+async def load_full(database, chat: dict) -> None:
+    query = {"chat_id": chat["_id"], "user_id": chat["user_id"]}
+    await database["Messages"].find(query).sort("timestamp", ASCENDING).to_list(length=None)
+    await database["Messages"].find_one(query, sort=[("timestamp", ASCENDING)])
+
+
+async def load_bounded(database, chat: dict) -> None:
+    await load_recent_messages(database, chat["_id"], chat["user_id"])
+    await get_chat_start(database, chat)
+
+
+async def measure(fn, database, chat: dict) -> float:
+    await fn(database, chat)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await fn(database, chat)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+async def main() -> None:
+    client = AsyncIOMotorClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    database = client["GitGudBenchmark"]
+    await database["Messages"].create_index(
+        [("chat_id", ASCENDING), ("user_id", ASCENDING), ("timestamp", ASCENDING)]
+    )
+    try:
+        print(f"{'messages':>10} {'full load':>12} {'bounded':>12}")
+        for size in SIZES:
+            chat = await seed(database, size)
+            full = await measure(load_full, database, chat)
+            bounded = await measure(load_bounded, database, chat)
+            print(f"{size:>10} {full:>9.2f} ms {bounded:>9.2f} ms")
+    finally:
+        await client.drop_database("GitGudBenchmark")
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+"""
+Benchmark for connection reuse to the LLM API.
+
+Starts a local mock of Groq's OpenAI-compatible chat completions endpoint that delays the first
+request on every new connection, standing in for the TCP and TLS handshakes to the real API.
+Simulated users take level-2 turns of several sequential agent calls, idle between turns as
+people do. Compares a new HTTP client per call, the client pydantic_ai shares by default (its
+keep-alive connections expire after 5 seconds) and the application-wide LLMProvider.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_llm_pool [turns] [idle_seconds]
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+HANDSHAKE_MS = 40
+RESPONSE_MS = 20
+USERS = 8
+CALLS_PER_TURN = 3
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from httpx import AsyncClient
+from pydantic_ai import Agent
+from pydantic_ai.models.groq import GroqModel
+from pydantic_ai.providers.groq import GroqProvider
+from Agent.provider import LLMProvider
+
+
+class MockGroq:
+    """A minimal HTTP/1.1 server answering chat completions, counting connections."""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = 0
+        self.server = None
+        self._connections = {}
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._connections[writer] = reader
+        await asyncio.sleep(HANDSHAKE_MS / 1000)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = dict(
+                    line.split(": ", 1) for line in head.decode().split("\r\n")[1:] if ": " in line
+                )
+                headers = {k.lower(): v for k, v in headers.items()}
+                body = json.loads(await reader.readexactly(int(headers.get("content-length", 0))))
+                self.requests += 1
+                await asyncio.sleep(RESPONSE_MS / 1000)
+                payload = json.dumps(
+                    {
+                        "id": f"chatcmpl-{self.requests}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": "ok"},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+                    }
+                ).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def stop(self) -> None:
+        self.server.close()
+        # End the idle keep-alive connections the clients left open
+        for reader in list(self._connections.values()):
+            reader.feed_eof()
+        await self.server.wait_closed()
+
+
+async def per_call_client(base_url: str):
+    """A new HTTP client, and so a new connection, for every call."""
+
+    async def call(prompt: str) -> None:
+        async with AsyncClient() as http_client:
+            provider = GroqProvider(api_key="benchmark", http_client=http_client)
+            await Agent(GroqModel("mock", provider=provider)).run(prompt)
+
+    return call, None
+
+
+async def default_client(base_url: str):
+    """The HTTP client pydantic_ai shares between agents by default."""
+    agent = Agent(GroqModel("mock", provider=GroqProvider(api_key="benchmark")))
+
+    async def call(prompt: str) -> None:
+        await agent.run(prompt)
+
+    return call, None
+
+
+async def shared_provider(base_url: str):
+    """The application-wide LLMProvider."""
+    provider = LLMProvider("benchmark", base_url=base_url)
+    agent = Agent(provider.model("groq:mock"))
+
+    async def call(prompt: str) -> None:
+        await agent.run(prompt)
+
+    return call, provider.aclose
+
+
+async def user(call, turns: int, idle: float, latencies: list) -> None:
+    for turn in range(turns):
+        if turn:
+            await asyncio.sleep(idle)
+        for _ in range(CALLS_PER_TURN):
+            start = time.perf_counter()
+            await call("hello")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(name: str, setup, turns: int, idle: float) -> None:
+    server = MockGroq()
+    base_url = await server.start()
+    os.environ["GROQ_BASE_URL"] = base_url
+    call, close = await setup(base_url)
+    latencies = []
+    await asyncio.gather(*(user(call, turns, idle, latencies) for _ in range(USERS)))
+    if close is not None:
+        await close()
+    await server.stop()
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<16} calls {server.requests:4d}  connections {server.connections:4d}  "
+        f"p50 {statistics.median(latencies):7.1f} ms  p99 {p99:7.1f} ms"
+    )
+
+
+async def main() -> None:
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    idle = float(sys.argv[2]) if len(sys.argv) > 2 else 6.0
+    print(
+        f"{USERS} users x {turns} turns x {CALLS_PER_TURN} calls, {idle:g}s idle between turns, "
+        f"{HANDSHAKE_MS} ms handshake, {RESPONSE_MS} ms response"
+    )
+    await run("per-call client", per_call_client, turns, idle)
+    await run("default client", default_client, turns, idle)
+    await run("shared provider", shared_provider, turns, idle)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Benchmark for event-loop latency during a login storm.
+
+Simulates a burst of concurrent password verifications while a probe coroutine stands in for
+chat requests, measuring how late each probe wakes up. Compares verifying inline on the event
+loop, as /login used to do, with the bounded password worker pool.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_login_storm [logins]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from Auth.utils import password_context, run_password_job, get_hashed_password
+
+PROBE_INTERVAL = 0.005
+
+
+async def inline_verify(password: str, hashed: str) -> bool:
+    return password_context.verify(password, hashed)
+
+
+async def pooled_verify(password: str, hashed: str) -> bool:
+    return await run_password_job(password_context.verify, password, hashed)
+
+
+async def probe(latencies: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        latencies.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+async def storm(verify, hashed: str, logins: int) -> tuple[list, float]:
+    latencies, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(verify("password123", hashed) for _ in range(logins)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    return latencies, elapsed
+
+
+def report(name: str, latencies: list, elapsed: float, logins: int) -> None:
+    latencies = sorted(latencies) or [0.0]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<8} probe delay p50 {statistics.median(latencies):8.2f} ms  "
+        f"p99 {p99:8.2f} ms  max {latencies[-1]:8.2f} ms  "
+        f"({logins / elapsed:6.1f} logins/s)"
+    )
+
+
+async def main() -> None:
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    hashed = await get_hashed_password("password123")
+    report("inline", *(await storm(inline_verify, hashed, logins)), logins)
+    report("pooled", *(await storm(pooled_verify, hashed, logins)), logins)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
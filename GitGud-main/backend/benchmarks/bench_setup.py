@@ -0,0 +1,60 @@
+"""
+Microbenchmark for the per-request setup cost of a ChatBot.
+
+Compares building the graphs and agents for every request, as /chat_message used to do,
+against looking them up in the process-wide registry.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_setup [iterations]
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("CODE_RUNNER_API_URL", "http://localhost:3000/execute")
+
+from pydantic_ai import Agent
+from Agent.agent import *
+from Agent.registry import get_graph
+
+
+def per_request_setup() -> None:
+    """Build everything a level-2 turn needs from scratch."""
+    create_reflection_graph(
+        ChatBot.build_agent_graph(), ChatBot.build_judge_graph()
+    ).compile()
+    Agent(model=SUMMARIZER_MODEL, system_prompt=SUMMARIZER_PROMPT, model_settings=SUMMARIZER_SETTINGS, deps_type=AgentDeps)
+    Agent(model=CHAT_MODEL, system_prompt="", model_settings=CHAT_SETTINGS, deps_type=AgentDeps)
+    Agent(model=CHAT_MODEL, system_prompt=EXTRACTION_SYSTEM_PROMPT, output_type=ChatbotCodeOutput, model_settings=CHAT_SETTINGS, deps_type=AgentDeps)
+    Agent(model=CHAT_MODEL, system_prompt=JUDGE_SYSTEM_PROMPT, output_type=JudgeOutput, model_settings=JUDGE_SETTINGS, deps_type=AgentDeps)
+    Agent(model=CHAT_MODEL, system_prompt=CODE_REPLACEMENT_PROMPT, output_type=ReplacementOutput, model_settings=REPLACEMENT_SETTINGS, deps_type=AgentDeps)
+
+
+def registry_setup() -> None:
+    """Look up everything a level-2 turn needs in the registry."""
+    ChatBot(messages=[], problem="", summary="", level=2)
+    get_graph("reflection", ChatBot.build_reflection_graph)
+    ChatBot.warm_up()
+
+
+def measure(fn, iterations: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    before = measure(per_request_setup, iterations)
+    after = measure(registry_setup, iterations)
+    print(f"per-request build : {before:8.3f} ms/request")
+    print(f"registry lookup   : {after:8.3f} ms/request")
+    print(f"speedup           : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Offline load test of the backend.
+
+Runs the FastAPI app in-process with a deterministic fake model (a pydantic_ai FunctionModel),
+a fake LeetCode endpoint and a fake code runner, each with configurable latency, against a local
+mongod (MONGO_URI) or, without one, the in-memory mongomock-motor. Concurrent users register,
+create a chat and wait for it to be ready, send messages, then send one more message after the
+chat has aged into level 2, which runs the reflection graph: code extraction, a test batch on
+the runner and the code replacement. Reports throughput and p50/p95/p99 latency per endpoint
+and where the time of a turn went per stage.
+
+With --save the results are written to a JSON file; with --baseline they are compared against
+one, and the exit code is 1 when an endpoint's p95 or the throughput regressed by more than
+--tolerance, or when requests failed, so the run can gate changes.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test [--users 20] [--messages 5] [--model-latency-ms 50]
+        [--runner-latency-ms 30] [--save results.json] [--baseline results.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime as dt
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import timezone
+from functools import partial
+
+os.environ.setdefault("GROQ_API_KEY", "load-test")
+os.environ.setdefault("JWT_SECRET_KEY", "load-test-access")
+os.environ.setdefault("JWT_REFRESH_SECRET_KEY", "load-test-refresh")
+# Keep password hashing from dominating the registration step
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx
+from bson import ObjectId
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+import main
+from Agent import registry
+from Agent.agent import ChatBot
+from Agent.code_runner import CodeRunnerClient
+from Agent.response_cache import ResponseCache
+from Database.indexes import ensure_indexes
+from Database.jobs import JobQueue, MemoryBroker
+from Database.persistence import TurnWriter
+from Database.routes import prepare_chat
+from metrics import STAGE_SECONDS
+from utils import ProblemFetcher
+
+PROBLEM_URL = "https://leetcode.com/problems/add-two-integers/"
+PROBLEM_HTML = "<p>Given two integers <code>num1</code> and <code>num2</code>, return their sum.</p>"
+SOLUTION = "class Solution:\n    def sum(self, num1: int, num2: int) -> int:\n        return num1 + num2"
+REPLY = "Here is a solution:\n\n```python\n" + SOLUTION + "\n```\n\nIt runs in O(1) time."
+VALIDATION = "print(Solution().sum(12, 5) == 17)\nprint(Solution().sum(-10, 4) == -6)"
+TESTS = [
+    {"input": "Solution().sum(12, 5)", "expected": "17"},
+    {"input": "Solution().sum(-10, 4)", "expected": "-6"},
+]
+
+
+def fake_model(latency: float) -> FunctionModel:
+    """A model that answers every agent deterministically after `latency` seconds."""
+
+    async def respond(messages, info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(latency)
+        if not info.output_tools:
+            return ModelResponse(parts=[TextPart(REPLY)])
+        tool = info.output_tools[0]
+        fields = tool.parameters_json_schema.get("properties", {})
+        if "passed" in fields:
+            args = {"passed": True, "advice": ""}
+        elif "extracted_code_explanation" in fields:
+            args = {"extracted_code": SOLUTION, "extracted_code_explanation": "Adds the two integers."}
+        else:
+            args = {"validation_code": VALIDATION, "test_cases": TESTS}
+            if "extracted_code" in fields:
+                args.update(extracted_code=SOLUTION, extracted_code_language="python")
+        return ModelResponse(parts=[ToolCallPart(tool.name, args)])
+
+    return FunctionModel(respond)
+
+
+def fake_runner(latency: float) -> httpx.MockTransport:
+    """A code runner that passes every submission after `latency` seconds."""
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path.endswith("_batch"):
+            tests = json.loads(request.content)["tests"]
+            results = [
+                {**test, "index": i, "passed": True, "output": test.get("expected"), "error": None}
+                for i, test in enumerate(tests)
+            ]
+            return httpx.Response(
+                200, json={"passed": True, "results": results, "output": "", "error": None}
+            )
+        return httpx.Response(200, json={"output": "True\nTrue"})
+
+    return httpx.MockTransport(handle)
+
+
+def fake_leetcode(latency: float) -> httpx.MockTransport:
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"data": {"question": {"content": PROBLEM_HTML}}})
+
+    return httpx.MockTransport(handle)
+
+
+def connect_database():
+    uri = os.getenv("MONGO_URI")
+    if uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        return AsyncIOMotorClient(uri)[f"GitGudLoadTest{os.getpid()}"], True
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("Set MONGO_URI to a local mongod or install mongomock-motor")
+    return AsyncMongoMockClient()["GitGudLoadTest"], False
+
+
+@contextlib.asynccontextmanager
+async def fake_services(app, args):
+    """Set the app up like its lifespan does, on the fake services."""
+    app.database, real_database = connect_database()
+    if real_database:
+        await ensure_indexes(app.database)
+    app.http_client = httpx.AsyncClient(transport=fake_leetcode(args.scrape_latency_ms / 1000))
+    app.problem_fetcher = ProblemFetcher(app.http_client, app.database["Problems"])
+    app.code_runner = CodeRunnerClient(
+        "http://runner/execute",
+        client=httpx.AsyncClient(transport=fake_runner(args.runner_latency_ms / 1000)),
+    )
+    app.response_cache = ResponseCache()
+    app.llm_provider = None
+    app.turn_writer = TurnWriter(app.database)
+    app.turn_writer.start()
+    app.chat_jobs = JobQueue(partial(prepare_chat, app), MemoryBroker(args.users * 2))
+    app.chat_jobs.start()
+    ChatBot.warm_up()
+    model = fake_model(args.model_latency_ms / 1000)
+    with contextlib.ExitStack() as overrides:
+        for agent in list(registry._agents.values()):
+            overrides.enter_context(agent.override(model=model))
+        try:
+            yield
+        finally:
+            await app.chat_jobs.stop()
+            await app.turn_writer.close()
+            await app.code_runner.aclose()
+            await app.http_client.aclose()
+            if real_database:
+                await app.database.client.drop_database(app.database.name)
+
+
+class Recorder:
+    """Collects request latencies and failures per endpoint."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def request(self, endpoint: str, send, expect=(200,)) -> httpx.Response:
+        start = time.perf_counter()
+        resp = await send()
+        self.latencies.setdefault(endpoint, []).append((time.perf_counter() - start) * 1000)
+        if resp.status_code not in expect:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return resp
+
+
+async def simulate_user(app, index: int, args, recorder: Recorder) -> None:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test")
+    async with client:
+        resp = await recorder.request(
+            "register",
+            lambda: client.post(
+                "/register",
+                json={"username": f"user{index}", "email": f"user{index}@load.test", "password": "pw"},
+            ),
+        )
+        client.headers["Authorization"] = f"Bearer {resp.json()['ACCESS_TOKEN']}"
+
+        start = time.perf_counter()
+        resp = await recorder.request(
+            "create_chat",
+            lambda: client.post("/create_chat", json={"problem_url": PROBLEM_URL}),
+            expect=(202,),
+        )
+        chat_id = resp.json()["chat_id"]
+        while True:
+            resp = await recorder.request(
+                "chat_status", lambda: client.get(f"/chat_status?chat_id={chat_id}")
+            )
+            if resp.json().get("status") != "pending":
+                break
+            await asyncio.sleep(0.01)
+        recorder.latencies.setdefault("chat_ready", []).append((time.perf_counter() - start) * 1000)
+
+        for message in range(args.messages):
+            await recorder.request(
+                "chat_message",
+                lambda: client.post(
+                    f"/chat_message?chat_id={chat_id}",
+                    json={"message": f"Hint {message} for user {index}?"},
+                ),
+            )
+
+        # Age the chat past 30 minutes so the next turn runs at level 2
+        await app.database["Chat List"].update_one(
+            {"_id": ObjectId(chat_id)},
+            {"$set": {"created_at": dt.datetime.now(timezone.utc) - dt.timedelta(minutes=40)}},
+        )
+        await recorder.request(
+            "chat_message_level2",
+            lambda: client.post(
+                f"/chat_message?chat_id={chat_id}",
+                json={"message": f"Show me the solution, user {index}"},
+            ),
+        )
+        await recorder.request("messages", lambda: client.get(f"/messages?chat_id={chat_id}"))
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, latencies in recorder.latencies.items():
+        latencies = sorted(latencies)
+        endpoints[endpoint] = {
+            "count": len(latencies),
+            "errors": recorder.errors.get(endpoint, 0),
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+        }
+    # Status polls grow with the time chats take to be ready, so they don't count as work
+    requests = sum(
+        len(v) for k, v in recorder.latencies.items() if k not in ("chat_ready", "chat_status")
+    )
+    return {"elapsed_s": elapsed, "throughput_rps": requests / elapsed, "endpoints": endpoints}
+
+
+def report(results: dict) -> None:
+    print(f"\n{'endpoint':<22}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in results["endpoints"].items():
+        print(
+            f"{endpoint:<22}{row['count']:>7}{row['errors']:>8}"
+            f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+        )
+    print(f"\n{results['throughput_rps']:.1f} requests/s over {results['elapsed_s']:.2f}s")
+
+    print(f"\n{'stage':<22}{'level':>6}{'count':>7}{'mean ms':>10}")
+    for (stage, level), (_, total, count) in sorted(STAGE_SECONDS._series.items()):
+        print(f"{stage:<22}{level or '-':>6}{count:>7}{total / count * 1000:>10.1f}")
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for endpoint, row in results["endpoints"].items():
+        if row["errors"]:
+            found.append(f"{endpoint}: {row['errors']} failed requests")
+        before = baseline["endpoints"].get(endpoint)
+        if before and row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{endpoint}: p95 {row['p95_ms']:.1f} ms, baseline {before['p95_ms']:.1f} ms")
+    if results["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        found.append(
+            f"throughput {results['throughput_rps']:.1f} req/s, "
+            f"baseline {baseline['throughput_rps']:.1f} req/s"
+        )
+    return found
+
+
+async def run(args) -> dict:
+    app = main.app
+    async with fake_services(app, args):
+        recorder = Recorder()
+        start = time.perf_counter()
+        await asyncio.gather(*(simulate_user(app, i, args, recorder) for i in range(args.users)))
+        return summarize(recorder, time.perf_counter() - start)
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent users")
+    parser.add_argument("--messages", type=int, default=5, help="messages per user before level 2")
+    parser.add_argument("--model-latency-ms", type=float, default=50)
+    parser.add_argument("--runner-latency-ms", type=float, default=30)
+    parser.add_argument("--scrape-latency-ms", type=float, default=100)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    report(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = [
+        f"{endpoint}: {row['errors']} failed requests"
+        for endpoint, row in results["endpoints"].items()
+        if row["errors"]
+    ]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(results, json.load(f), args.tolerance)
+    if failures:
+        print("\nREGRESSION" if args.baseline else "\nFAILED")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,256 @@
+"""
+This module provides timing spans and Prometheus metrics.
+
+Each stage of a turn (auth lookup, history load, problem scrape, the graph nodes, model calls,
+code runner calls and database writes) runs inside a `span`, which records its duration in a
+histogram labelled by stage and assistance level. Model calls also record their duration and
+token usage per model. The metrics and the statistics of the caches and queues are rendered in
+the Prometheus text format by the /metrics endpoint.
+
+When OpenTelemetry is installed, spans are also reported as OpenTelemetry spans; with
+OTEL_EXPORTER_OTLP_ENDPOINT set and the OpenTelemetry SDK installed, they are exported over OTLP.
+"""
+
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as _otel_trace
+
+    tracer = _otel_trace.get_tracer("gitgud")
+except ImportError:
+    tracer = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# The assistance level of the turn being handled, for labelling the stages it runs
+current_level: ContextVar[str] = ContextVar("current_level", default="")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Histogram:
+    """
+    A Prometheus histogram with labels.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The metric description.
+        labels (Tuple[str, ...]): The label names.
+        buckets (Tuple[float, ...]): The upper bounds of the buckets.
+    """
+
+    def __init__(
+        self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> (bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_labels(self.labels + ('le',), key + (f'{bound:g}',))} {cumulative}"
+                )
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Counter:
+    """
+    A Prometheus counter with labels.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The metric description.
+        labels (Tuple[str, ...]): The label names.
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "gitgud_stage_duration_seconds", "Duration of each stage of a request.", ("stage", "level")
+)
+MODEL_SECONDS = Histogram(
+    "gitgud_model_call_duration_seconds", "Duration of model calls.", ("stage", "model", "level")
+)
+MODEL_TOKENS = Counter(
+    "gitgud_model_tokens_total", "Tokens used by model calls.", ("stage", "model", "kind")
+)
+REFLECTION_ITERATIONS = Histogram(
+    "gitgud_reflection_iterations",
+    "Iterations of the level-2 reflection loop per turn, by why the loop stopped.",
+    ("stop",),
+    buckets=(0, 1, 2, 3, 4, 5, 8),
+)
+PROMPT_TOKENS_SAVED = Counter(
+    "gitgud_prompt_tokens_saved_total",
+    "Input tokens left out of system prompts to keep them within the token budget.",
+    ("level",),
+)
+METRICS = [STAGE_SECONDS, MODEL_SECONDS, MODEL_TOKENS, REFLECTION_ITERATIONS, PROMPT_TOKENS_SAVED]
+
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[None]:
+    """
+    Time a stage of a request.
+
+    Args:
+        stage (str): The stage name, e.g. 'history_load' or 'call_model'.
+        **attributes: Extra attributes for the OpenTelemetry span.
+    """
+    level = current_level.get()
+    start = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, level=level)
+        return
+    with tracer.start_as_current_span(stage, attributes={"level": level, **attributes}):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, level=level)
+
+
+def record_model_call(stage: str, model: Any, seconds: float, usage: Any = None) -> None:
+    """
+    Record the duration and token usage of a model call.
+
+    Args:
+        stage (str): The stage that made the call, e.g. 'judge'.
+        model (Any): The model, or its identifier.
+        seconds (float): The duration of the call.
+        usage (Any): The pydantic_ai usage of the call, if known.
+    """
+    model = str(getattr(model, "model_name", model))
+    MODEL_SECONDS.observe(seconds, stage=stage, model=model, level=current_level.get())
+    if usage is None:
+        return
+    for kind, tokens in (("input", usage.request_tokens), ("output", usage.response_tokens)):
+        if tokens:
+            MODEL_TOKENS.inc(tokens, stage=stage, model=model, kind=kind)
+
+
+async def run_agent(stage: str, agent, *args: Any, **kwargs: Any):
+    """
+    Run an agent inside a span, recording its duration and token usage.
+
+    Args:
+        stage (str): The stage name, e.g. 'judge'.
+        agent: The pydantic_ai Agent.
+        *args: Positional arguments for `agent.run`.
+        **kwargs: Keyword arguments for `agent.run`.
+
+    Returns:
+        The agent's run result.
+    """
+    start = time.perf_counter()
+    with span(stage):
+        result = await agent.run(*args, **kwargs)
+    record_model_call(stage, agent.model, time.perf_counter() - start, result.usage())
+    return result
+
+
+def render(collectors: Dict[str, Callable[[], Dict[str, Any]]] | None = None) -> str:
+    """
+    Render the metrics in the Prometheus text format.
+
+    Args:
+        collectors (Dict[str, Callable[[], Dict[str, Any]]] | None): Components whose `stats()`
+            are exported as gauges named 'gitgud_<component>_<statistic>'.
+
+    Returns:
+        str: The metrics.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for component, stats in (collectors or {}).items():
+        try:
+            values = stats()
+        except Exception as e:
+            logger.error(f"Error collecting {component} statistics: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"gitgud_{component}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def setup_tracing() -> None:
+    """
+    Export spans over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set.
+
+    Requires the opentelemetry-sdk and opentelemetry-exporter-otlp packages.
+    """
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or tracer is None:
+        return
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("The OpenTelemetry SDK or OTLP exporter is not installed, spans are not exported")
+        return
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "gitgud-backend")})
+    )
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    _otel_trace.set_tracer_provider(provider)
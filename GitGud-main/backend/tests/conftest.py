@@ -0,0 +1,16 @@
+"""
+Shared test setup.
+
+The agent modules read their settings when imported, so placeholder values are set before any
+test module imports them. Run the tests from the backend directory:
+
+    pip install -r requirements-dev.txt
+    python -m pytest
+"""
+
+import os
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("CODE_RUNNER_API_URL", "http://code-runner.test/execute")
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ.setdefault("JWT_REFRESH_SECRET_KEY", "test")
@@ -0,0 +1,140 @@
+"""
+Tests for the code runner client in Agent.code_runner.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from Agent import code_runner
+from Agent.code_runner import CodeRunnerClient, CodeRunnerError
+
+URL = "http://code-runner.test/execute"
+
+
+def runner(handler, **kwargs) -> CodeRunnerClient:
+    kwargs.setdefault("backoff", 0)
+    return CodeRunnerClient(URL, client=httpx.AsyncClient(transport=httpx.MockTransport(handler)), **kwargs)
+
+
+def replies(*responses):
+    """Return a handler answering with the given statuses or exceptions in turn."""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        response = responses[min(len(calls), len(responses) - 1)]
+        calls.append(request.url.path)
+        if isinstance(response, Exception):
+            raise response
+        return httpx.Response(response, json={"output": "True\n"} if response == 200 else {"error": "busy"})
+
+    return handler, calls
+
+
+@pytest.mark.parametrize("status", [502, 503, 504])
+def test_retries_gateway_errors(status):
+    handler, calls = replies(status, status, 200)
+    result = asyncio.run(runner(handler, retries=2).execute("print(True)", "python"))
+    assert result == {"ok": True, "output": "True\n"}
+    assert len(calls) == 3
+
+
+def test_retries_transport_errors():
+    handler, calls = replies(httpx.ConnectError("refused"), 200)
+    result = asyncio.run(runner(handler).execute("print(True)", "python"))
+    assert result["ok"] is True
+    assert len(calls) == 2
+
+
+def test_gives_up_after_the_last_retry():
+    handler, calls = replies(503)
+    with pytest.raises(CodeRunnerError):
+        asyncio.run(runner(handler, retries=2).execute("print(True)", "python"))
+    assert len(calls) == 3
+
+
+def test_client_errors_are_not_retried():
+    handler, calls = replies(400)
+    result = asyncio.run(runner(handler).execute("print(", "python"))
+    assert result == {"ok": False, "output": "busy"}
+    assert calls == ["/execute"]
+
+
+def test_deadline_covers_the_whole_call():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={"output": ""})
+
+    async def main():
+        client = runner(handler, timeout=0.05)
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(CodeRunnerError):
+            await client.execute("print(True)", "python")
+        return asyncio.get_running_loop().time() - started, client.stats()
+
+    elapsed, stats = asyncio.run(main())
+    assert elapsed < 0.5
+    assert stats["consecutive_failures"] == 1
+
+
+def test_circuit_opens_and_half_opens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(code_runner.time, "monotonic", lambda: now[0])
+    handler, calls = replies(httpx.ConnectError("refused"))
+
+    async def main():
+        client = runner(handler, retries=0, failure_threshold=2, reset_after=30)
+        for _ in range(2):
+            with pytest.raises(CodeRunnerError):
+                await client.execute("print(True)", "python")
+        assert client.stats() == {"consecutive_failures": 2, "circuit_open": 1}
+
+        # While open, calls fail without reaching the runner
+        with pytest.raises(CodeRunnerError, match="circuit is open"):
+            await client.execute("print(True)", "python")
+        assert len(calls) == 2
+
+        # After reset_after, one trial call is let through; its failure reopens the circuit
+        now[0] += 31
+        with pytest.raises(CodeRunnerError, match="request failed"):
+            await client.execute("print(True)", "python")
+        assert len(calls) == 3
+        assert client.stats()["circuit_open"] == 1
+
+        # A successful trial call closes it
+        now[0] += 31
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(replies(200)[0]))
+        assert (await client.execute("print(True)", "python"))["ok"] is True
+        assert client.stats() == {"consecutive_failures": 0, "circuit_open": 0}
+
+    asyncio.run(main())
+
+
+def test_concurrency_is_bounded():
+    running, peak = [0], [0]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return httpx.Response(200, json={"output": ""})
+
+    async def main():
+        client = runner(handler, max_concurrency=3)
+        await asyncio.gather(*(client.execute("print(True)", "python") for _ in range(12)))
+
+    asyncio.run(main())
+    assert peak[0] == 3
+
+
+def test_execute_batch_reports_harness_errors():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/execute_batch"
+        return httpx.Response(422, json={"error": "The test cases could not be run", "harness_error": True})
+
+    result = asyncio.run(runner(handler).execute_batch("def f(): pass", [{"input": "f("}], "python"))
+    assert result["ok"] is False
+    assert result["harness_error"] is True
+    assert result["error"] == "The test cases could not be run"
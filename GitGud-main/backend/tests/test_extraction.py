@@ -0,0 +1,61 @@
+"""
+Tests for the code-block extraction in Agent.extraction.
+"""
+
+from Agent.extraction import code_hash, detect_language, extract_solution, find_code_blocks, needs_extraction
+
+REPLY = """Here is the idea.
+
+```python
+def helper():
+    pass
+```
+
+And the full solution:
+
+```python
+class Solution:
+    def twoSum(self, nums, target):
+        seen = {}
+        for i, n in enumerate(nums):
+            if target - n in seen:
+                return [seen[target - n], i]
+            seen[n] = i
+```
+"""
+
+
+def test_longest_block_is_the_solution():
+    solution = extract_solution(REPLY)
+    assert solution["language"] == "python"
+    assert solution["code"].startswith("class Solution:")
+
+
+def test_fence_tags_are_normalized():
+    blocks = find_code_blocks("```cpp\nint main() {}\n```\n```Java\nclass A {}\n```")
+    assert [block["language"] for block in blocks] == ["c++", "java"]
+
+
+def test_unsupported_and_empty_blocks_are_skipped():
+    assert find_code_blocks("```rust\nfn main() {}\n```\n```python\n```") == []
+    assert extract_solution("No code here.") is None
+
+
+def test_untagged_blocks_are_detected():
+    assert detect_language("#include <vector>\nstd::vector<int> v;") == "c++"
+    assert detect_language("public static void main(String[] args) {") == "java"
+    assert detect_language("def f(x):\n    return x") == "python"
+    assert detect_language("SELECT 1;") is None
+    assert find_code_blocks("```\nimport sys\n```") == [{"language": "python", "code": "import sys"}]
+
+
+def test_only_level_two_code_needs_extraction():
+    assert needs_extraction(2, REPLY) is True
+    assert needs_extraction(1, REPLY) is False
+    assert needs_extraction(2, "No code here.") is False
+    assert needs_extraction(2, "```rust\nfn main() {}\n```") is False
+
+
+def test_code_hash_ignores_trailing_whitespace_and_blank_lines():
+    assert code_hash("def f():\n    return 1\n", "python") == code_hash("\ndef f():  \n\n    return 1", "python")
+    assert code_hash("def f(): pass", "python") != code_hash("def f(): pass", "c++")
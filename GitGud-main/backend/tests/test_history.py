@@ -0,0 +1,108 @@
+"""
+Tests for the bounded chat history loaders in Database.history.
+"""
+
+import asyncio
+import datetime as dt
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from Database.history import get_chat_start, load_recent_messages, watermark_of
+from tokens import count_tokens
+
+START = dt.datetime(2025, 5, 1, 12, 0)
+CHAT_ID, USER_ID = ObjectId(), ObjectId()
+
+
+def seed(messages):
+    """Insert messages one second apart and return the database and their documents."""
+    database = AsyncMongoMockClient()["GitGud"]
+    documents = [
+        {
+            "_id": ObjectId(),
+            "chat_id": CHAT_ID,
+            "user_id": USER_ID,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "message": message,
+            "timestamp": START + dt.timedelta(seconds=i),
+        }
+        for i, message in enumerate(messages)
+    ]
+    asyncio.run(database["Messages"].insert_many(documents))
+    return database, documents
+
+
+def load(database, **kwargs):
+    return asyncio.run(load_recent_messages(database, CHAT_ID, USER_ID, **kwargs))
+
+
+def test_the_newest_messages_are_loaded_in_chronological_order():
+    database, _ = seed([f"message {i}" for i in range(30)])
+
+    messages = load(database, limit=5, token_budget=None)
+
+    assert [m["message"] for m in messages] == [f"message {i}" for i in range(25, 30)]
+    assert set(messages[0]) == {"_id", "role", "message", "timestamp"}
+
+
+def test_messages_are_ordered_by_timestamp_not_id():
+    database, documents = seed(["first", "second"])
+    # An ID generated later by another process for the earlier message
+    asyncio.run(database["Messages"].delete_one({"_id": documents[0]["_id"]}))
+    asyncio.run(database["Messages"].insert_one({**documents[0], "_id": ObjectId()}))
+
+    assert [m["message"] for m in load(database)] == ["first", "second"]
+
+
+def test_oldest_messages_are_dropped_to_fit_the_token_budget():
+    texts = [f"message number {i} about arrays" for i in range(6)]
+    database, _ = seed(texts)
+    budget = sum(count_tokens(text) for text in texts[-3:])
+
+    messages = load(database, token_budget=budget)
+
+    assert [m["message"] for m in messages] == texts[-3:]
+
+
+def test_the_newest_message_is_kept_over_the_token_budget():
+    database, _ = seed(["short", "a very long message " * 50])
+
+    assert [m["message"] for m in load(database, token_budget=1)] == ["a very long message " * 50]
+
+
+def test_only_messages_after_the_watermark_are_loaded():
+    database, documents = seed([f"message {i}" for i in range(6)])
+
+    messages = load(database, after=watermark_of(documents[3]))
+    legacy = load(database, after=documents[3]["_id"])
+
+    assert [m["message"] for m in messages] == ["message 4", "message 5"]
+    assert [m["message"] for m in legacy] == ["message 4", "message 5"]
+
+
+def test_chat_start_is_read_from_the_chat():
+    database = AsyncMongoMockClient()["GitGud"]
+    chat = {"_id": CHAT_ID, "user_id": USER_ID, "created_at": START}
+
+    started_at = asyncio.run(get_chat_start(database, chat))
+
+    assert started_at == START.replace(tzinfo=dt.timezone.utc)
+
+
+def test_chat_start_of_older_chats_is_written_back():
+    database, _ = seed(["first", "second"])
+    asyncio.run(database["Chat List"].insert_one({"_id": CHAT_ID, "user_id": USER_ID}))
+    chat = {"_id": CHAT_ID, "user_id": USER_ID}
+
+    started_at = asyncio.run(get_chat_start(database, chat))
+    stored = asyncio.run(database["Chat List"].find_one({"_id": CHAT_ID}))
+
+    assert started_at == START.replace(tzinfo=dt.timezone.utc)
+    assert stored["created_at"] == START
+
+
+def test_chat_without_messages_has_no_start():
+    database = AsyncMongoMockClient()["GitGud"]
+
+    assert asyncio.run(get_chat_start(database, {"_id": CHAT_ID, "user_id": USER_ID})) is None
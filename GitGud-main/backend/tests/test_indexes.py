@@ -0,0 +1,49 @@
+"""
+Tests for the index bootstrap and query-plan checks in Database.indexes.
+"""
+
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from Database.indexes import _stages, ensure_indexes, failing_stages
+
+
+def test_obsolete_index_is_replaced():
+    async def main():
+        database = AsyncMongoMockClient()["GitGud"]
+        await database["Messages"].create_index(
+            [("chat_id", 1), ("user_id", 1), ("timestamp", 1)], name="chat_user_timestamp"
+        )
+        await ensure_indexes(database)
+        await ensure_indexes(database)
+        return await database["Messages"].index_information()
+
+    indexes = asyncio.run(main())
+    assert "chat_user_timestamp" not in indexes
+    assert list(indexes["chat_user_timestamp_id"]["key"]) == [
+        ("chat_id", 1), ("user_id", 1), ("timestamp", 1), ("_id", 1)
+    ]
+
+
+def test_index_scan_passes():
+    plan = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+    assert _stages(plan) == ["LIMIT", "FETCH", "IXSCAN"]
+    assert failing_stages(_stages(plan)) == []
+
+
+def test_collection_scan_fails():
+    plan = {"queryPlan": {"stage": "COLLSCAN"}}
+    assert failing_stages(_stages(plan)) == ["COLLSCAN"]
+
+
+def test_blocking_sort_fails():
+    plan = {
+        "stage": "SORT",
+        "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+    }
+    assert failing_stages(_stages(plan)) == ["SORT"]
+
+
+def test_count_scan_passes():
+    assert failing_stages(_stages({"stage": "COUNT_SCAN"})) == []
@@ -0,0 +1,99 @@
+"""
+Tests for the background job queue in Database.jobs.
+"""
+
+import asyncio
+import logging
+
+import pytest
+
+from Database.jobs import JobQueue, MemoryBroker, QueueFull
+
+
+def test_jobs_are_processed_by_a_bounded_number_of_workers():
+    running, peak, done = [0], [0], []
+
+    async def handler(job):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        done.append(job["id"])
+
+    async def main():
+        queue = JobQueue(handler, concurrency=2)
+        queue.start()
+        for i in range(6):
+            await queue.submit({"id": i})
+        await queue.stop()
+        return queue.stats()
+
+    assert asyncio.run(main()) == {"processed": 6, "failed": 0, "running": 0}
+    assert sorted(done) == list(range(6))
+    assert peak[0] == 2
+
+
+def test_stop_drains_the_waiting_jobs():
+    done = []
+
+    async def handler(job):
+        await asyncio.sleep(0.01)
+        done.append(job["id"])
+
+    async def main():
+        queue = JobQueue(handler, concurrency=1)
+        queue.start()
+        for i in range(3):
+            await queue.submit({"id": i})
+        # Stopping before any worker has picked a job up still processes all of them
+        await queue.stop()
+
+    asyncio.run(main())
+    assert done == [0, 1, 2]
+
+
+def test_stop_gives_up_after_the_timeout(caplog):
+    async def main():
+        blocked = asyncio.Event()
+
+        async def handler(job):
+            await blocked.wait()
+
+        queue = JobQueue(handler, concurrency=1)
+        queue.start()
+        await queue.submit({"id": 0})
+        await asyncio.sleep(0)
+        await queue.stop(timeout=0.01)
+        return queue
+
+    with caplog.at_level(logging.WARNING, logger="Database.jobs"):
+        queue = asyncio.run(main())
+    assert queue.processed == 0
+    assert "jobs still running" in caplog.text
+
+
+def test_failed_jobs_are_counted_and_do_not_stop_the_worker():
+    async def handler(job):
+        if job["id"] == 0:
+            raise ValueError("problem not found")
+
+    async def main():
+        queue = JobQueue(handler, concurrency=1)
+        queue.start()
+        await queue.submit({"id": 0})
+        await queue.submit({"id": 1})
+        await queue.stop()
+        return queue.stats()
+
+    assert asyncio.run(main()) == {"processed": 1, "failed": 1, "running": 0}
+
+
+def test_submitting_to_a_full_queue_fails():
+    async def main():
+        queue = JobQueue(lambda job: None, MemoryBroker(max_size=1))
+        await queue.submit({"id": 0})
+        assert queue.full()
+        with pytest.raises(QueueFull):
+            await queue.submit({"id": 1})
+
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+Tests for the timing spans and Prometheus metrics in metrics.py.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, current_level, record_model_call, render, run_agent, span
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    histogram = Histogram("stage_seconds", "Stages.", ("stage", "level"))
+    monkeypatch.setattr(metrics, "STAGE_SECONDS", histogram)
+    return histogram
+
+
+def test_histogram_renders_cumulative_buckets_per_series():
+    histogram = Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1))
+    histogram.observe(0.05, stage="auth")
+    histogram.observe(0.1, stage="auth")
+    histogram.observe(5, stage="auth")
+    histogram.observe(0.5, stage="chat")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="auth",le="0.1"} 2',
+        'latency_seconds_bucket{stage="auth",le="1"} 2',
+        'latency_seconds_bucket{stage="auth",le="+Inf"} 3',
+        'latency_seconds_sum{stage="auth"} 5.15',
+        'latency_seconds_count{stage="auth"} 3',
+        'latency_seconds_bucket{stage="chat",le="0.1"} 0',
+        'latency_seconds_bucket{stage="chat",le="1"} 1',
+        'latency_seconds_bucket{stage="chat",le="+Inf"} 1',
+        'latency_seconds_sum{stage="chat"} 0.5',
+        'latency_seconds_count{stage="chat"} 1',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("calls_total", "Calls.", ("model",))
+    counter.inc(model='a "quoted"\\model\n')
+
+    assert counter.render()[-1] == 'calls_total{model="a \\"quoted\\"\\\\model\\n"} 1'
+
+
+def test_spans_record_their_stage_and_level(stages):
+    level = current_level.set("2")
+    try:
+        with span("history_load"):
+            pass
+    finally:
+        current_level.reset(level)
+    with pytest.raises(ValueError):
+        with span("judge"):
+            raise ValueError("judge failed")
+
+    assert {key: series[2] for key, series in stages._series.items()} == {
+        ("history_load", "2"): 1,
+        ("judge", ""): 1,
+    }
+
+
+def test_model_calls_record_duration_and_tokens(monkeypatch):
+    seconds = Histogram("model_seconds", "Model calls.", ("stage", "model", "level"))
+    tokens = Counter("model_tokens", "Tokens.", ("stage", "model", "kind"))
+    monkeypatch.setattr(metrics, "MODEL_SECONDS", seconds)
+    monkeypatch.setattr(metrics, "MODEL_TOKENS", tokens)
+    model = SimpleNamespace(model_name="llama")
+
+    record_model_call("judge", model, 0.3, SimpleNamespace(request_tokens=120, response_tokens=0))
+
+    assert list(seconds._series) == [("judge", "llama", "")]
+    assert tokens._values == {("judge", "llama", "input"): 120}
+
+
+def test_run_agent_times_the_call(monkeypatch, stages):
+    calls = []
+    monkeypatch.setattr(metrics, "record_model_call", lambda *args: calls.append(args))
+
+    class Agent:
+        model = "test"
+
+        async def run(self, prompt):
+            return SimpleNamespace(output=prompt.upper(), usage=lambda: None)
+
+    result = asyncio.run(run_agent("summarize", Agent(), "hello"))
+
+    assert result.output == "HELLO"
+    assert [(stage, model) for stage, model, _, _ in calls] == [("summarize", "test")]
+    assert ("summarize", "") in stages._series
+
+
+def test_render_exports_component_stats_as_gauges(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS", [])
+
+    def broken():
+        raise RuntimeError("unavailable")
+
+    text = render(
+        {
+            "user_cache": lambda: {"hits": 3, "hit_ratio": 0.75, "open": True, "model": "llama"},
+            "code_runner": broken,
+        }
+    )
+
+    assert text == (
+        "# TYPE gitgud_user_cache_hits gauge\n"
+        "gitgud_user_cache_hits 3\n"
+        "# TYPE gitgud_user_cache_hit_ratio gauge\n"
+        "gitgud_user_cache_hit_ratio 0.75\n"
+    )
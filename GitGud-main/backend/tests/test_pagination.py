@@ -0,0 +1,51 @@
+"""
+Tests for the keyset pagination cursors in Database.pagination.
+"""
+
+import base64
+import datetime as dt
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from Database.pagination import after_filter, decode_cursor, encode_cursor
+
+
+def test_id_cursor_round_trips():
+    doc = {"_id": ObjectId()}
+    assert decode_cursor(encode_cursor(doc)) == {"_id": doc["_id"]}
+    assert after_filter(encode_cursor(doc)) == {"_id": {"$gt": doc["_id"]}}
+
+
+def test_timestamp_cursor_round_trips():
+    doc = {"_id": ObjectId(), "timestamp": dt.datetime(2025, 5, 1, 12, 30, 15, 123000, tzinfo=dt.timezone.utc)}
+    cursor = encode_cursor(doc, with_timestamp=True)
+    assert decode_cursor(cursor) == doc
+    assert after_filter(cursor) == {
+        "$or": [
+            {"timestamp": {"$gt": doc["timestamp"]}},
+            {"timestamp": doc["timestamp"], "_id": {"$gt": doc["_id"]}},
+        ]
+    }
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({"_id": ObjectId(), "timestamp": dt.datetime.now(dt.timezone.utc)}, with_timestamp=True)
+    assert all(c.isalnum() or c in "-_=" for c in cursor)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"[]").decode(),
+        base64.urlsafe_b64encode(b'{"ts": "2025-05-01"}').decode(),
+        base64.urlsafe_b64encode(b'{"id": "123"}').decode(),
+        base64.urlsafe_b64encode(b'{"id": "6650f1c2a1b2c3d4e5f60718", "ts": "May 1"}').decode(),
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
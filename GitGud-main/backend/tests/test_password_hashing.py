@@ -0,0 +1,59 @@
+"""
+Tests for the password hashing pool in Auth.utils.
+"""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from Auth import utils
+from Auth.utils import get_hashed_password, run_password_job, verify_password
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing(monkeypatch):
+    monkeypatch.setattr(
+        utils, "password_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    )
+
+
+def test_hashed_passwords_verify():
+    async def main():
+        hashed = await get_hashed_password("correct horse")
+        return hashed, await verify_password("correct horse", hashed), await verify_password("wrong", hashed)
+
+    hashed, correct, wrong = asyncio.run(main())
+    assert hashed.startswith("$2b$04$")
+    assert correct and not wrong
+
+
+def test_hashing_runs_on_the_password_workers():
+    async def main():
+        return await run_password_job(lambda: threading.current_thread().name)
+
+    assert asyncio.run(main()).startswith("password-hash")
+
+
+def test_jobs_beyond_the_queue_are_rejected(monkeypatch):
+    monkeypatch.setattr(utils, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(utils, "PASSWORD_HASH_QUEUE_SIZE", 1)
+    release = threading.Event()
+
+    async def main():
+        running = [asyncio.create_task(run_password_job(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await run_password_job(release.wait, 5)
+        release.set()
+        await asyncio.gather(*running)
+        # Finished jobs free their slots
+        await run_password_job(release.wait, 5)
+        return rejected.value
+
+    rejected = asyncio.run(main())
+    assert rejected.status_code == 503
+    assert rejected.headers == {"Retry-After": "1"}
+    assert utils._password_jobs == 0
@@ -0,0 +1,170 @@
+"""
+Tests for the turn writer in Database.persistence.
+"""
+
+import asyncio
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from Database.persistence import TurnWriter, turn_documents
+
+
+class Database:
+    """A mongomock database that hands out the same collection objects, so they can be patched."""
+
+    def __init__(self):
+        self._database = AsyncMongoMockClient()["GitGud"]
+        self._collections = {}
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, self._database[name])
+
+
+def failing(method, times=None):
+    """Wrap a collection method so it raises, the first `times` calls or always."""
+    calls = []
+
+    async def wrapper(*args, **kwargs):
+        calls.append(args)
+        if times is None or len(calls) <= times:
+            raise RuntimeError("database unavailable")
+        return await method(*args, **kwargs)
+
+    wrapper.calls = calls
+    return wrapper
+
+
+async def new_chat(database):
+    chat_id = ObjectId()
+    await database["Chat List"].insert_one({"_id": chat_id})
+    return chat_id
+
+
+def test_turn_documents_keep_the_response_after_the_message():
+    reflection = [{"role": "assistant", "content": "draft"}]
+    user_message, response = turn_documents(ObjectId(), ObjectId(), "hi", "hello", reflection)
+    assert (user_message["role"], response["role"]) == ("user", "assistant")
+    assert response["timestamp"] > user_message["timestamp"]
+    assert response["reflection"] == reflection
+
+
+def test_turn_is_written_before_save_returns():
+    async def main():
+        database = Database()
+        chat_id = await new_chat(database)
+        writer = TurnWriter(database, write_behind=False)
+        result = {"response": "hello", "reflection": [{"role": "user", "content": "draft"}]}
+        await writer.save(chat_id, ObjectId(), "hi", result)
+        messages = await database["Messages"].find({}).sort("timestamp", 1).to_list(None)
+        chat = await database["Chat List"].find_one({"_id": chat_id})
+        return writer, messages, chat
+
+    writer, messages, chat = asyncio.run(main())
+    assert [m["message"] for m in messages] == ["hi", "hello"]
+    assert "reflection" not in messages[1]
+    assert chat["last_activity"] == messages[1]["timestamp"]
+    assert writer.stats() == {"turns": 1, "writes": 1, "buffered": 0, "dropped": 0}
+
+
+def test_buffered_turns_are_written_in_one_batch_on_sync():
+    async def main():
+        database = Database()
+        chat_id = await new_chat(database)
+        writer = TurnWriter(database, write_behind=True, flush_interval=60)
+        writer.start()
+        for i in range(3):
+            await writer.save(chat_id, ObjectId(), f"question {i}", {"response": f"answer {i}"})
+        before = await database["Messages"].count_documents({})
+        pending = writer.pending(chat_id)
+        await writer.sync(chat_id)
+        after = await database["Messages"].count_documents({})
+        await writer.close()
+        return before, pending, after, writer.stats()
+
+    before, pending, after, stats = asyncio.run(main())
+    assert (before, pending, after) == (0, True, 6)
+    assert stats == {"turns": 3, "writes": 1, "buffered": 0, "dropped": 0}
+
+
+def test_retried_batch_does_not_duplicate_written_messages():
+    async def main():
+        database = Database()
+        chat_id = await new_chat(database)
+        writer = TurnWriter(database, write_behind=True, flush_interval=60)
+        writer.start()
+        await writer.save(chat_id, ObjectId(), "hi", {"response": "hello"})
+        # The messages are inserted, then the activity update fails
+        chats = database["Chat List"]
+        chats.bulk_write = failing(chats.bulk_write, times=1)
+        with pytest.raises(RuntimeError):
+            await writer.sync(chat_id)
+        written = await database["Messages"].count_documents({})
+        still_pending = writer.pending(chat_id)
+        await writer.sync(chat_id)
+        await writer.close()
+        total = await database["Messages"].count_documents({})
+        chat = await chats.find_one({"_id": chat_id})
+        return written, still_pending, total, chat, writer.stats()
+
+    written, still_pending, total, chat, stats = asyncio.run(main())
+    assert (written, still_pending, total) == (2, True, 2)
+    assert "last_activity" in chat
+    assert stats["turns"] == 1 and stats["buffered"] == 0 and stats["dropped"] == 0
+
+
+def test_turn_is_dropped_after_max_attempts(caplog):
+    async def main():
+        database = Database()
+        chat_id = await new_chat(database)
+        writer = TurnWriter(database, write_behind=True, flush_interval=60, max_attempts=3)
+        writer.start()
+        await writer.save(chat_id, ObjectId(), "hi", {"response": "hello"})
+        messages = database["Messages"]
+        messages.insert_many = failing(messages.insert_many)
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await writer.flush()
+        pending = writer.pending(chat_id)
+        await writer.flush()
+        await writer.close()
+        return chat_id, pending, len(messages.insert_many.calls), writer.stats()
+
+    chat_id, pending, attempts, stats = asyncio.run(main())
+    assert pending is False
+    assert attempts == 3
+    assert stats == {"turns": 0, "writes": 0, "buffered": 0, "dropped": 1}
+    assert f"Dropping a turn of chat {chat_id}" in caplog.text
+
+
+def test_close_writes_the_remaining_turns():
+    async def main():
+        database = Database()
+        chat_id = await new_chat(database)
+        writer = TurnWriter(database, write_behind=True, flush_interval=60)
+        writer.start()
+        await writer.save(chat_id, ObjectId(), "hi", {"response": "hello"})
+        await writer.close()
+        return await database["Messages"].count_documents({}), writer.stats()
+
+    assert asyncio.run(main()) == (2, {"turns": 1, "writes": 1, "buffered": 0, "dropped": 0})
+
+
+def test_full_buffer_wakes_the_flusher():
+    async def main():
+        database = Database()
+        chat_id = await new_chat(database)
+        writer = TurnWriter(database, write_behind=True, flush_interval=60, batch_size=2)
+        writer.start()
+        await writer.save(chat_id, ObjectId(), "a", {"response": "b"})
+        await writer.save(chat_id, ObjectId(), "c", {"response": "d"})
+        for _ in range(100):
+            if not writer.pending(chat_id):
+                break
+            await asyncio.sleep(0.01)
+        count = await database["Messages"].count_documents({})
+        await writer.close()
+        return count
+
+    assert asyncio.run(main()) == 4
@@ -0,0 +1,143 @@
+"""
+Tests for the problem-fetch service in utils.
+"""
+
+import asyncio
+import json
+
+import httpx
+
+import utils
+from utils import ProblemFetcher
+
+URL = "https://leetcode.com/problems/two-sum/description/"
+
+
+class Collection:
+    """An in-memory stand-in for the Problems collection."""
+
+    def __init__(self, documents=None):
+        self.documents = dict(documents or {})
+        self.reads = 0
+
+    async def find_one(self, filter, projection=None):
+        self.reads += 1
+        return self.documents.get(filter["_id"])
+
+    async def update_one(self, filter, update, upsert=False):
+        self.documents.setdefault(filter["_id"], {}).update(update["$set"])
+
+
+def graphql(requests, status=200, content="<p>Given an array</p>", delay=0.0):
+    """Return a transport answering questionData queries and recording their slugs."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content)["variables"]["titleSlug"])
+        await asyncio.sleep(delay)
+        if status != 200:
+            return httpx.Response(status, json={"errors": ["unavailable"]})
+        return httpx.Response(200, json={"data": {"question": {"content": content}}})
+
+    return httpx.MockTransport(handler)
+
+
+def fetcher(transport, **kwargs) -> ProblemFetcher:
+    return ProblemFetcher(httpx.AsyncClient(transport=transport), **kwargs)
+
+
+def test_concurrent_fetches_share_one_request():
+    requests = []
+
+    async def main():
+        problems = fetcher(graphql(requests, delay=0.05))
+        return await asyncio.gather(*(problems.fetch(URL) for _ in range(10)))
+
+    statements = asyncio.run(main())
+    assert requests == ["two-sum"]
+    assert statements == ["Given an array"] * 10
+
+
+def test_memory_cache_expires_after_ttl(monkeypatch):
+    requests = []
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, "monotonic", lambda: now[0])
+
+    async def main():
+        problems = fetcher(graphql(requests), ttl=60)
+        await problems.fetch(URL)
+        now[0] += 59
+        await problems.fetch(URL)
+        now[0] += 2
+        await problems.fetch(URL)
+
+    asyncio.run(main())
+    assert requests == ["two-sum", "two-sum"]
+
+
+def test_memory_cache_evicts_least_recently_used():
+    requests = []
+
+    async def main():
+        problems = fetcher(graphql(requests), max_entries=2)
+        await problems.fetch("https://leetcode.com/problems/a/")
+        await problems.fetch("https://leetcode.com/problems/b/")
+        await problems.fetch("https://leetcode.com/problems/a/")
+        await problems.fetch("https://leetcode.com/problems/c/")
+        await problems.fetch("https://leetcode.com/problems/a/")
+        await problems.fetch("https://leetcode.com/problems/b/")
+
+    asyncio.run(main())
+    assert requests == ["a", "b", "c", "b"]
+
+
+def test_mongo_cache_is_read_before_the_network():
+    requests = []
+    collection = Collection({"two-sum": {"_id": "two-sum", "statement": "Cached statement"}})
+
+    async def main():
+        problems = fetcher(graphql(requests), collection=collection)
+        return await problems.fetch(URL), await problems.fetch(URL)
+
+    assert asyncio.run(main()) == ("Cached statement", "Cached statement")
+    assert requests == []
+    assert collection.reads == 1
+
+
+def test_fetched_statement_is_stored_in_mongo():
+    collection = Collection()
+
+    async def main():
+        return await fetcher(graphql([]), collection=collection).fetch(URL)
+
+    assert asyncio.run(main()) == "Given an array"
+    assert collection.documents["two-sum"]["statement"] == "Given an array"
+
+
+def test_error_response_is_not_cached():
+    requests = []
+    collection = Collection()
+
+    async def main():
+        problems = fetcher(graphql(requests, status=503), collection=collection)
+        first = await problems.fetch(URL)
+        problems.client = httpx.AsyncClient(transport=graphql(requests))
+        return first, await problems.fetch(URL)
+
+    assert asyncio.run(main()) == (None, "Given an array")
+    assert requests == ["two-sum", "two-sum"]
+    assert collection.documents["two-sum"]["statement"] == "Given an array"
+
+
+def test_graphql_errors_are_not_cached():
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content)["variables"]["titleSlug"])
+        return httpx.Response(200, json={"errors": [{"message": "rate limited"}]})
+
+    async def main():
+        problems = fetcher(httpx.MockTransport(handler))
+        return await problems.fetch(URL), await problems.fetch(URL)
+
+    assert asyncio.run(main()) == (None, None)
+    assert requests == ["two-sum", "two-sum"]
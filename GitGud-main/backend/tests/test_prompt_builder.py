@@ -0,0 +1,102 @@
+"""
+Tests for the token-budgeted system prompt in Agent.prompt_builder.
+"""
+
+import pytest
+
+import tokens
+from Agent.prompt_builder import HISTORY_HEADER, build_system_prompt, compact_problem, render_problem
+from tokens import count_tokens
+
+STATEMENT = """Given an array of integers nums and an integer target, return indices of the
+two numbers such that they add up to target.
+
+Example 1:
+Input: nums = [2,7,11,15], target = 9
+Output: [0,1]
+
+Example 2:
+Input: nums = [3,2,4], target = 6
+Output: [1,2]
+
+Example 3:
+Input: nums = [3,3], target = 6
+Output: [0,1]
+
+Constraints:
+2 <= nums.length <= 10 4
+- Only one valid answer exists.
+"""
+
+
+@pytest.fixture
+def problem():
+    return compact_problem(STATEMENT)
+
+
+def test_problem_is_split_into_its_parts(problem):
+    assert problem["statement"] == (
+        "Given an array of integers nums and an integer target, return indices of the two "
+        "numbers such that they add up to target."
+    )
+    assert problem["examples"][0] == "Input: nums = [2,7,11,15], target = 9\nOutput: [0,1]"
+    assert len(problem["examples"]) == 3
+    assert problem["constraints"] == ["2 <= nums.length <= 10^4", "Only one valid answer exists."]
+    assert render_problem(problem, examples=1).count("Example") == 1
+
+
+def test_everything_fits_a_large_budget(problem):
+    history = ["User: How do I start?", "Assistant: Think about complements."]
+    prompt, stats = build_system_prompt("Help.", problem, "1. The user asked.", history, budget=10_000)
+    assert stats["dropped_examples"] == 0 and stats["dropped_messages"] == 0
+    assert stats["tokens"] == stats["untrimmed"]
+    assert "Example 3:" in prompt and "1. The user asked." in prompt and history[-1] in prompt
+
+
+def test_oldest_messages_are_dropped_first(problem):
+    history = [f"User: question {i} " + "padding " * 40 for i in range(10)]
+    _, full = build_system_prompt("Help.", problem, "", history, budget=10_000)
+    budget = full["untrimmed"] // 2
+    prompt, stats = build_system_prompt("Help.", problem, "", history, budget=budget)
+
+    assert stats["tokens"] <= budget < stats["untrimmed"]
+    assert count_tokens(prompt) <= budget + 5
+    assert "Example 1:" in prompt and "Constraints:" in prompt
+    assert 0 < stats["dropped_messages"] < len(history)
+    assert "question 9" in prompt and "question 0" not in prompt
+
+
+def test_recent_messages_come_before_further_examples(problem):
+    _, base = build_system_prompt("Help.", problem, budget=0)
+    latest = "User: latest question"
+    budget = base["tokens"] + count_tokens(HISTORY_HEADER) + count_tokens(latest) + 3
+    prompt, stats = build_system_prompt(
+        "Help.", problem, history=["User: an older question", latest], budget=budget
+    )
+    assert latest in prompt and "older question" not in prompt
+    assert "Example 1:" in prompt and "Example 2:" not in prompt
+    assert stats["dropped_messages"] == 1 and stats["dropped_examples"] == 2
+
+
+def test_a_long_last_message_keeps_its_end(problem):
+    _, minimal = build_system_prompt("Help.", problem, budget=10_000)
+    message = "User: " + " ".join(f"word{i}" for i in range(1000))
+    prompt, stats = build_system_prompt("Help.", problem, history=[message], budget=minimal["tokens"] + 50)
+    assert "word999" in prompt and "word0 " not in prompt
+    assert stats["tokens"] <= minimal["tokens"] + 50
+    assert stats["dropped_messages"] == 0
+
+
+def test_summary_keeps_its_end_when_it_does_not_fit(problem):
+    summary = " ".join(f"step{i}" for i in range(2000))
+    _, minimal = build_system_prompt("Help.", problem, budget=10_000)
+    prompt, stats = build_system_prompt("Help.", problem, summary, budget=minimal["tokens"] + 100)
+    assert "step1999" in prompt and "step0 " not in prompt
+    assert stats["tokens"] <= minimal["tokens"] + 100
+
+
+def test_tokens_are_estimated_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(tokens, "_encoding", lambda: None)
+    assert count_tokens("") == 0
+    assert count_tokens("abcd") == 1
+    assert count_tokens("abcde") == 2
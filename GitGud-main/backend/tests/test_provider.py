@@ -0,0 +1,105 @@
+"""
+Tests for the shared LLM connection in Agent.provider.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from Agent import provider as provider_module
+from Agent import registry
+from Agent.provider import LLMProvider, create_llm_provider
+from Agent.registry import get_agent, use_provider
+
+
+def completion(content):
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 1_700_000_000,
+        "model": "llama-test",
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    }
+
+
+@pytest.fixture
+def llm():
+    """A provider whose pooled client answers from a list of responses instead of the network."""
+    requests, responses = [], []
+
+    def handler(request):
+        requests.append(request)
+        return responses.pop(0)
+
+    llm = LLMProvider("test-key", base_url="https://groq.test", max_retries=1)
+    llm.http_client._transport = httpx.MockTransport(handler)
+    llm.requests, llm.responses = requests, responses
+    registry._agents.clear()
+    use_provider(llm)
+    yield llm
+    use_provider(None)
+    asyncio.run(llm.aclose())
+
+
+def test_groq_models_are_shared_per_name(llm):
+    model = llm.model("groq:llama-test")
+
+    assert llm.model("groq:llama-test") is model
+    assert llm.model("groq:other") is not model
+    assert model.model_name == "llama-test"
+
+
+def test_other_models_are_passed_through(llm):
+    assert llm.model("test") == "test"
+    assert llm.model("openai:gpt-4o") == "openai:gpt-4o"
+
+
+def test_agents_call_the_api_through_the_pooled_client(llm):
+    llm.responses += [
+        httpx.Response(200, json=completion("First.")),
+        httpx.Response(200, json=completion("Second.")),
+    ]
+
+    async def main():
+        chat = get_agent("groq:llama-test", system_prompt="Be brief.")
+        judge = get_agent("groq:llama-test", system_prompt="Judge.")
+        return (await chat.run("Hi")).output, (await judge.run("Hi")).output
+
+    assert asyncio.run(main()) == ("First.", "Second.")
+    assert [str(request.url) for request in llm.requests] == [
+        "https://groq.test/openai/v1/chat/completions"
+    ] * 2
+    assert all(request.headers["authorization"] == "Bearer test-key" for request in llm.requests)
+
+
+def test_rate_limited_calls_are_retried(llm):
+    llm.responses += [
+        httpx.Response(429, headers={"retry-after": "0"}, json={"error": {"message": "slow down"}}),
+        httpx.Response(200, json=completion("Done.")),
+    ]
+
+    async def main():
+        return (await get_agent("groq:llama-test", system_prompt="Be brief.").run("Hi")).output
+
+    assert asyncio.run(main()) == "Done."
+    assert len(llm.requests) == 2
+
+
+def test_no_provider_without_an_api_key(monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY")
+
+    assert create_llm_provider() is None
+
+
+def test_provider_falls_back_to_http1_without_h2(monkeypatch):
+    monkeypatch.setattr(provider_module, "http2_available", lambda: False)
+    llm = LLMProvider("test-key", timeout=30, connect_timeout=2)
+
+    assert not llm.http2
+    assert llm.http_client.timeout == httpx.Timeout(30, connect=2)
+    asyncio.run(llm.aclose())
+    assert llm.http_client.is_closed
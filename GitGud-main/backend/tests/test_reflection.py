@@ -0,0 +1,137 @@
+"""
+Tests for the budget of the level-2 reflection loop in Agent.agent.
+"""
+
+import asyncio
+
+import pytest
+
+from Agent import agent, registry
+from Agent.agent import ChatBot
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(agent.time, "monotonic", lambda: now[0])
+    return now
+
+
+def extract(code="def f(): return 1"):
+    return {
+        "extracted_code": code,
+        "validation_code": "print(f() == 1)",
+        "language": "python",
+        "test_cases": [],
+    }
+
+
+def test_loop_stops_after_max_iterations(clock):
+    state = {"max_iterations": 3, "started_at": 1000.0, "deadline": 1060.0}
+    clock[0] = 1001.0
+
+    assert ChatBot.budget_exhausted(state, 2) is None
+    assert ChatBot.budget_exhausted(state, 3) == "max_iterations"
+
+
+def test_loop_stops_when_another_iteration_would_pass_the_deadline(clock):
+    state = {"max_iterations": 10, "started_at": 1000.0, "deadline": 1060.0}
+
+    # Two iterations took 40s; a third averaging 20s would end at 1060
+    clock[0] = 1040.0
+    assert ChatBot.budget_exhausted(state, 2) is None
+    # Two iterations took 42s; a third averaging 21s would end at 1063
+    clock[0] = 1042.0
+    assert ChatBot.budget_exhausted(state, 2) == "deadline"
+
+
+def test_failed_attempt_is_fed_back_while_budget_remains(monkeypatch, clock):
+    async def verdict(extract, config):
+        return False, "False", "Handle the empty array."
+
+    monkeypatch.setattr(ChatBot, "verdict", staticmethod(verdict))
+    state = {
+        "extract_code": extract(),
+        "iterations": 0,
+        "attempts": {},
+        "max_iterations": 3,
+        "started_at": 1000.0,
+        "deadline": 1060.0,
+    }
+
+    update = asyncio.run(ChatBot._try_running(state, {}))
+
+    assert update["iterations"] == 1
+    assert "stop_reason" not in update
+    assert "Handle the empty array." in update["messages"][0]["content"]
+    assert list(update["attempts"].values()) == [False]
+
+
+def test_resubmitted_code_stops_the_loop(monkeypatch):
+    async def verdict(extract, config):
+        raise AssertionError("Tested code must not be run again")
+
+    monkeypatch.setattr(ChatBot, "verdict", staticmethod(verdict))
+    code = extract()
+    state = {
+        "extract_code": code,
+        "iterations": 1,
+        "attempts": {agent.code_hash(code["extracted_code"], code["language"]): False},
+        "max_iterations": 3,
+    }
+
+    update = asyncio.run(ChatBot._try_running(state, {}))
+
+    assert update["stop_reason"] == "repeated_code"
+    assert update["iterations"] == 2
+
+
+@pytest.fixture
+def failing_loop(monkeypatch, clock):
+    """Build the reflection graph on a model that drafts new code every call and never passes."""
+    drafts = [0]
+
+    async def call_model(state, config):
+        drafts[0] += 1
+        code = f"def f(): return {drafts[0]}"
+        return {
+            "messages": [{"role": "assistant", "content": f"```python\n{code}\n```"}],
+            "original_response": code,
+            "extract_code": extract(code),
+        }
+
+    async def verdict(extract, config):
+        clock[0] += 10
+        return False, "False", "Try again."
+
+    monkeypatch.setattr(ChatBot, "call_model", staticmethod(call_model))
+    monkeypatch.setattr(ChatBot, "verdict", staticmethod(verdict))
+    monkeypatch.setattr(registry, "_graphs", {})
+    return drafts
+
+
+def test_reflection_graph_runs_until_max_iterations(failing_loop):
+    chatbot = ChatBot(
+        [{"role": "user", "content": "Solve it"}], "Two sum.", level=2, max_iterations=4
+    )
+
+    result = asyncio.run(chatbot.chat())
+
+    assert (result["iterations"], result["stop_reason"]) == (4, "max_iterations")
+    assert failing_loop[0] == 4
+    assert result["response"] == "```python\ndef f(): return 4\n```"
+
+
+def test_reflection_graph_stops_at_the_deadline(failing_loop):
+    chatbot = ChatBot(
+        [{"role": "user", "content": "Solve it"}],
+        "Two sum.",
+        level=2,
+        max_iterations=10,
+        reflection_timeout=35,
+    )
+
+    result = asyncio.run(chatbot.chat())
+
+    # Each attempt takes 10s, so a fourth would end past the 35s deadline
+    assert (result["iterations"], result["stop_reason"]) == (3, "deadline")
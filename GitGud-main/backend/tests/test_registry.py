@@ -0,0 +1,67 @@
+"""
+Tests for the process-wide agents and graphs in Agent.registry.
+"""
+
+import asyncio
+
+import pytest
+from pydantic_ai.models.test import TestModel
+
+from Agent import registry
+from Agent.models import AgentDeps
+from Agent.registry import get_agent, get_graph, use_provider
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    registry._agents.clear()
+    registry._graphs.clear()
+    yield
+    use_provider(None)
+    registry._graphs.clear()
+
+
+def test_agents_are_shared_per_configuration():
+    agent = get_agent("test", system_prompt="Judge.", model_settings={"temperature": 0.3})
+    assert get_agent("test", system_prompt="Judge.", model_settings={"temperature": 0.3}) is agent
+    assert get_agent("test", system_prompt="Judge.", model_settings={"temperature": 0.8}) is not agent
+    assert get_agent("test", system_prompt="Summarize.", model_settings={"temperature": 0.3}) is not agent
+    assert get_agent("test", system_prompt="Judge.", output_type=bool, model_settings={"temperature": 0.3}) is not agent
+
+
+def test_agent_without_a_system_prompt_reads_it_from_the_deps():
+    agent = get_agent("test")
+
+    async def main():
+        first = await agent.run("hi", deps=AgentDeps(api_key="", system_prompt="Level 0 prompt"))
+        second = await agent.run("hi", deps=AgentDeps(api_key="", system_prompt="Level 2 prompt"))
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.all_messages()[0].parts[0].content == "Level 0 prompt"
+    assert second.all_messages()[0].parts[0].content == "Level 2 prompt"
+
+
+def test_graphs_are_compiled_once():
+    builds = []
+
+    def build():
+        builds.append(1)
+        return object()
+
+    graph = get_graph("agent", build)
+    assert get_graph("agent", build) is graph
+    assert len(builds) == 1
+
+
+def test_registering_a_provider_recreates_the_agents():
+    pooled = TestModel()
+
+    class Provider:
+        def model(self, name):
+            return pooled
+
+    agent = get_agent("groq:some-model")
+    use_provider(Provider())
+    assert get_agent("groq:some-model") is not agent
+    assert get_agent("groq:some-model").model is pooled
@@ -0,0 +1,117 @@
+"""
+Tests for the response cache in Agent.response_cache and its use by ChatBot.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from Agent import agent, response_cache
+from Agent.agent import ChatBot
+from Agent.response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_questions_match_after_normalization():
+    async def main():
+        cache = ResponseCache()
+        await cache.set("scope", "How do I start?", "Use a hash map.")
+        return await cache.get("scope", "  how do I   START "), await cache.get("other", "How do I start?")
+
+    assert asyncio.run(main()) == ("Use a hash map.", None)
+
+
+def test_entries_expire_after_ttl(clock):
+    async def main():
+        cache = ResponseCache(ttl=60)
+        await cache.set("scope", "hint", "Use a hash map.")
+        clock[0] += 59
+        fresh = await cache.get("scope", "hint")
+        clock[0] += 2
+        return fresh, await cache.get("scope", "hint"), cache.stats()
+
+    fresh, expired, stats = asyncio.run(main())
+    assert (fresh, expired) == ("Use a hash map.", None)
+    assert stats["exact_hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def main():
+        cache = ResponseCache(max_entries=2)
+        await cache.set("scope", "a", "A")
+        await cache.set("scope", "b", "B")
+        await cache.get("scope", "a")
+        await cache.set("scope", "c", "C")
+        return [await cache.get("scope", question) for question in "abc"]
+
+    assert asyncio.run(main()) == ["A", None, "C"]
+
+
+class Embedder:
+    def embed(self, text):
+        return [1.0, 0.0] if "hash" in text else [0.0, 1.0]
+
+
+def test_similar_questions_match_within_a_scope():
+    async def main():
+        cache = ResponseCache(embedder=Embedder(), similarity=0.9)
+        await cache.set("scope", "why a hash map", "Lookups are O(1).")
+        return await cache.get("scope", "is a hash map needed"), await cache.get("scope", "why sort")
+
+    assert asyncio.run(main()) == ("Lookups are O(1).", None)
+
+
+def run_turn(monkeypatch, level, stop_reason, cache):
+    """Run a turn on a stub graph that stops with the given reason."""
+
+    class Graph:
+        async def ainvoke(self, state, config=None):
+            return {
+                "messages": [*state["messages"], SimpleNamespace(type="ai", content="draft")],
+                "summary": "",
+                "iterations": 3,
+                "stop_reason": stop_reason,
+            }
+
+    monkeypatch.setattr(agent, "get_graph", lambda name, builder: Graph())
+    chatbot = ChatBot(
+        [{"role": "user", "content": "Solve it"}], "Two sum.", level=level, response_cache=cache
+    )
+    return asyncio.run(chatbot.chat())
+
+
+@pytest.mark.parametrize("stop_reason", ["passed", "no_code"])
+def test_tested_level_two_responses_are_cached(monkeypatch, stop_reason):
+    cache = ResponseCache()
+    run_turn(monkeypatch, 2, stop_reason, cache)
+    assert cache.stats()["entries"] == 1
+
+    result = run_turn(monkeypatch, 2, "max_iterations", cache)
+    assert result == {
+        "response": "draft",
+        "summary": "",
+        "reflection": [],
+        "iterations": 0,
+        "stop_reason": "cached",
+    }
+
+
+@pytest.mark.parametrize("stop_reason", ["max_iterations", "deadline", "repeated_code", "runner_unavailable"])
+def test_untested_level_two_responses_are_not_cached(monkeypatch, stop_reason):
+    cache = ResponseCache()
+    result = run_turn(monkeypatch, 2, stop_reason, cache)
+    assert result["stop_reason"] == stop_reason
+    assert cache.stats()["entries"] == 0
+
+
+def test_lower_level_responses_are_cached(monkeypatch):
+    cache = ResponseCache()
+    run_turn(monkeypatch, 0, "", cache)
+    assert cache.stats()["entries"] == 1
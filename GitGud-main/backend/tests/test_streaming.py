@@ -0,0 +1,157 @@
+"""
+Tests for the Server-Sent Events endpoint of the chat and ChatBot.stream.
+"""
+
+import asyncio
+import datetime as dt
+import json
+from datetime import timezone
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import Agent
+from Agent import agent
+from Agent.agent import ChatBot, emit_event
+from Auth import get_current_user
+
+
+class Graph:
+    """Stands in for the compiled graph: streams two tokens and a stage, then answers."""
+
+    def __init__(self, error=None):
+        self.error = error
+
+    async def ainvoke(self, state, config=None):
+        await emit_event(config, "token", {"content": "Use "})
+        await emit_event(config, "token", {"content": "a hash map."})
+        await emit_event(config, "stage", {"stage": "extract"})
+        if self.error:
+            raise self.error
+        return {
+            "messages": [*state["messages"], SimpleNamespace(type="ai", content="Use a hash map.")],
+            "summary": "",
+            "iterations": 0,
+            "stop_reason": "",
+        }
+
+
+class TurnWriter:
+    def __init__(self, error=None):
+        self.error = error
+        self.saved = []
+
+    async def sync(self, chat_id):
+        pass
+
+    async def save(self, chat_id, user_id, message, result):
+        if self.error:
+            raise self.error
+        self.saved.append((chat_id, user_id, message, result["response"]))
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.fixture
+def app(monkeypatch):
+    user_id, chat_id = ObjectId(), ObjectId()
+    database = AsyncMongoMockClient()["GitGud"]
+    now = dt.datetime.now(timezone.utc)
+
+    async def seed():
+        await database["Chat List"].insert_one(
+            {"_id": chat_id, "user_id": user_id, "problem_statement": "Two sum.", "created_at": now}
+        )
+        await database["Messages"].insert_one(
+            {"chat_id": chat_id, "user_id": user_id, "role": "assistant", "message": "Hi!", "timestamp": now}
+        )
+
+    asyncio.run(seed())
+    folded = []
+
+    async def fold_summary(database, chat, user):
+        folded.append(chat)
+
+    monkeypatch.setattr(Agent, "fold_summary", fold_summary)
+    monkeypatch.setattr(agent, "get_graph", lambda name, builder: Graph())
+
+    app = FastAPI()
+    app.include_router(Agent.agent_router)
+    app.dependency_overrides[get_current_user] = lambda: {"_id": str(user_id)}
+    app.database = database
+    app.turn_writer = TurnWriter()
+    app.code_runner = None
+    app.response_cache = None
+    app.chat_id = chat_id
+    app.folded = folded
+    return app
+
+
+def stream(app, message="How do I start?"):
+    with TestClient(app) as client:
+        response = client.post(
+            "/chat_message/stream", params={"chat_id": str(app.chat_id)}, json={"message": message}
+        )
+    return response
+
+
+def test_tokens_and_stages_are_streamed_before_the_saved_message(app):
+    response = stream(app)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    assert parse_events(response.text) == [
+        ("token", {"content": "Use "}),
+        ("token", {"content": "a hash map."}),
+        ("stage", {"stage": "extract"}),
+        ("done", {"message": "Use a hash map.", "iterations": 0}),
+    ]
+    assert [saved[2:] for saved in app.turn_writer.saved] == [("How do I start?", "Use a hash map.")]
+    assert app.folded == [app.chat_id]
+
+
+def test_failed_save_is_reported_as_an_error_event(app):
+    app.turn_writer = TurnWriter(error=RuntimeError("database unavailable"))
+
+    events = parse_events(stream(app).text)
+
+    assert events[-1] == ("error", {"detail": "database unavailable"})
+    assert app.folded == []
+
+
+def test_failed_turn_is_reported_as_an_error_event(app, monkeypatch):
+    monkeypatch.setattr(agent, "get_graph", lambda name, builder: Graph(RuntimeError("model unavailable")))
+
+    events = parse_events(stream(app).text)
+
+    assert [event for event, _ in events] == ["token", "token", "stage", "error"]
+    assert events[-1][1] == {"detail": "model unavailable"}
+    assert app.turn_writer.saved == []
+
+
+def test_unknown_chat_is_rejected_before_streaming(app):
+    app.chat_id = ObjectId()
+
+    assert stream(app).status_code == 404
+
+
+def test_stream_ends_with_the_chat_result(monkeypatch):
+    monkeypatch.setattr(agent, "get_graph", lambda name, builder: Graph())
+    chatbot = ChatBot([{"role": "user", "content": "How do I start?"}], "Two sum.")
+
+    async def main():
+        return [item async for item in chatbot.stream()]
+
+    items = asyncio.run(main())
+    assert [item["event"] for item in items] == ["token", "token", "stage", "done"]
+    assert items[-1]["data"]["response"] == "Use a hash map."
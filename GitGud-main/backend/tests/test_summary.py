@@ -0,0 +1,145 @@
+"""
+Tests for the rolling conversation summary in Agent.summary.
+"""
+
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from Agent import summary
+from Agent.summary import SUMMARY_KEEP_RECENT, SUMMARY_MAX_FOLD, fold_summary
+from Database.history import load_recent_messages
+
+START = dt.datetime(2025, 5, 1, 12, 0)
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    """Replace the summarizer model with one that lists the messages it was given."""
+    prompts = []
+
+    async def run_agent(name, model, prompt, deps=None):
+        prompts.append(prompt)
+        return SimpleNamespace(output=f"summary {len(prompts)}")
+
+    monkeypatch.setattr(summary, "get_agent", lambda *args, **kwargs: None)
+    monkeypatch.setattr(summary, "run_agent", run_agent)
+    return prompts
+
+
+def add_messages(database, chat, count, first=0, ids=None):
+    """Insert messages one second apart, with the given IDs if any."""
+    ids = ids or [ObjectId() for _ in range(count)]
+    documents = [
+        {
+            "_id": ids[i],
+            "chat_id": chat["_id"],
+            "user_id": chat["user_id"],
+            "role": "user" if (first + i) % 2 == 0 else "assistant",
+            "message": f"message {first + i}",
+            "timestamp": START + dt.timedelta(seconds=first + i),
+        }
+        for i in range(count)
+    ]
+    return database["Messages"].insert_many(documents)
+
+
+async def new_chat(database):
+    chat = {"_id": ObjectId(), "user_id": ObjectId(), "summary": "", "summary_watermark": None}
+    await database["Chat List"].insert_one(chat)
+    return chat
+
+
+def test_short_chats_are_not_summarized(summarizer):
+    async def main():
+        database = AsyncMongoMockClient()["GitGud"]
+        chat = await new_chat(database)
+        await add_messages(database, chat, 10)
+        await fold_summary(database, chat["_id"], chat["user_id"])
+        return await database["Chat List"].find_one({"_id": chat["_id"]})
+
+    chat = asyncio.run(main())
+    assert summarizer == []
+    assert chat["summary_watermark"] is None
+
+
+def test_fold_keeps_the_most_recent_messages(summarizer):
+    async def main():
+        database = AsyncMongoMockClient()["GitGud"]
+        chat = await new_chat(database)
+        await add_messages(database, chat, 12)
+        await fold_summary(database, chat["_id"], chat["user_id"])
+        chat = await database["Chat List"].find_one({"_id": chat["_id"]})
+        history = await load_recent_messages(
+            database, chat["_id"], chat["user_id"], after=chat["summary_watermark"]
+        )
+        return chat, history
+
+    chat, history = asyncio.run(main())
+    assert chat["summary"] == "summary 1"
+    assert "message 7" in summarizer[0] and "message 8" not in summarizer[0]
+    assert chat["summary_watermark"]["timestamp"] == START + dt.timedelta(seconds=7)
+    assert [m["message"] for m in history] == [f"message {i}" for i in range(8, 12)]
+
+
+def test_watermark_follows_timestamps_not_ids(summarizer):
+    # IDs generated by different processes are not in the order the messages were written
+    ids = sorted((ObjectId() for _ in range(30)), reverse=True)
+
+    async def main():
+        database = AsyncMongoMockClient()["GitGud"]
+        chat = await new_chat(database)
+        await add_messages(database, chat, 12, ids=ids[:12])
+        await fold_summary(database, chat["_id"], chat["user_id"])
+        await add_messages(database, chat, 8, first=12, ids=ids[12:20])
+        await fold_summary(database, chat["_id"], chat["user_id"])
+        chat = await database["Chat List"].find_one({"_id": chat["_id"]})
+        history = await load_recent_messages(
+            database, chat["_id"], chat["user_id"], after=chat["summary_watermark"]
+        )
+        return history
+
+    history = asyncio.run(main())
+    assert len(summarizer) == 2
+    assert "message 8" in summarizer[1] and "message 15" in summarizer[1]
+    assert [m["message"] for m in history] == [f"message {i}" for i in range(16, 20)]
+
+
+def test_id_only_watermark_is_still_honoured(summarizer):
+    async def main():
+        database = AsyncMongoMockClient()["GitGud"]
+        chat = await new_chat(database)
+        ids = sorted(ObjectId() for _ in range(16))
+        await add_messages(database, chat, 16, ids=ids)
+        await database["Chat List"].update_one(
+            {"_id": chat["_id"]}, {"$set": {"summary_watermark": ids[3]}}
+        )
+        await fold_summary(database, chat["_id"], chat["user_id"])
+        return await database["Chat List"].find_one({"_id": chat["_id"]})
+
+    chat = asyncio.run(main())
+    assert "message 3" not in summarizer[0] and "message 4" in summarizer[0]
+    assert chat["summary_watermark"]["timestamp"] == START + dt.timedelta(seconds=11)
+
+
+def test_long_backlog_is_folded_in_bounded_steps(summarizer):
+    async def main():
+        database = AsyncMongoMockClient()["GitGud"]
+        chat = await new_chat(database)
+        await add_messages(database, chat, 2 * SUMMARY_MAX_FOLD + 20)
+        await fold_summary(database, chat["_id"], chat["user_id"])
+        first = await database["Chat List"].find_one({"_id": chat["_id"]})
+        await fold_summary(database, chat["_id"], chat["user_id"])
+        second = await database["Chat List"].find_one({"_id": chat["_id"]})
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert summarizer[0].count("\n") < SUMMARY_MAX_FOLD + SUMMARY_KEEP_RECENT + 5
+    second_of = lambda chat: (chat["summary_watermark"]["timestamp"] - START).seconds
+    assert second_of(first) == SUMMARY_MAX_FOLD - 1
+    assert second_of(second) == 2 * SUMMARY_MAX_FOLD - 1
+    assert "summary 1" in summarizer[1]
@@ -0,0 +1,95 @@
+"""
+Tests for the cache of user principals in Auth.cache.
+"""
+
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from Auth import cache
+from Auth.cache import MemoryCacheBackend, UserCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def user(**fields):
+    return {"_id": ObjectId(), "email": "ada@example.com", "password": "$2b$12$hash", **fields}
+
+
+def test_cached_principals_have_no_password():
+    ada = user()
+
+    async def main():
+        users = UserCache()
+        await users.set(ada)
+        return await users.get(ada["_id"])
+
+    cached = asyncio.run(main())
+    assert cached == {"_id": ada["_id"], "email": "ada@example.com"}
+
+
+def test_principals_expire_after_ttl(clock):
+    ada = user()
+
+    async def main():
+        users = UserCache(ttl=60)
+        await users.set(ada)
+        clock[0] += 59
+        fresh = await users.get(ada["_id"])
+        clock[0] += 2
+        return fresh, await users.get(ada["_id"])
+
+    fresh, expired = asyncio.run(main())
+    assert fresh is not None
+    assert expired is None
+
+
+def test_least_recently_used_principal_is_evicted():
+    ada, grace, linus = user(), user(), user()
+
+    async def main():
+        users = UserCache(backend=MemoryCacheBackend(max_entries=2))
+        await users.set(ada)
+        await users.set(grace)
+        await users.get(ada["_id"])
+        await users.set(linus)
+        return [await users.get(u["_id"]) is not None for u in (ada, grace, linus)]
+
+    assert asyncio.run(main()) == [True, False, True]
+
+
+def test_callers_cannot_change_cached_principals():
+    ada = user()
+
+    async def main():
+        users = UserCache()
+        await users.set(ada)
+        (await users.get(ada["_id"]))["email"] = "changed@example.com"
+        return await users.get(ada["_id"])
+
+    assert asyncio.run(main())["email"] == "ada@example.com"
+
+
+def test_stats_count_hits_and_misses():
+    ada = user()
+
+    async def main():
+        users = UserCache()
+        await users.get(ada["_id"])
+        await users.set(ada)
+        await users.get(ada["_id"])
+        await users.get(ada["_id"])
+        return users.stats()
+
+    assert asyncio.run(main()) == {
+        "hits": 2,
+        "misses": 1,
+        "hit_ratio": 2 / 3,
+        "saved_db_calls": 2,
+    }
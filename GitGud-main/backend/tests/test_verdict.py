@@ -0,0 +1,92 @@
+"""
+Tests for the local verdicts in Agent.verdict and their use by ChatBot.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from Agent import agent
+from Agent.agent import ChatBot
+from Agent.code_runner import CodeRunnerClient
+from Agent.verdict import local_verdict
+
+
+def test_all_true_output_passes():
+    verdict = local_verdict("True\nTrue\nTest 3: True\n", ok=True)
+    assert verdict["passed"] is True
+
+
+def test_false_lines_fail_with_their_numbers():
+    verdict = local_verdict("True\nFalse\nTrue\ncase 4 = failed\n", ok=True)
+    assert verdict["passed"] is False
+    assert "Test cases 2, 4 of 4 failed" in verdict["advice"]
+
+
+def test_free_form_output_is_escalated():
+    assert local_verdict("[0, 1]\n", ok=True) is None
+
+
+def test_silent_assertions_pass():
+    assert local_verdict("", ok=True, validation_code="assert f() == 1")["passed"] is True
+    assert local_verdict("", ok=True, validation_code="f()") is None
+
+
+def test_unrun_code_is_escalated():
+    assert local_verdict("", ok=None) is None
+
+
+def test_time_limit():
+    verdict = local_verdict("Time limit exceeded (5s)", ok=False)
+    assert verdict["passed"] is False
+    assert "took too long" in verdict["advice"]
+
+
+def test_python_traceback():
+    output = 'Traceback (most recent call last):\n  File "main.py", line 3\nIndexError: list index out of range'
+    verdict = local_verdict(output, ok=False)
+    assert verdict["passed"] is False
+    assert "IndexError: list index out of range" in verdict["advice"]
+
+
+def test_failed_assertion():
+    output = "Traceback (most recent call last):\n  File \"main.py\", line 9\nAssertionError"
+    assert "assertion failed" in local_verdict(output, ok=False)["advice"]
+
+
+def test_compile_error():
+    output = "main.cpp:4:5: error: 'vector' was not declared in this scope"
+    verdict = local_verdict(output, ok=False)
+    assert verdict["advice"] == "The code does not compile: 'vector' was not declared in this scope"
+
+
+def test_java_exception():
+    output = 'Exception in thread "main" java.lang.ArrayIndexOutOfBoundsException: Index 5'
+    assert "ArrayIndexOutOfBoundsException" in local_verdict(output, ok=False)["advice"]
+
+
+def extract():
+    return {
+        "extracted_code": "def f(): return 1",
+        "validation_code": "print(f() == 1)",
+        "language": "python",
+        "test_cases": [],
+    }
+
+
+def no_judge(*args, **kwargs):
+    raise AssertionError("The judge model must not be called")
+
+
+@pytest.mark.parametrize("code_runner", [None, "open circuit"])
+def test_unavailable_runner_stops_the_loop_without_the_judge(monkeypatch, code_runner):
+    monkeypatch.setattr(agent, "get_agent", no_judge)
+    if code_runner == "open circuit":
+        code_runner = CodeRunnerClient("http://code-runner.test/execute")
+        code_runner._opened_at = time.monotonic()
+    state = {"extract_code": extract(), "iterations": 0, "attempts": {}, "max_iterations": 3}
+    config = {"configurable": {"code_runner": code_runner}}
+
+    update = asyncio.run(ChatBot._try_running(state, config))
+    assert update == {"extract_code": None, "stop_reason": "runner_unavailable"}
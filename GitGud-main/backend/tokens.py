@@ -0,0 +1,49 @@
+"""
+This module counts tokens the way the chat model's prompt is budgeted.
+
+Tokens are counted locally with tiktoken when it is installed, or estimated at four characters
+per token otherwise. The prompt builder and the history loader both count with `count_tokens`,
+so a message takes the same share of the budget wherever it is measured.
+"""
+
+import logging
+import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+PROMPT_TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "cl100k_base")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(PROMPT_TOKEN_ENCODING)
+    except Exception as e:
+        logger.warning(f"Could not load the {PROMPT_TOKEN_ENCODING} encoding, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The number of tokens, estimated at four characters per token without tiktoken.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,62 +1,198 @@
-import requests, json, re
-from bs4 import BeautifulSoup
+"""
+This module provides the problem-fetch service used when creating chats.
+
+Problem statements are fetched from the LeetCode GraphQL endpoint through a shared,
+pooled httpx.AsyncClient, with concurrent requests for the same slug coalesced into a
+single fetch, an in-process TTL/LRU cache and a persistent MongoDB cache.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
 from urllib.parse import urlparse
 
-def scraper(problem_url: str) -> str:
+import httpx
+from bs4 import BeautifulSoup
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+LEETCODE_GRAPHQL_URL = "https://leetcode.com/graphql/"
+QUESTION_QUERY = """
+query questionData($titleSlug: String!) {
+  question(titleSlug: $titleSlug) {
+    content
+  }
+}
+"""
+
+
+def extract_slug(problem_url: str) -> str | None:
     """
-    Fetch and extract the text description of a LeetCode problem given its URL.
+    Extract the problem slug from a LeetCode problem URL.
 
     Args:
         problem_url (str): Full problem URL, e.g.
             'https://leetcode.com/problems/two-sum/description/'
 
     Returns:
-        str: Plain-text problem description, or an error message.
+        str | None: The problem slug (e.g. 'two-sum'), or None if it could not be extracted.
     """
-    # 1. Parse URL
-    parsed = urlparse(problem_url)
-    path = parsed.path.rstrip('/')  # drop trailing slash(es) :contentReference[oaicite:7]{index=7}
-
-    # 2. Extract slug
-    # Option A: split logic
-    parts = path.split('/')
-    if parts[-1] == 'description' and len(parts) >= 2:
+    path = urlparse(problem_url).path.rstrip("/")
+    parts = path.split("/")
+    if parts[-1] == "description" and len(parts) >= 2:
         slug = parts[-2]
     else:
         slug = parts[-1]
+    return slug or None
+
+
+def html_to_text(html: str) -> str:
+    """
+    Convert the HTML of a problem statement to plain text.
+
+    Inline markup stays on its line, superscripts are written as powers (10^4) and list items
+    as '- ' bullets.
+
+    Args:
+        html (str): The HTML content of the problem.
+
+    Returns:
+        str: The plain-text statement, one paragraph or list item per line.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for sup in soup.find_all("sup"):
+        sup.replace_with("^" + sup.get_text())
+    for item in soup.find_all("li"):
+        item.insert(0, "- ")
+    lines = (" ".join(line.replace("\xa0", " ").split()) for line in soup.get_text().splitlines())
+    return "\n".join(line for line in lines if line)
+
 
-    if not slug:
-        return f"Error: could not extract problem slug from '{problem_url}'"
-
-    # 3. Prepare GraphQL request
-    url = 'https://leetcode.com/graphql/'
-    headers = {
-        'Content-Type': 'application/json',
-        'Referer': f'https://leetcode.com/problems/{slug}/'
-    }
-    payload = {
-        'operationName': 'questionData',
-        'variables': {'titleSlug': slug},
-        'query': '''
-        query questionData($titleSlug: String!) {
-          question(titleSlug: $titleSlug) {
-            content
-          }
+class ProblemFetcher:
+    """
+    Fetches and caches plain-text problem statements keyed by problem slug.
+
+    Attributes:
+        client (httpx.AsyncClient): Shared HTTP client used for GraphQL requests.
+        collection: MongoDB collection used as a persistent cache, or None to disable it.
+        graphql_url (str): The GraphQL endpoint to query.
+        ttl (float): Seconds a statement stays in the in-process cache.
+        max_entries (int): Maximum number of statements kept in the in-process cache.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        collection=None,
+        graphql_url: str = LEETCODE_GRAPHQL_URL,
+        ttl: float = 6 * 60 * 60,
+        max_entries: int = 512,
+    ):
+        self.client = client
+        self.collection = collection
+        self.graphql_url = graphql_url
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def fetch(self, problem_url: str) -> str | None:
+        """
+        Return the problem statement for a problem URL.
+
+        Args:
+            problem_url (str): Full problem URL.
+
+        Returns:
+            str | None: Plain-text problem description, or None if it could not be fetched.
+        """
+        slug = extract_slug(problem_url)
+        if not slug:
+            logger.error(f"Could not extract problem slug from '{problem_url}'")
+            return None
+
+        cached = self._memory_get(slug)
+        if cached is not None:
+            return cached
+
+        # Concurrent requests for the same slug share a single load
+        task = self._inflight.get(slug)
+        if task is None:
+            task = asyncio.ensure_future(self._load(slug))
+            self._inflight[slug] = task
+            task.add_done_callback(lambda _: self._inflight.pop(slug, None))
+        return await asyncio.shield(task)
+
+    def _memory_get(self, slug: str) -> str | None:
+        entry = self._memory.get(slug)
+        if entry is None:
+            return None
+        expires_at, statement = entry
+        if expires_at < time.monotonic():
+            del self._memory[slug]
+            return None
+        self._memory.move_to_end(slug)
+        return statement
+
+    def _memory_set(self, slug: str, statement: str) -> None:
+        self._memory[slug] = (time.monotonic() + self.ttl, statement)
+        self._memory.move_to_end(slug)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _load(self, slug: str) -> str | None:
+        statement = None
+        if self.collection is not None:
+            try:
+                doc = await self.collection.find_one({"_id": slug}, {"statement": 1})
+                if doc:
+                    statement = doc["statement"]
+            except Exception as e:
+                logger.error(f"Error reading cached problem '{slug}': {e}")
+
+        if statement is None:
+            with span("scrape"):
+                statement = await self._request(slug)
+            if statement is None:
+                return None
+            if self.collection is not None:
+                try:
+                    await self.collection.update_one(
+                        {"_id": slug},
+                        {"$set": {"statement": statement, "fetched_at": time.time()}},
+                        upsert=True,
+                    )
+                except Exception as e:
+                    logger.error(f"Error caching problem '{slug}': {e}")
+
+        self._memory_set(slug, statement)
+        return statement
+
+    async def _request(self, slug: str) -> str | None:
+        headers = {
+            "Content-Type": "application/json",
+            "Referer": f"https://leetcode.com/problems/{slug}/",
+        }
+        payload = {
+            "operationName": "questionData",
+            "variables": {"titleSlug": slug},
+            "query": QUESTION_QUERY,
         }
-        '''
-    }
-
-    # 4. Fetch and parse
-    try:
-        resp = requests.post(url, headers=headers, data=json.dumps(payload))
-        resp.raise_for_status()              # HTTP errors :contentReference[oaicite:8]{index=8}
-        data = resp.json()
-        if 'errors' in data:
-            return f"Error from API: {data['errors']}"
-
-        html = data['data']['question']['content']
-        soup = BeautifulSoup(html, 'html.parser')
-        return soup.get_text(separator='\n', strip=True)
-
-    except requests.RequestException as e:
-        return f"Request failed: {e}"
+        try:
+            resp = await self.client.post(self.graphql_url, headers=headers, json=payload)
+            resp.raise_for_status()
+            data = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Request for problem '{slug}' failed: {e}")
+            return None
+
+        if "errors" in data:
+            logger.error(f"Error from API for problem '{slug}': {data['errors']}")
+            return None
+        question = (data.get("data") or {}).get("question")
+        if not question or not question.get("content"):
+            return None
+
+        return html_to_text(question["content"])
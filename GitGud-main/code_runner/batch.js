@@ -0,0 +1,248 @@
+// Test harnesses for /execute_batch.
+//
+// A batch is a solution plus test cases. Each test's "input" is an expression in the
+// submission's language that calls the solution (e.g. "Solution().twoSum([2, 7], 9)") and its
+// optional "expected" is an expression for the expected result. The generated harness runs every
+// test in one process, catching errors per test, and prints one marked JSON line per test with
+// its verdict, time and memory; without an expected value a test passes if it runs without error.
+// Test expressions that are not valid in the language are reported as a harness error instead:
+// by the compiler for C, C++ and Java, and by a marked line from the Python harness.
+//
+// Memory is the per-test peak traced by tracemalloc for Python, the process's peak resident set
+// size for C/C++, and the heap in use after the test for Java.
+
+const MARKER = "\u001eGITGUD_TEST\u001e";
+
+function pythonHarness(tests) {
+  return `
+import json as _gitgud_json, time as _gitgud_time, tracemalloc as _gitgud_tracemalloc
+
+_gitgud_tests = _gitgud_json.loads(${JSON.stringify(JSON.stringify(tests))})
+for _gitgud_index, _gitgud_test in enumerate(_gitgud_tests):
+    for _gitgud_key in ("input", "expected"):
+        if _gitgud_test.get(_gitgud_key) is None:
+            continue
+        try:
+            compile(_gitgud_test[_gitgud_key], "<test>", "eval")
+        except SyntaxError as _gitgud_error:
+            print(${JSON.stringify(MARKER)} + _gitgud_json.dumps({
+                "harness_error": f"test {_gitgud_index} {_gitgud_key}: SyntaxError: {_gitgud_error.msg}"
+            }), flush=True)
+            raise SystemExit(0)
+
+for _gitgud_index, _gitgud_test in enumerate(_gitgud_tests):
+    _gitgud_result = {"index": _gitgud_index, "passed": False, "output": None, "error": None}
+    _gitgud_tracemalloc.start()
+    _gitgud_start = _gitgud_time.perf_counter()
+    try:
+        _gitgud_output = eval(_gitgud_test["input"])
+        _gitgud_result["output"] = repr(_gitgud_output)
+        _gitgud_result["passed"] = (
+            _gitgud_test.get("expected") is None or _gitgud_output == eval(_gitgud_test["expected"])
+        )
+    except Exception as _gitgud_error:
+        _gitgud_result["error"] = f"{type(_gitgud_error).__name__}: {_gitgud_error}"
+    _gitgud_result["time_ms"] = (_gitgud_time.perf_counter() - _gitgud_start) * 1000
+    _gitgud_result["memory_kb"] = _gitgud_tracemalloc.get_traced_memory()[1] // 1024
+    _gitgud_tracemalloc.stop()
+    print(${JSON.stringify(MARKER)} + _gitgud_json.dumps(_gitgud_result), flush=True)
+`;
+}
+
+const CPP_PRELUDE = `
+#include <chrono>
+#include <exception>
+#include <iostream>
+#include <sstream>
+#include <string>
+#include <utility>
+#include <vector>
+#include <sys/resource.h>
+
+namespace gitgud_batch {
+inline std::string json(const std::string& text) {
+  std::ostringstream os;
+  os << '"';
+  for (unsigned char c : text) {
+    if (c == '"' || c == '\\\\') os << '\\\\' << c;
+    else if (c < 0x20) os << "\\\\u00" << "0123456789abcdef"[c >> 4] << "0123456789abcdef"[c & 15];
+    else os << c;
+  }
+  os << '"';
+  return os.str();
+}
+template <typename T> void show(std::ostream& os, const T& value) { os << value; }
+inline void show(std::ostream& os, const std::string& value) { os << json(value); }
+inline void show(std::ostream& os, bool value) { os << (value ? "true" : "false"); }
+template <typename A, typename B> void show(std::ostream& os, const std::pair<A, B>& value) {
+  os << '(';
+  show(os, value.first);
+  os << ", ";
+  show(os, value.second);
+  os << ')';
+}
+template <typename T> void show(std::ostream& os, const std::vector<T>& value) {
+  os << '[';
+  for (size_t i = 0; i < value.size(); ++i) {
+    if (i) os << ", ";
+    show(os, value[i]);
+  }
+  os << ']';
+}
+template <typename T> std::string repr(const T& value) {
+  std::ostringstream os;
+  show(os, value);
+  return os.str();
+}
+inline long peak_kb() {
+  struct rusage usage;
+  getrusage(RUSAGE_SELF, &usage);
+  return usage.ru_maxrss;
+}
+inline void report(int index, bool passed, const std::string& output, const std::string& error,
+                   std::chrono::steady_clock::time_point start) {
+  double ms = std::chrono::duration<double, std::milli>(std::chrono::steady_clock::now() - start).count();
+  std::cout << ${JSON.stringify(MARKER).replace(/\\u001e/g, "\\x1e")} << "{\\"index\\": " << index
+            << ", \\"passed\\": " << (passed ? "true" : "false")
+            << ", \\"output\\": " << (error.empty() ? json(output) : "null")
+            << ", \\"error\\": " << (error.empty() ? "null" : json(error))
+            << ", \\"time_ms\\": " << ms << ", \\"memory_kb\\": " << peak_kb() << "}" << std::endl;
+}
+}  // namespace gitgud_batch
+`;
+
+function cppHarness(tests) {
+  const cases = tests.map(
+    (test, index) => `
+  {
+    auto start = std::chrono::steady_clock::now();
+    bool passed = false;
+    std::string output, error;
+    try {
+      auto result = (${test.input});
+      output = gitgud_batch::repr(result);
+      ${
+        test.expected == null
+          ? "passed = true;"
+          : `decltype(result) expected = ${test.expected};
+      passed = result == expected;`
+      }
+    } catch (const std::exception& e) {
+      error = e.what();
+      if (error.empty()) error = "exception";
+    } catch (...) {
+      error = "unknown exception";
+    }
+    gitgud_batch::report(${index}, passed, output, error, start);
+  }`
+  );
+  return `${CPP_PRELUDE}
+int main() {${cases.join("")}
+  return 0;
+}
+`;
+}
+
+const JAVA_CLASS = "GitGudBatch";
+
+function javaHarness(tests) {
+  const cases = tests.map(
+    (test, index) => `
+    {
+      long start = System.nanoTime();
+      boolean passed = false;
+      String output = null, error = null;
+      try {
+        var result = ${test.input};
+        output = show(result);
+        ${
+          test.expected == null
+            ? "passed = true;"
+            : `var expected = ${test.expected};
+        passed = java.util.Objects.deepEquals(result, expected);`
+        }
+      } catch (Throwable e) {
+        error = e.toString();
+      }
+      report(${index}, passed, output, error, start);
+    }`
+  );
+  return `import java.util.Arrays;
+
+public class ${JAVA_CLASS} {
+  static String show(Object value) {
+    String text = Arrays.deepToString(new Object[] {value});
+    return text.substring(1, text.length() - 1);
+  }
+
+  static String json(String text) {
+    if (text == null) return "null";
+    StringBuilder sb = new StringBuilder("\\"");
+    for (char c : text.toCharArray()) {
+      if (c == '"' || c == '\\\\') sb.append('\\\\').append(c);
+      else if (c < 0x20) sb.append(String.format("\\\\u%04x", (int) c));
+      else sb.append(c);
+    }
+    return sb.append('"').toString();
+  }
+
+  static void report(int index, boolean passed, String output, String error, long start) {
+    Runtime runtime = Runtime.getRuntime();
+    System.out.println(${JSON.stringify(MARKER)} + "{\\"index\\": " + index
+        + ", \\"passed\\": " + passed
+        + ", \\"output\\": " + json(output)
+        + ", \\"error\\": " + json(error)
+        + ", \\"time_ms\\": " + (System.nanoTime() - start) / 1e6
+        + ", \\"memory_kb\\": " + (runtime.totalMemory() - runtime.freeMemory()) / 1024 + "}");
+  }
+
+  public static void main(String[] args) {${cases.join("")}
+  }
+}
+`;
+}
+
+// Build the harness that runs tests against a solution in the given language
+function buildHarness(language, tests) {
+  if (language === "python") return pythonHarness(tests);
+  if (language === "java") return javaHarness(tests);
+  return cppHarness(tests);
+}
+
+// Split the program's stdout into per-test results, the remaining output and the harness error,
+// if any. Tests without a result line did not run, e.g. because the program crashed or timed out
+// before reaching them.
+function parseResults(stdout, tests, failure) {
+  const reported = new Map();
+  const rest = [];
+  let harnessError = null;
+  for (const line of stdout.split("\n")) {
+    const at = line.indexOf(MARKER);
+    if (at === -1) {
+      rest.push(line);
+      continue;
+    }
+    if (at > 0) rest.push(line.slice(0, at));
+    try {
+      const result = JSON.parse(line.slice(at + MARKER.length));
+      if (result.harness_error) harnessError = result.harness_error;
+      else reported.set(result.index, result);
+    } catch (err) {
+      rest.push(line.slice(at + MARKER.length));
+    }
+  }
+  const results = tests.map((test, index) => {
+    const result = reported.get(index) || {
+      index,
+      passed: false,
+      output: null,
+      error: failure || "Test did not run",
+      time_ms: null,
+      memory_kb: null,
+    };
+    return { ...result, input: test.input, expected: test.expected ?? null };
+  });
+  return { results, stdout: rest.join("\n").trim(), harnessError };
+}
+
+module.exports = { buildHarness, parseResults };
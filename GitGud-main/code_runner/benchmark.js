@@ -0,0 +1,80 @@
+// Latency benchmark for Python jobs: warm worker pool vs. spawning python per job.
+//
+// Usage: node benchmark.js [jobs] [concurrency]
+const { exec } = require("child_process");
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const { PythonPool } = require("./pythonPool");
+
+const JOBS = Number(process.argv[2]) || 200;
+const CONCURRENCY = Number(process.argv[3]) || os.cpus().length;
+
+// A typical submission: a solution plus validation prints, using common stdlib modules
+const CODE = `
+from collections import Counter
+import heapq
+
+class Solution:
+    def topKFrequent(self, nums, k):
+        return [n for n, _ in heapq.nlargest(k, Counter(nums).items(), key=lambda x: x[1])]
+
+s = Solution()
+print(sorted(s.topKFrequent([1, 1, 1, 2, 2, 3], 2)) == [1, 2])
+print(s.topKFrequent([1], 1) == [1])
+`;
+
+function spawnRun(code, cwd) {
+  return new Promise((resolve) => {
+    const filename = path.join(cwd, "temp.py");
+    fs.writeFileSync(filename, code);
+    exec(`python ${filename}`, { cwd }, (error, stdout) => resolve({ error, stdout }));
+  });
+}
+
+async function measure(name, runJob) {
+  const latencies = [];
+  let next = 0;
+  const startedAt = Date.now();
+  const lane = async () => {
+    const cwd = fs.mkdtempSync(path.join(os.tmpdir(), "bench-"));
+    while (next++ < JOBS) {
+      const start = process.hrtime.bigint();
+      const result = await runJob(CODE, cwd);
+      if (result.error || result.stdout.trim() !== "True\nTrue") {
+        throw new Error(`${name}: unexpected result ${JSON.stringify(result)}`);
+      }
+      latencies.push(Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    fs.rmSync(cwd, { recursive: true, force: true });
+  };
+  await Promise.all(Array.from({ length: CONCURRENCY }, lane));
+  const elapsed = (Date.now() - startedAt) / 1000;
+  latencies.sort((a, b) => a - b);
+  const at = (q) => latencies[Math.min(latencies.length - 1, Math.floor(latencies.length * q))];
+  console.log(
+    `${name.padEnd(6)} p50 ${at(0.5).toFixed(1).padStart(7)} ms  p99 ${at(0.99)
+      .toFixed(1)
+      .padStart(7)} ms  (${(JOBS / elapsed).toFixed(1)} jobs/s)`
+  );
+}
+
+async function main() {
+  console.log(`${JOBS} jobs, concurrency ${CONCURRENCY}`);
+  await measure("spawn", spawnRun);
+  const pool = new PythonPool({
+    size: CONCURRENCY + 1,
+    maxJobs: Number(process.env.PYTHON_WORKER_MAX_JOBS) || 50,
+    timeoutMs: 10000,
+    cpuSeconds: 5,
+    memoryMb: 512,
+  });
+  await pool.ready();
+  await measure("pool", (code, cwd) => pool.run(code, cwd));
+  pool.close();
+}
+
+main().catch((err) => {
+  console.error(err);
+  process.exit(1);
+});
@@ -0,0 +1,150 @@
+const crypto = require("crypto");
+const fs = require("fs");
+const path = require("path");
+
+// Content-addressed cache of build outputs (binaries, precompiled headers, class files).
+// Each entry is a directory named after the hash of everything that went into the build,
+// so identical submissions are compiled once. The cache is bounded in bytes and the least
+// recently used entries are evicted first; entries in use by a running job are never evicted.
+class CompileCache {
+  constructor(dir, maxBytes) {
+    this.dir = dir;
+    this.maxBytes = maxBytes;
+    this.totalBytes = 0;
+    this.hits = 0;
+    this.misses = 0;
+    this.entries = new Map(); // key -> { size, users, error }, in least recently used order
+    this.inflight = new Map();
+  }
+
+  static key(...parts) {
+    const hash = crypto.createHash("sha256");
+    for (const part of parts) {
+      hash.update(String(part));
+      hash.update("\0");
+    }
+    return hash.digest("hex");
+  }
+
+  // Load the entries left on disk by a previous run, oldest first
+  init() {
+    fs.mkdirSync(this.dir, { recursive: true });
+    const found = [];
+    for (const name of fs.readdirSync(this.dir)) {
+      const entryDir = path.join(this.dir, name);
+      if (name.startsWith(".")) {
+        // Unfinished build from a previous run
+        fs.rmSync(entryDir, { recursive: true, force: true });
+        continue;
+      }
+      const errorFile = path.join(entryDir, "error.txt");
+      found.push({
+        name,
+        mtime: fs.statSync(entryDir).mtimeMs,
+        size: dirSize(entryDir),
+        error: fs.existsSync(errorFile) ? fs.readFileSync(errorFile, "utf8") : null,
+      });
+    }
+    found.sort((a, b) => a.mtime - b.mtime);
+    for (const { name, size, error } of found) {
+      this.entries.set(name, { size, users: 0, error });
+      this.totalBytes += size;
+    }
+    this.evict();
+  }
+
+  path(key) {
+    return path.join(this.dir, key);
+  }
+
+  // Return the entry for key, building it with build(dir) on a miss. build must resolve to
+  // { ok, stderr, timedOut }; failed builds are cached as well, unless they timed out.
+  // The entry stays pinned until release(key) is called.
+  async acquire(key, build) {
+    let entry = this.entries.get(key);
+    let compileMs = 0;
+    let cached = true;
+    if (entry) {
+      this.hits++;
+      this.touch(key, entry);
+    } else {
+      this.misses++;
+      cached = false;
+      if (!this.inflight.has(key)) {
+        this.inflight.set(key, this.build(key, build).finally(() => this.inflight.delete(key)));
+      }
+      const built = await this.inflight.get(key);
+      compileMs = built.compileMs;
+      entry = this.entries.get(key) || built.entry;
+    }
+    entry.users++;
+    return { dir: this.path(key), error: entry.error, cached, compileMs };
+  }
+
+  release(key) {
+    const entry = this.entries.get(key);
+    if (entry && entry.users > 0) entry.users--;
+    this.evict();
+  }
+
+  async build(key, build) {
+    const startedAt = Date.now();
+    const tmp = await fs.promises.mkdtemp(path.join(this.dir, ".build-"));
+    const result = await build(tmp);
+    const compileMs = Date.now() - startedAt;
+    const error = result.ok ? null : result.stderr || "Compilation failed";
+    if (!result.ok && result.timedOut) {
+      // Not deterministic, so not worth caching
+      await fs.promises.rm(tmp, { recursive: true, force: true });
+      return { entry: { size: 0, users: 0, error }, compileMs };
+    }
+    if (error) await fs.promises.writeFile(path.join(tmp, "error.txt"), error);
+    try {
+      await fs.promises.rename(tmp, this.path(key));
+    } catch (err) {
+      // Another process built the same entry first; its output is identical
+      await fs.promises.rm(tmp, { recursive: true, force: true });
+    }
+    const entry = { size: dirSize(this.path(key)), users: 0, error };
+    this.entries.set(key, entry);
+    this.totalBytes += entry.size;
+    return { entry, compileMs };
+  }
+
+  touch(key, entry) {
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    const now = new Date();
+    fs.promises.utimes(this.path(key), now, now).catch(() => {});
+  }
+
+  evict() {
+    for (const [key, entry] of this.entries) {
+      if (this.totalBytes <= this.maxBytes) break;
+      if (entry.users > 0) continue;
+      this.entries.delete(key);
+      this.totalBytes -= entry.size;
+      fs.rmSync(this.path(key), { recursive: true, force: true });
+    }
+  }
+
+  stats() {
+    return {
+      entries: this.entries.size,
+      bytes: this.totalBytes,
+      hits: this.hits,
+      misses: this.misses,
+    };
+  }
+}
+
+function dirSize(dir) {
+  let size = 0;
+  for (const entry of fs.readdirSync(dir, { withFileTypes: true })) {
+    const entryPath = path.join(dir, entry.name);
+    size += entry.isDirectory() ? dirSize(entryPath) : fs.statSync(entryPath).size;
+  }
+  return size;
+}
+
+module.exports = { CompileCache };
@@ -0,0 +1,199 @@
+const { spawn } = require("child_process");
+const path = require("path");
+
+const WORKER_SCRIPT = path.join(__dirname, "python_worker.py");
+const RESTART_DELAY_MS = 100;
+const MAX_RESTART_DELAY_MS = 5000;
+
+// A pool of pre-started Python workers (python_worker.py). Each worker runs one job at a time,
+// in a child process forked from it, and is replaced when it asks to be recycled, times out or
+// dies, so a misbehaving submission only ever costs one worker. Workers are also retired after maxJobs jobs; they
+// keep serving until their replacement has started, so retiring never leaves jobs waiting.
+// A worker that dies before it is ready is started again with a backoff; while no worker is
+// running, jobs fail with the reason instead of waiting for one.
+class PythonPool {
+  constructor({ size, maxJobs, timeoutMs, cpuSeconds, memoryMb, python = "python" }) {
+    this.size = size;
+    this.maxJobs = maxJobs;
+    this.timeoutMs = timeoutMs;
+    this.cpuSeconds = cpuSeconds;
+    this.memoryMb = memoryMb;
+    this.python = python;
+    this.idle = [];
+    this.waiting = [];
+    this.recycled = 0;
+    this.running = 0;
+    this.startFailures = 0;
+    this.startError = null;
+    this.closed = false;
+    for (let i = 0; i < size; i++) this.spawn();
+  }
+
+  // Start a worker; it joins the pool, replacing the retiring worker if given, once ready
+  spawn(replaces = null) {
+    const child = spawn(
+      this.python,
+      [WORKER_SCRIPT, String(this.memoryMb), String(this.cpuSeconds * this.maxJobs)],
+      // Its own process group, so killing the worker also kills the job it forked
+      { stdio: ["pipe", "ignore", "inherit", "pipe"], detached: true }
+    );
+    const worker = { child, jobs: 0, buffer: "", pending: null, ready: false, exited: false };
+    child.stdio[3].setEncoding("utf8");
+    child.stdio[3].on("data", (chunk) => {
+      worker.buffer += chunk;
+      let newline;
+      while ((newline = worker.buffer.indexOf("\n")) !== -1) {
+        const message = JSON.parse(worker.buffer.slice(0, newline));
+        worker.buffer = worker.buffer.slice(newline + 1);
+        if (message.ready) {
+          worker.ready = true;
+          this.running++;
+          this.startFailures = 0;
+          this.startError = null;
+          if (replaces) this.retire(replaces);
+          this.hand(worker);
+        }
+        else if (worker.pending) worker.pending(message);
+      }
+    });
+    const exited = (failure) => {
+      if (worker.exited) return;
+      worker.exited = true;
+      if (!worker.ready) return this.failedToStart(failure, replaces);
+      this.running--;
+      if (worker.pending) worker.pending(null, failure);
+    };
+    child.on("exit", (code, signal) => exited(signal || `exit code ${code}`));
+    child.on("error", (error) => exited(`could not start ${this.python}: ${error.code || error.message}`));
+    child.stdin.on("error", () => {});
+  }
+
+  // Start the worker again after a backoff, and fail the waiting jobs if no worker is running
+  failedToStart(failure, replaces) {
+    if (this.closed) return;
+    this.startFailures++;
+    this.startError = new Error(`Python worker could not start (${failure})`);
+    if (this.running === 0) {
+      for (const waiter of this.waiting.splice(0)) waiter.reject(this.startError);
+    }
+    const delay = Math.min(RESTART_DELAY_MS * 2 ** (this.startFailures - 1), MAX_RESTART_DELAY_MS);
+    setTimeout(() => {
+      if (!this.closed) this.spawn(replaces);
+    }, delay).unref();
+  }
+
+  acquire() {
+    let worker;
+    while ((worker = this.idle.pop())) {
+      if (!worker.exited) return Promise.resolve(worker);
+      if (!worker.retiring) this.spawn();
+    }
+    if (this.running === 0 && this.startError) return Promise.reject(this.startError);
+    return new Promise((resolve, reject) => this.waiting.push({ resolve, reject }));
+  }
+
+  hand(worker) {
+    if (this.closed) return kill(worker);
+    const next = this.waiting.shift();
+    if (next) next.resolve(worker);
+    else this.idle.push(worker);
+  }
+
+  release(worker, recycle) {
+    if (recycle || worker.exited || worker.retired) {
+      if (!worker.exited) kill(worker);
+      if (!worker.retiring) {
+        this.recycled++;
+        this.spawn();
+      }
+      return;
+    }
+    if (worker.jobs >= this.maxJobs && !worker.retiring) {
+      worker.retiring = true;
+      this.recycled++;
+      this.spawn(worker);
+    }
+    this.hand(worker);
+  }
+
+  retire(worker) {
+    worker.retired = true;
+    const index = this.idle.indexOf(worker);
+    if (index !== -1) {
+      this.idle.splice(index, 1);
+      kill(worker);
+    }
+  }
+
+  // Resolve once all workers have started; rejects if they can't be started
+  async ready() {
+    while (this.idle.length < this.size) {
+      if (this.running === 0 && this.startError) throw this.startError;
+      await new Promise((resolve) => setTimeout(resolve, 10));
+    }
+  }
+
+  // Run code in a warm worker; resolves like the spawn-per-job path in server.js
+  async run(code, cwd) {
+    let worker;
+    try {
+      worker = await this.acquire();
+    } catch (error) {
+      return { error: true, stdout: "", stderr: error.message, timedOut: false, runMs: 0 };
+    }
+    const startedAt = Date.now();
+    worker.jobs++;
+    const outcome = await new Promise((resolve) => {
+      const timer = setTimeout(() => {
+        kill(worker);
+        finish(null, "timeout");
+      }, this.timeoutMs);
+      const finish = (result, failure) => {
+        clearTimeout(timer);
+        worker.pending = null;
+        resolve({ result, failure });
+      };
+      worker.pending = finish;
+      worker.child.stdin.write(
+        JSON.stringify({ code, cwd, cpu_seconds: this.cpuSeconds }) + "\n"
+      );
+    });
+    const runMs = Date.now() - startedAt;
+    const { result, failure } = outcome;
+    this.release(worker, !result || result.recycle);
+
+    if (!result) {
+      const stderr =
+        failure === "timeout"
+          ? ""
+          : failure === "SIGXCPU"
+            ? "CPU time limit exceeded"
+            : `Python worker died (${failure})`;
+      return { error: true, stdout: "", stderr, timedOut: failure === "timeout", runMs };
+    }
+    return {
+      error: !result.ok,
+      stdout: result.stdout,
+      stderr: result.stderr,
+      timedOut: false,
+      runMs,
+    };
+  }
+
+  close() {
+    this.closed = true;
+    for (const waiter of this.waiting.splice(0)) waiter.reject(new Error("Python pool is closed"));
+    for (const worker of this.idle) kill(worker);
+    this.idle = [];
+  }
+}
+
+function kill(worker) {
+  try {
+    process.kill(-worker.child.pid, "SIGKILL");
+  } catch {
+    worker.child.kill("SIGKILL");
+  }
+}
+
+module.exports = { PythonPool };
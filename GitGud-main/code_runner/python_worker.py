@@ -0,0 +1,147 @@
+"""
+Warm Python worker for the code runner.
+
+The worker is started once by pythonPool.js and then runs submissions one at a time: each job
+arrives as a JSON line on stdin and its result is written as a JSON line to fd 3. Commonly used
+stdlib modules are imported up front, then every job runs in a child forked from the worker, so
+jobs don't pay for the imports and nothing a job changes (patched modules, random state,
+threads) is seen by the next one. The child runs under the job's CPU limit and the worker's
+memory limit, with stdout and stderr captured.
+
+Job:    {"code": str, "cwd": str, "cpu_seconds": int}
+Result: {"ok": bool, "stdout": str, "stderr": str, "recycle": bool}
+
+"recycle" asks the pool to replace the worker; jobs can't affect the worker itself, so it is only
+set when a job could not be started.
+"""
+
+import builtins
+import gc
+import io
+import json
+import os
+import resource
+import signal
+import sys
+import traceback
+
+# Imported for their side effect of being loaded before the first job
+import bisect, collections, functools, heapq, itertools, math, random, re, string, typing  # noqa: E401,F401
+
+MAX_OUTPUT_CHARS = 1024 * 1024
+SIGNAL_ERRORS = {signal.SIGXCPU: "CPU time limit exceeded", signal.SIGKILL: "Killed"}
+
+
+class CappedBuffer(io.StringIO):
+    """A text buffer that stops growing after MAX_OUTPUT_CHARS characters."""
+
+    def write(self, text):
+        if self.tell() < MAX_OUTPUT_CHARS:
+            super().write(text[: MAX_OUTPUT_CHARS - self.tell()])
+        return len(text)
+
+
+def set_limits(memory_mb: int, cpu_seconds: int) -> None:
+    # Hard limits can't be raised again by submitted code; jobs lower the CPU limit to their own budget
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+
+
+def print_error(stderr: io.StringIO) -> None:
+    # Skip the worker's own frame so tracebacks start at the submitted code
+    etype, value, tb = sys.exc_info()
+    traceback.print_exception(etype, value, tb.tb_next, file=stderr)
+
+
+def run_job(job: dict) -> dict:
+    """
+    Run one submission in the current process.
+
+    Args:
+        job (dict): The code to run, the directory to run it in and its CPU time budget.
+
+    Returns:
+        dict: Whether the code ran successfully and its captured output.
+    """
+    # A forked child starts with no CPU time used
+    resource.setrlimit(resource.RLIMIT_CPU, (job["cpu_seconds"], job["cpu_seconds"] + 1))
+
+    stdout, stderr = CappedBuffer(), CappedBuffer()
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    ok = True
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(""), stdout, stderr
+    try:
+        os.chdir(job["cwd"])
+        exec(compile(job["code"], "temp.py", "exec"), namespace)
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+        if not ok and e.code is not None and not isinstance(e.code, int):
+            stderr.write(f"{e.code}\n")
+    except BaseException:
+        ok = False
+        print_error(stderr)
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = sys.__stdin__, sys.__stdout__, sys.__stderr__
+    return {"ok": ok, "stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "recycle": False}
+
+
+def fork_job(job: dict) -> dict:
+    """
+    Run one submission in a child forked from the worker.
+
+    Args:
+        job (dict): The code to run, the directory to run it in and its CPU time budget.
+
+    Returns:
+        dict: The result of `run_job`, or a failure if the child was killed or could not start.
+    """
+    read_end, write_end = os.pipe()
+    try:
+        pid = os.fork()
+    except OSError as e:
+        os.close(read_end)
+        os.close(write_end)
+        return {"ok": False, "stdout": "", "stderr": f"Could not start the job: {e}", "recycle": True}
+
+    if pid == 0:
+        try:
+            os.close(read_end)
+            # Keep the job away from the worker's job and result pipes
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.close(3)
+            with os.fdopen(write_end, "w") as output:
+                output.write(json.dumps(run_job(job)))
+        finally:
+            os._exit(0)
+
+    os.close(write_end)
+    with os.fdopen(read_end) as output:
+        data = output.read()
+    _, status = os.waitpid(pid, 0)
+    if data:
+        return json.loads(data)
+    if os.WIFSIGNALED(status):
+        number = os.WTERMSIG(status)
+        error = SIGNAL_ERRORS.get(number, f"Terminated by {signal.Signals(number).name}")
+    else:
+        error = f"Exited with code {os.WEXITSTATUS(status)}"
+    return {"ok": False, "stdout": "", "stderr": error, "recycle": False}
+
+
+def main() -> None:
+    set_limits(int(sys.argv[1]), int(sys.argv[2]))
+    # Objects that exist now are never collected, so forked children don't copy their pages
+    gc.freeze()
+    results = os.fdopen(3, "w")
+    results.write(json.dumps({"ready": True}) + "\n")
+    results.flush()
+    for line in sys.stdin:
+        result = fork_job(json.loads(line))
+        results.write(json.dumps(result) + "\n")
+        results.flush()
+
+
+if __name__ == "__main__":
+    main()
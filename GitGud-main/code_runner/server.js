@@ -2,7 +2,11 @@ const express = require("express");
 const { exec } = require("child_process");
 const morgan =require("morgan")
 const fs = require("fs");
+const os = require("os");
 const path = require("path");
+const { CompileCache } = require("./compileCache");
+const { PythonPool } = require("./pythonPool");
+const { buildHarness, parseResults } = require("./batch");
 const app = express();
 app.use(express.json());
 app.use(morgan("combined"))
@@ -11,49 +15,356 @@ if (!fs.existsSync(tempDir)) {
   fs.mkdirSync(tempDir);
 }
 
-app.post("/execute", (req, res) => {
-  let { language, code } = req.body;
-  let command;
-  language = language.toLowerCase();
-  let filename, executable;
-  console.log(code)
-  switch (language) {
-    case "python":
-      filename = path.join(tempDir, "temp.py");
-      fs.writeFileSync(filename, code);
-      command = `python ${filename}`;
-      break;
-    case "c":
-    case "c++":
-      const extension = language === "c" ? "c" : "cpp";
-      filename = path.join(tempDir, `temp.${extension}`);
-      executable = path.join(tempDir, "temp_executable");
-      fs.writeFileSync(filename, code);
-      command = `g++ ${filename} -o ${executable} && ${executable}`;
-      break;
-    case "java":
-        filename = path.join(tempDir, "Temp.java"); // Java class name must match filename
-        fs.writeFileSync(filename, code);
-        command = `javac ${filename} && java -cp ${tempDir} Temp`;
-        break;
-    
-    default:
-      return res.status(400).json({
-        error: "Unsupported language",
+// Jobs run concurrently in their own scratch directories, at most MAX_WORKERS at a time.
+// Up to MAX_QUEUE more wait for a free worker; beyond that requests are rejected with 503.
+const MAX_WORKERS = Number(process.env.MAX_WORKERS) || os.cpus().length;
+const MAX_QUEUE = Number(process.env.MAX_QUEUE) || 64;
+// Per-job limits: wall-clock time, CPU seconds and address space of the program being run
+const JOB_TIMEOUT_MS = Number(process.env.JOB_TIMEOUT_MS) || 10000;
+const JOB_CPU_SECONDS = Number(process.env.JOB_CPU_SECONDS) || 5;
+const JOB_MEMORY_MB = Number(process.env.JOB_MEMORY_MB) || 512;
+const MAX_OUTPUT_BYTES = 1024 * 1024;
+const MAX_BATCH_TESTS = Number(process.env.MAX_BATCH_TESTS) || 100;
+// Compiler flags are part of the compile cache key
+const CXX_FLAGS = process.env.CXX_FLAGS || "";
+const JAVAC_FLAGS = process.env.JAVAC_FLAGS || "";
+
+const compileCache = new CompileCache(
+  process.env.COMPILE_CACHE_DIR || path.join(__dirname, "cache"),
+  (Number(process.env.COMPILE_CACHE_MAX_MB) || 1024) * 1024 * 1024
+);
+compileCache.init();
+
+// Python jobs run in warm workers unless PYTHON_POOL=0. There is one worker per pool slot plus
+// a spare, so a scheduled job doesn't wait while a recycled worker starts up.
+const pythonPool =
+  process.env.PYTHON_POOL === "0"
+    ? null
+    : new PythonPool({
+        size: MAX_WORKERS + 1,
+        maxJobs: Number(process.env.PYTHON_WORKER_MAX_JOBS) || 50,
+        timeoutMs: JOB_TIMEOUT_MS,
+        cpuSeconds: JOB_CPU_SECONDS,
+        memoryMb: JOB_MEMORY_MB,
+      });
+
+let running = 0;
+const queue = [];
+
+// Run a job when a worker is free; resolves with the job's result and its queue wait in ms
+function schedule(job) {
+  return new Promise((resolve, reject) => {
+    queue.push({ job, resolve, reject, enqueuedAt: Date.now() });
+    drain();
+  });
+}
+
+function drain() {
+  while (running < MAX_WORKERS && queue.length > 0) {
+    const { job, resolve, reject, enqueuedAt } = queue.shift();
+    const queueMs = Date.now() - enqueuedAt;
+    running++;
+    job()
+      .then((result) => resolve({ ...result, queueMs }))
+      .catch(reject)
+      .finally(() => {
+        running--;
+        drain();
       });
   }
+}
+
+// Wrap the run step of a command in CPU and memory limits
+function limited(command, { memory = true } = {}) {
+  const limits = [`ulimit -t ${JOB_CPU_SECONDS}`];
+  if (memory) limits.push(`ulimit -v ${JOB_MEMORY_MB * 1024}`);
+  return `(${limits.join("; ")}; ${command})`;
+}
+
+function run(command, cwd) {
+  return new Promise((resolve) => {
+    const startedAt = Date.now();
+    exec(
+      command,
+      { cwd, timeout: JOB_TIMEOUT_MS, killSignal: "SIGKILL", maxBuffer: MAX_OUTPUT_BYTES },
+      (error, stdout, stderr) => {
+        resolve({
+          error,
+          stdout,
+          stderr,
+          timedOut: Boolean(error && error.killed),
+          runMs: Date.now() - startedAt,
+        });
+      }
+    );
+  });
+}
+
+// Java requires a public class to live in a file of the same name
+function javaClassName(code, fallback) {
+  const match = /public\s+(?:final\s+)?class\s+(\w+)/.exec(code);
+  return match ? match[1] : fallback;
+}
+
+async function compileStep(command, cwd) {
+  const result = await run(command, cwd);
+  return { ok: !result.error, stderr: result.stderr, timedOut: result.timedOut };
+}
+
+// Compile a whole program, or a solution and a harness separately, through the compile cache.
+// Returns the cache keys to release once the program has run, the command that runs it and
+// the compile time, or the compilation error with the step that failed ("solution" or "program").
+async function build(language, { code, solution, harness }) {
+  const keys = [];
+  let compileMs = 0;
+  let cached = true;
+  const acquire = async (key, step) => {
+    const entry = await compileCache.acquire(key, step);
+    keys.push(key);
+    compileMs += entry.compileMs;
+    cached = cached && entry.cached;
+    return entry;
+  };
+  const split = typeof solution === "string" && typeof harness === "string";
+  let program;
+
+  if (language === "java") {
+    let classpath = "";
+    if (split) {
+      const solutionClass = javaClassName(solution, "Solution");
+      const library = await acquire(
+        CompileCache.key(language, JAVAC_FLAGS, "solution", solution),
+        async (dir) => {
+          fs.writeFileSync(path.join(dir, `${solutionClass}.java`), solution);
+          return compileStep(`javac ${JAVAC_FLAGS} -d . ${solutionClass}.java`, dir);
+        }
+      );
+      if (library.error) return { keys, error: library.error, failedStep: "solution", compileMs, cached };
+      classpath = library.dir;
+      code = harness;
+    }
+    const mainClass = javaClassName(code, "Temp");
+    program = await acquire(
+      CompileCache.key(language, JAVAC_FLAGS, "program", classpath, code),
+      async (dir) => {
+        fs.writeFileSync(path.join(dir, `${mainClass}.java`), code);
+        const cp = classpath ? `-cp ${classpath} ` : "";
+        return compileStep(`javac ${JAVAC_FLAGS} ${cp}-d . ${mainClass}.java`, dir);
+      }
+    );
+    // The JVM reserves a large address space up front, so bound its heap instead
+    const cp = classpath ? `${program.dir}:${classpath}` : program.dir;
+    program.command = limited(`java -Xmx${JOB_MEMORY_MB}m -cp ${cp} ${mainClass}`, {
+      memory: false,
+    });
+  } else {
+    let include = "";
+    if (split) {
+      // The solution is compiled once as a precompiled header and force-included by each harness.
+      // Linking a solution.o instead would not save more: solutions define their methods inside
+      // the class, so every harness that calls them has to see, and generate code for, them anyway.
+      // What is reused is the parsing of the solution and the headers it includes.
+      const header = await acquire(
+        CompileCache.key(language, CXX_FLAGS, "solution", solution),
+        async (dir) => {
+          fs.writeFileSync(path.join(dir, "solution.h"), solution);
+          return compileStep(`g++ ${CXX_FLAGS} -x c++-header solution.h -o solution.h.gch`, dir);
+        }
+      );
+      if (header.error) return { keys, error: header.error, failedStep: "solution", compileMs, cached };
+      include = `-include ${path.join(header.dir, "solution.h")} `;
+      code = harness;
+    }
+    const extension = language === "c" ? "c" : "cpp";
+    program = await acquire(
+      CompileCache.key(language, CXX_FLAGS, "program", include, code),
+      async (dir) => {
+        fs.writeFileSync(path.join(dir, `temp.${extension}`), code);
+        return compileStep(`g++ ${CXX_FLAGS} ${include}temp.${extension} -o temp_executable`, dir);
+      }
+    );
+    program.command = limited(path.join(program.dir, "temp_executable"));
+  }
+
+  return {
+    keys,
+    error: program.error,
+    failedStep: program.error ? "program" : null,
+    command: program.command,
+    compileMs,
+    cached,
+  };
+}
+
+async function runJob(language, source, jobDir) {
+  if (language === "python" && pythonPool) {
+    return { ...(await pythonPool.run(source.code, jobDir)), compileMs: 0, cached: false };
+  }
+  if (language === "python") {
+    const filename = path.join(jobDir, "temp.py");
+    fs.writeFileSync(filename, source.code);
+    return { ...(await run(limited(`python ${filename}`), jobDir)), compileMs: 0, cached: false };
+  }
+  const program = await build(language, source);
+  try {
+    if (program.error) {
+      return {
+        error: true,
+        stderr: program.error,
+        failedStep: program.failedStep,
+        timedOut: false,
+        runMs: 0,
+        compileMs: program.compileMs,
+        cached: program.cached,
+      };
+    }
+    const result = await run(program.command, jobDir);
+    return { ...result, compileMs: program.compileMs, cached: program.cached };
+  } finally {
+    program.keys.forEach((key) => compileCache.release(key));
+  }
+}
 
-  exec(command, (error, stdout, stderr) => {
-    fs.unlinkSync(filename);
-    if (executable && fs.existsSync(executable)) fs.unlinkSync(executable);
+const LANGUAGES = ["python", "c", "c++", "java"];
 
-    if (error) {
-      return res.status(500).json(stderr);
+// Check the language and the queue depth, answering the request if the job can't be taken
+function admit(req, res) {
+  const language = (req.body.language || "").toLowerCase();
+  if (!LANGUAGES.includes(language)) {
+    res.status(400).json({
+      error: "Unsupported language",
+    });
+    return null;
+  }
+  if (queue.length >= MAX_QUEUE) {
+    res.set("Retry-After", "1");
+    res.status(503).json({
+      error: "Code runner is busy",
+    });
+    return null;
+  }
+  return language;
+}
+
+// Run a job on the pool in a fresh scratch directory
+function execute(language, source) {
+  if (language === "python" && typeof source.code !== "string") {
+    source = { ...source, code: source.solution + "\n\n\n" + source.harness };
+  }
+  return schedule(async () => {
+    const jobDir = await fs.promises.mkdtemp(path.join(tempDir, "job-"));
+    try {
+      return await runJob(language, source, jobDir);
+    } finally {
+      await fs.promises.rm(jobDir, { recursive: true, force: true });
     }
-    const output = stdout.trim();
-    res.status(200).json({
-        "output" : output
+  });
+}
+
+function timing(result) {
+  return {
+    queue_ms: result.queueMs,
+    compile_ms: result.compileMs,
+    run_ms: result.runMs,
+    compile_cached: result.cached,
+  };
+}
+
+function failure(result) {
+  if (result.timedOut) return `Time limit exceeded (${JOB_TIMEOUT_MS} ms)`;
+  return result.stderr || String(result.error.message || "Execution failed");
+}
+
+// Either "code" holds the whole program, or "solution" and "harness" hold the solution and the
+// code that tests it; the solution is then compiled once and reused across harnesses.
+app.post("/execute", async (req, res) => {
+  const language = admit(req, res);
+  if (!language) return;
+  const { code, solution, harness } = req.body;
+  const split = typeof solution === "string" && typeof harness === "string";
+  if (typeof code !== "string" && !split) {
+    return res.status(400).json({
+      error: "Missing code",
+    });
+  }
+
+  let result;
+  try {
+    result = await execute(language, { code, solution, harness });
+  } catch (err) {
+    return res.status(500).json({ error: String(err) });
+  }
+
+  if (result.error) {
+    return res
+      .status(500)
+      .json({ error: failure(result), timed_out: result.timedOut, ...timing(result) });
+  }
+  res.status(200).json({
+      "output" : result.stdout.trim(),
+      ...timing(result),
+  });
+});
+
+// Run a solution against test cases ({ input, expected } expressions, see batch.js) in one
+// process. Answers 200 with per-test results whenever the batch ran; "error" is set if the
+// solution failed to compile or the program stopped before all tests ran. Test cases that are
+// not valid expressions, e.g. a compiled solution whose harness doesn't compile, are answered
+// with 422 and "harness_error", since they say nothing about the solution.
+app.post("/execute_batch", async (req, res) => {
+  const language = admit(req, res);
+  if (!language) return;
+  const { solution, tests } = req.body;
+  const valid =
+    typeof solution === "string" &&
+    Array.isArray(tests) &&
+    tests.length > 0 &&
+    tests.length <= MAX_BATCH_TESTS &&
+    tests.every(
+      (test) =>
+        test &&
+        typeof test.input === "string" &&
+        (test.expected == null || typeof test.expected === "string")
+    );
+  if (!valid) {
+    return res.status(400).json({
+      error: `Expected a solution and 1 to ${MAX_BATCH_TESTS} tests with string input and expected`,
+    });
+  }
+
+  let result;
+  try {
+    result = await execute(language, { solution, harness: buildHarness(language, tests) });
+  } catch (err) {
+    return res.status(500).json({ error: String(err) });
+  }
+
+  const error = result.error ? failure(result) : null;
+  const { results, stdout, harnessError } = parseResults(result.stdout || "", tests, error);
+  if (harnessError || result.failedStep === "program") {
+    return res.status(422).json({
+      error: `The test cases could not be run: ${harnessError || error}`,
+      harness_error: true,
+      ...timing(result),
     });
+  }
+  res.status(200).json({
+    passed: !error && results.every((test) => test.passed),
+    results,
+    output: stdout,
+    error,
+    timed_out: result.timedOut,
+    ...timing(result),
+  });
+});
+
+app.get("/stats", (req, res) => {
+  res.status(200).json({
+    workers: MAX_WORKERS,
+    running,
+    queued: queue.length,
+    compile_cache: compileCache.stats(),
+    python_workers_recycled: pythonPool ? pythonPool.recycled : null,
   });
 });
 
@@ -0,0 +1,48 @@
+const test = require("node:test");
+const assert = require("node:assert");
+const { PythonPool } = require("../pythonPool");
+
+const PYTHON = process.env.PYTHON || "python3";
+const options = { size: 2, maxJobs: 10, timeoutMs: 5000, cpuSeconds: 2, memoryMb: 512 };
+
+test("jobs fail when the python binary is missing", async () => {
+  const pool = new PythonPool({ ...options, python: "/nonexistent/python" });
+  try {
+    const result = await pool.run("print(1)", __dirname);
+    assert.strictEqual(result.error, true);
+    assert.match(result.stderr, /Python worker could not start/);
+    await assert.rejects(pool.ready(), /could not start/);
+  } finally {
+    pool.close();
+  }
+});
+
+test("queued jobs fail when workers exit before they are ready", async () => {
+  // 'false' exits with code 1 whatever its arguments
+  const pool = new PythonPool({ ...options, python: "false" });
+  try {
+    const results = await Promise.all([1, 2, 3].map(() => pool.run("print(1)", __dirname)));
+    for (const result of results) {
+      assert.strictEqual(result.error, true);
+      assert.match(result.stderr, /exit code 1/);
+    }
+    assert.ok(pool.startFailures >= 1);
+  } finally {
+    pool.close();
+  }
+});
+
+test("a working pool runs jobs", async () => {
+  const pool = new PythonPool({ ...options, python: PYTHON });
+  try {
+    await pool.ready();
+    const result = await pool.run("print(6 * 7)", __dirname);
+    assert.deepStrictEqual(
+      { error: result.error, stdout: result.stdout },
+      { error: false, stdout: "42\n" }
+    );
+    assert.strictEqual(pool.running, options.size);
+  } finally {
+    pool.close();
+  }
+});
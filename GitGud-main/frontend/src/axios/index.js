@@ -94,3 +94,42 @@ export function useAxiosPrivate() {
 
   return axiosPrivateInstance;
 } 
+
+// Stream a chat reply from the Server-Sent Events endpoint, calling onEvent(event, data)
+// for each event. Throws if the stream could not be opened so callers can fall back.
+export async function streamChatMessage(chatId, message, onEvent) {
+  const token = sessionStorage.getItem("accessToken");
+  const response = await fetch(`${API_URL}/chat_message/stream?chat_id=${chatId}`, {
+    method: "POST",
+    credentials: "include",
+    headers: {
+      "Content-Type": "application/json",
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify({ message }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Streaming failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const chunk = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      for (const line of chunk.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      onEvent(event, data ? JSON.parse(data) : null);
+    }
+  }
+}
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { MessageInput } from "../components/ui/message-input";
 import { PromptSuggestions } from "../components/ui/prompt-suggestions";
-import { useAxiosPrivate } from "@/axios";
+import { useAxiosPrivate, streamChatMessage } from "@/axios";
 import { useNavigate, useParams } from "react-router-dom";
 import { ChatMessage } from "@/components/ui/chat-message";
 import { TypingIndicator } from "@/components/ui/typing-indicator";
@@ -102,12 +102,50 @@ export default function ChatPage() {
     setMessage(""); // Clear input
     setGenerating(true);
 
+    // Replace the last (assistant) message with the given text
+    const setBotMessage = (text) =>
+      setMessages((prev) => [
+        ...prev.slice(0, -1),
+        { role: "assistant", message: text },
+      ]);
+
+    let streamed = "";
+    let streamOpened = false;
+    try {
+      // 2. Stream the bot response as it is generated
+      await streamChatMessage(id, userMessage.message, (event, data) => {
+        if (!streamOpened) {
+          streamOpened = true;
+          setMessages((prev) => [...prev, { role: "assistant", message: "" }]);
+        }
+        if (event === "token") {
+          streamed += data.content;
+          setBotMessage(streamed);
+        } else if (event === "done") {
+          setBotMessage(data.message);
+        } else if (event === "error") {
+          throw new Error(data.detail);
+        }
+      });
+    } catch (err) {
+      if (streamOpened) {
+        setBotMessage("Error occured, try again later!");
+        console.error(err);
+      } else {
+        // Streaming unavailable (e.g. expired token): fall back to the regular endpoint
+        await sendWithoutStreaming(userMessage.message);
+      }
+    } finally {
+      setGenerating(false);
+    }
+  };
+
+  const sendWithoutStreaming = async (text) => {
     try {
-      // 2. Send to API and wait for bot response
       const response = await axiosPrivateInstance.post(
         `/chat_message/?chat_id=${id}`,
         {
-          message: userMessage.message,
+          message: text,
         }
       );
 
@@ -116,7 +154,6 @@ export default function ChatPage() {
         message: response?.data?.message,
       };
 
-      // 3. Add the bot's reply
       setMessages((prev) => [...prev, botMessage]);
     } catch (err) {
       const botMessage = {
@@ -125,8 +162,6 @@ export default function ChatPage() {
       };
       setMessages((prev) => [...prev, botMessage]);
       console.error(err);
-    } finally {
-      setGenerating(false);
     }
   };
 
@@ -148,17 +183,37 @@ export default function ChatPage() {
     "Can you help me solve this question ",
   ];
   useEffect(() => {
+    let cancelled = false;
     const fetchMessages = async () => {
       try {
+        // New chats are prepared in the background: wait until the opener is ready
+        let chat = (await axiosPrivateInstance.get(`/chat_status?chat_id=${id}`)).data;
+        if (chat.status === "pending") setGenerating(true);
+        while (chat.status === "pending" && !cancelled) {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          chat = (await axiosPrivateInstance.get(`/chat_status?chat_id=${id}`)).data;
+        }
+        if (cancelled) return;
+        setGenerating(false);
+        if (chat.status === "failed") {
+          setMessages([
+            { role: "assistant", message: `Could not start this chat: ${chat.error}` },
+          ]);
+          return;
+        }
         const messages = await axiosPrivateInstance.get(
           `/messages/?chat_id=${id}`
         );
         setMessages(messages.data);
       } catch (err) {
+        setGenerating(false);
         console.error(err);
       }
     };
     fetchMessages();
+    return () => {
+      cancelled = true;
+    };
   }, []);
 
   return (
@@ -25,8 +25,12 @@ const PopulatedProblemGridDemo = () => {
       try {
         const resList = await axiosPrivateInstance.get(`/chats?skip=${(currentPage-1)*GRID_SIZE}&limit=${GRID_SIZE}`);
         setProblemData(resList.data || []);
-        const resLen = await axiosPrivateInstance.get(`/len_chat`);
-        setTotalPages((Math.floor((resLen.data.length || 0) / GRID_SIZE))+1);
+        let total = parseInt(resList.headers["x-total-count"], 10);
+        if (Number.isNaN(total)) {
+          const resLen = await axiosPrivateInstance.get(`/len_chat`);
+          total = resLen.data.length || 0;
+        }
+        setTotalPages((Math.floor(total / GRID_SIZE))+1);
       } catch (error) {
         console.error('Error fetching problems:', error);
       }